@@ -0,0 +1,213 @@
+"""Benchmark del ciclo completo del agente sin AWS, con un Bedrock local guionado.
+
+Reemplaza ``create_bedrock_client`` por ``FakeBedrockClient`` y ejecuta
+``process_query_with_mcp`` contra una base de datos real (servidor MCP, pool,
+SQLite y herramientas reales). Reporta latencia p50/p95/p99, throughput, tiempo
+de arranque del servidor MCP, tiempo del esquema y tiempo por herramienta.
+
+Uso:
+    python benchmarks/bench_agent.py --questions 60 --concurrency 4
+    python benchmarks/bench_agent.py --synthetic-tables 300 --latency 0.2 --jitter 0.1
+    python benchmarks/bench_agent.py --enterprise-orders 1000000
+    python benchmarks/bench_agent.py --max-p95 1.5 --output resultados.json   # para CI
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# Medir el agente, no la caché de respuestas
+os.environ.setdefault("ANSWER_CACHE_MAX_ENTRIES", "0")
+
+from benchmarks.bench_schema import create_synthetic_database
+from benchmarks.fake_bedrock import ENTERPRISE_SCENARIOS, FakeBedrockClient, sql_script
+from benchmarks.generate_enterprise_db import generate_enterprise_database
+from src import agent
+from src.runtime import run_coroutine
+
+CONTEXT = "Empresa de demostración para benchmarks."
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil por rango más cercano (``values`` no vacía)."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.mean(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def build_scenarios(synthetic_tables: int, ask_schema: bool):
+    """Retorna (preguntas, guiones) para la base enterprise o la sintética."""
+    if synthetic_tables:
+        scenarios = [
+            (f"¿Cuántas filas tiene table_{t}?", f"SELECT COUNT(*) FROM table_{t}")
+            for t in range(0, synthetic_tables, max(1, synthetic_tables // 10))
+        ]
+    else:
+        scenarios = ENTERPRISE_SCENARIOS
+    scripts = {question: sql_script(sql, ask_schema=ask_schema) for question, sql in scenarios}
+    return [question for question, _ in scenarios], scripts
+
+
+def instrument_tools(timings: dict):
+    """Envuelve ``execute_tool_with_mcp`` del agente para medir cada herramienta."""
+    original = agent.execute_tool_with_mcp
+
+    async def timed(mcp_client, tool_name, arguments):
+        start = time.perf_counter()
+        try:
+            return await original(mcp_client, tool_name, arguments)
+        finally:
+            timings[tool_name].append(time.perf_counter() - start)
+
+    agent.execute_tool_with_mcp = timed
+    return original
+
+
+def measure_startup_and_schema(db_path: str):
+    """Mide el arranque de la sesión MCP (subproceso + handshake) y el esquema en frío y en caliente."""
+    async def measure():
+        start = time.perf_counter()
+        async with agent.get_mcp_pool().acquire(db_path, CONTEXT) as session:
+            startup = time.perf_counter() - start
+            schema = []
+            for _ in range(2):
+                start = time.perf_counter()
+                await agent.execute_tool_with_mcp(session.client, "get_database_schema_tool", {})
+                schema.append(time.perf_counter() - start)
+        return startup, schema
+
+    return run_coroutine(measure())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=str(PROJECT_ROOT / "data" / "enterprise_demo.db"),
+                        help="Base de datos a consultar")
+    parser.add_argument("--synthetic-tables", type=int, default=0,
+                        help="Usar una base sintética con este número de tablas en lugar de --db")
+    parser.add_argument("--enterprise-orders", type=int, default=0,
+                        help="Generar una base enterprise con este número de órdenes en lugar de --db")
+    parser.add_argument("--questions", type=int, default=60, help="Preguntas a procesar")
+    parser.add_argument("--concurrency", type=int, default=4, help="Preguntas simultáneas")
+    parser.add_argument("--latency", type=float, default=0.05, help="Segundos por llamada al modelo falso")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Segundos aleatorios adicionales por llamada")
+    parser.add_argument("--no-preseed", action="store_true",
+                        help="Desactivar SCHEMA_PRESEED (el modelo pide el esquema con una herramienta)")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--max-p95", type=float,
+                        help="Falla (código 1) si la latencia p95 supera estos segundos")
+    args = parser.parse_args()
+
+    if args.no_preseed:
+        os.environ["SCHEMA_PRESEED"] = "0"
+    ask_schema = os.getenv("SCHEMA_PRESEED", "1") != "1"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db
+        if args.synthetic_tables:
+            db_path = os.path.join(tmp_dir, "synthetic.db")
+            create_synthetic_database(db_path, args.synthetic_tables)
+        elif args.enterprise_orders:
+            db_path = os.path.join(tmp_dir, "enterprise.db")
+            generate_enterprise_database(db_path, args.enterprise_orders)
+
+        questions, scripts = build_scenarios(args.synthetic_tables, ask_schema)
+        fake = FakeBedrockClient(scripts=scripts, latency=args.latency, jitter=args.jitter)
+        agent.create_bedrock_client = lambda region_name=None: fake
+
+        startup, schema = measure_startup_and_schema(db_path)
+
+        tool_timings = defaultdict(list)
+        instrument_tools(tool_timings)
+
+        def ask(i):
+            question = questions[i % len(questions)]
+            start = time.perf_counter()
+            result = agent.process_query_with_mcp(question, "Claude 3 Haiku", db_path, CONTEXT)
+            return time.perf_counter() - start, result
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(ask, range(args.questions)))
+        wall = time.perf_counter() - start
+
+        run_coroutine(agent.get_mcp_pool().close())
+
+    latencies = [latency for latency, _ in outcomes]
+    # Cada pregunta guionada ejecuta SQL: sin SQL la pregunta falló
+    errors = sum(
+        1 for _, result in outcomes
+        if not result.get("sql_query") or result["sql_query"].startswith("No se ejecutó")
+    )
+    report = {
+        "database": (
+            f"sintética ({args.synthetic_tables} tablas)" if args.synthetic_tables
+            else f"enterprise generada ({args.enterprise_orders} órdenes)" if args.enterprise_orders
+            else args.db
+        ),
+        "questions": args.questions,
+        "concurrency": args.concurrency,
+        "model_latency_s": args.latency,
+        "errors": errors,
+        "throughput_qps": args.questions / wall,
+        "latency": summarize(latencies),
+        "mcp_startup_ms": startup * 1000,
+        "schema_cold_ms": schema[0] * 1000,
+        "schema_warm_ms": schema[1] * 1000,
+        "tools": {name: summarize(values) for name, values in sorted(tool_timings.items())},
+        "model_calls": fake.calls,
+        "tokens_per_question": {
+            direction: statistics.mean(
+                (result.get("usage") or {}).get(f"{direction}_tokens", 0) for _, result in outcomes
+            )
+            for direction in ("input", "output")
+        },
+        "iterations": agent.get_iteration_stats(),
+    }
+
+    print(f"Base de datos: {report['database']}")
+    print(f"Preguntas: {args.questions} (concurrencia {args.concurrency}), errores: {errors}")
+    print(f"Throughput: {report['throughput_qps']:.1f} preguntas/s")
+    print("Latencia: p50 {p50_ms:.1f} ms | p95 {p95_ms:.1f} ms | p99 {p99_ms:.1f} ms".format(**report["latency"]))
+    print(f"Arranque del servidor MCP: {report['mcp_startup_ms']:.1f} ms")
+    print(f"Esquema: frío {report['schema_cold_ms']:.1f} ms | caliente {report['schema_warm_ms']:.1f} ms")
+    print("Tokens por pregunta: entrada {input:.0f} | salida {output:.0f}".format(
+        **report["tokens_per_question"]))
+    for name, stats in report["tools"].items():
+        print(f"Herramienta {name}: {stats['count']} llamadas, p50 {stats['p50_ms']:.1f} ms, "
+              f"p95 {stats['p95_ms']:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+
+    if errors or (args.max_p95 is not None and report["latency"]["p95_ms"] > args.max_p95 * 1000):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark de extracción del esquema: consultas agregadas vs. tabla por tabla.
+
+Uso:
+    python benchmarks/bench_schema.py --tables 300
+    python benchmarks/bench_schema.py --db data/enterprise_demo.db
+    python benchmarks/bench_schema.py --enterprise-orders 100000 --extra-tables 300
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.generate_enterprise_db import generate_enterprise_database
+from src.database import format_schema, get_database_schema
+
+
+def create_synthetic_database(db_path: str, tables: int, columns: int = 8, indexes: int = 2):
+    """Crea una base de datos con muchas tablas encadenadas por foreign keys e índices."""
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    for t in range(tables):
+        column_defs = [f"id INTEGER PRIMARY KEY"]
+        column_defs += [f"col_{c} TEXT" for c in range(columns)]
+        if t > 0:
+            column_defs.append(f"parent_id INTEGER REFERENCES table_{t - 1}(id)")
+        cursor.execute(f"CREATE TABLE table_{t} ({', '.join(column_defs)})")
+        for i in range(indexes):
+            cursor.execute(f"CREATE INDEX idx_table_{t}_{i} ON table_{t} (col_{i}, col_{i + 1})")
+        cursor.executemany(
+            f"INSERT INTO table_{t} (col_0, col_1) VALUES (?, ?)",
+            [(f"valor {r}", f"otro {r}") for r in range(3)]
+        )
+    connection.commit()
+    connection.close()
+
+
+def time_extraction(db_path: str, bulk: bool, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        connection = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        get_database_schema(connection, bulk=bulk)
+        timings.append(time.perf_counter() - start)
+        connection.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Base de datos existente a medir")
+    parser.add_argument("--tables", type=int, default=300, help="Tablas de la base sintética")
+    parser.add_argument("--enterprise-orders", type=int, default=0,
+                        help="Usar el esquema enterprise generado con este número de órdenes")
+    parser.add_argument("--extra-tables", type=int, default=0,
+                        help="Tablas satélite del esquema enterprise generado")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db
+        if args.enterprise_orders:
+            db_path = os.path.join(tmp_dir, "enterprise.db")
+            generate_enterprise_database(db_path, args.enterprise_orders, args.extra_tables)
+        elif not db_path:
+            db_path = os.path.join(tmp_dir, "synthetic.db")
+            create_synthetic_database(db_path, args.tables)
+
+        connection = sqlite3.connect(db_path)
+        schema = get_database_schema(connection, bulk=True)
+        same = schema == get_database_schema(connection, bulk=False)
+        connection.close()
+
+        format_timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            formatted = format_schema(schema)
+            format_timings.append(time.perf_counter() - start)
+
+        per_table = time_extraction(db_path, bulk=False, repeat=args.repeat)
+        bulk = time_extraction(db_path, bulk=True, repeat=args.repeat)
+
+    if args.enterprise_orders:
+        description = f"enterprise generada ({args.enterprise_orders} órdenes, {args.extra_tables} tablas extra)"
+    else:
+        description = args.db or f"sintética ({args.tables} tablas)"
+    print(f"Base de datos: {description} ({len(schema)} tablas)")
+    print(f"Resultados idénticos: {same}")
+    print(f"Tabla por tabla: mediana {statistics.median(per_table) * 1000:.1f} ms")
+    print(f"Agregada (bulk): mediana {statistics.median(bulk) * 1000:.1f} ms")
+    print(f"Aceleración: {statistics.median(per_table) / statistics.median(bulk):.1f}x")
+    print(f"format_schema: mediana {statistics.median(format_timings) * 1000:.1f} ms "
+          f"({len(formatted)} caracteres)")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark de transportes MCP: subproceso stdio vs. servidor en memoria.
+
+Mide con las mismas herramientas y la misma base de datos, para cada transporte:
+conexión (arranque + handshake), list_tools, una herramienta con resultado
+pequeño (get_context), resultados grandes de execute_sql y llamadas
+concurrentes (esquema, contexto y SQL a la vez, como en el prompt precargado).
+
+Uso:
+    python benchmarks/bench_transport.py
+    python benchmarks/bench_transport.py --enterprise-orders 50000 --rows 20000
+    python benchmarks/bench_transport.py --transports memory --calls 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.bench_agent import summarize
+from benchmarks.generate_enterprise_db import generate_enterprise_database
+from src.mcp.client import MCPClient
+from src.mcp.factory import MCPServerFactory
+
+CONTEXT = "Empresa de demostración para benchmarks."
+
+
+def result_text(result) -> str:
+    return "".join(getattr(item, "text", "") for item in result.content)
+
+
+async def timed(coro_factory, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await coro_factory()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def measure_transport(transport: str, db_path: str, large_query: str,
+                            calls: int, connections: int, concurrency: int) -> dict:
+    """Mide un transporte; cada conexión se abre y se cierra ``connections`` veces."""
+    server_params = MCPServerFactory.create_server(db_path, CONTEXT, transport)
+
+    connect = []
+    for _ in range(connections):
+        start = time.perf_counter()
+        async with MCPClient(server_params):
+            connect.append(time.perf_counter() - start)
+
+    async with MCPClient(server_params) as client:
+        session = client.session
+        list_tools = await timed(session.list_tools, calls)
+        small = await timed(lambda: session.call_tool("get_context", {}), calls)
+
+        # La caché de resultados del servidor respondería sin tocar SQLite: se varía el LIMIT
+        sizes = []
+        counter = iter(range(10 ** 9))
+
+        async def large_call():
+            result = await session.call_tool(
+                "execute_sql", {"query": f"{large_query} LIMIT -1 OFFSET {next(counter) % 7}"}
+            )
+            sizes.append(len(result_text(result).encode("utf-8")))
+
+        large = await timed(large_call, max(1, calls // 5))
+
+        async def concurrent_round():
+            await asyncio.gather(*(
+                session.call_tool(name, arguments)
+                for name, arguments in [
+                    ("get_database_schema_tool", {}),
+                    ("get_context", {}),
+                    ("execute_sql", {"query": large_query + " LIMIT 1000"}),
+                ] * concurrency
+            ))
+
+        concurrent = await timed(concurrent_round, max(1, calls // 10))
+
+    return {
+        "connect": summarize(connect),
+        "list_tools": summarize(list_tools),
+        "call_small": summarize(small),
+        "call_large": {**summarize(large), "payload_bytes": max(sizes)},
+        "concurrent_round": {**summarize(concurrent), "calls_per_round": 3 * concurrency},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=str(PROJECT_ROOT / "data" / "enterprise_demo.db"),
+                        help="Base de datos a consultar")
+    parser.add_argument("--enterprise-orders", type=int, default=20000,
+                        help="Generar una base enterprise con este número de órdenes (0 usa --db)")
+    parser.add_argument("--rows", type=int, default=5000,
+                        help="Filas que execute_sql devuelve en las llamadas grandes (MCP_RESULT_MAX_ROWS)")
+    parser.add_argument("--calls", type=int, default=100, help="Llamadas por medición")
+    parser.add_argument("--connections", type=int, default=3, help="Conexiones a medir")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Rondas simultáneas de (esquema, contexto, SQL) en la medición concurrente")
+    parser.add_argument("--transports", default="stdio,memory", help="Transportes a comparar")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    # Resultados grandes: sin recorte por bytes y con el número de filas pedido
+    os.environ["MCP_RESULT_MAX_ROWS"] = str(args.rows)
+    os.environ["MCP_RESULT_MAX_BYTES"] = str(1 << 30)
+    os.environ["MCP_SQL_CACHE_MAX_ENTRIES"] = "0"
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db
+        large_query = "SELECT * FROM customers"
+        if args.enterprise_orders:
+            db_path = os.path.join(tmp_dir, "enterprise.db")
+            generate_enterprise_database(db_path, args.enterprise_orders)
+            large_query = "SELECT * FROM order_items"
+
+        for transport in args.transports.split(","):
+            report[transport] = asyncio.run(measure_transport(
+                transport, db_path, large_query, args.calls, args.connections, args.concurrency
+            ))
+
+    for transport, stats in report.items():
+        print(f"== {transport}")
+        print(f"Conexión: p50 {stats['connect']['p50_ms']:.1f} ms")
+        for name in ("list_tools", "call_small", "call_large", "concurrent_round"):
+            print(f"{name}: p50 {stats[name]['p50_ms']:.2f} ms | p95 {stats[name]['p95_ms']:.2f} ms")
+        print(f"Resultado grande: {stats['call_large']['payload_bytes'] / 1024:.0f} KiB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
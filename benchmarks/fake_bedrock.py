@@ -0,0 +1,158 @@
+"""Sustituto local y determinista del cliente de Bedrock para benchmarks sin AWS.
+
+Implementa ``converse`` y ``converse_stream`` con respuestas guionadas: para
+cada pregunta, el guion indica qué herramientas pide el modelo en cada turno y
+cuál es la respuesta final. El turno se deduce de los mensajes recibidos (cuántas
+respuestas del asistente hay), así que el cliente no guarda estado por
+conversación y puede usarse desde muchos hilos a la vez. Con historial de
+sesión, la pregunta es el último mensaje de texto del usuario y los turnos se
+cuentan desde ahí.
+"""
+import json
+import random
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Preguntas y SQL de ejemplo sobre data/enterprise_demo.db
+ENTERPRISE_SCENARIOS = [
+    ("¿Cuántos clientes hay por país?",
+     "SELECT country, COUNT(*) AS clientes FROM customers GROUP BY country ORDER BY clientes DESC"),
+    ("¿Cuál es el monto pendiente de las órdenes?",
+     "SELECT SUM(total_amount) FROM orders WHERE status != 'delivered'"),
+    ("¿Qué productos tienen menos existencias que su stock de seguridad?",
+     "SELECT p.name, i.on_hand, i.safety_stock FROM inventory i "
+     "JOIN products p ON p.product_id = i.product_id WHERE i.on_hand < i.safety_stock"),
+    ("¿Cuánto vendió cada categoría?",
+     "SELECT c.name, SUM(oi.quantity * oi.unit_price * (1 - oi.discount)) AS ventas "
+     "FROM order_items oi JOIN products p ON p.product_id = oi.product_id "
+     "JOIN categories c ON c.category_id = p.category_id GROUP BY c.name ORDER BY ventas DESC"),
+    ("¿Qué tickets de soporte siguen abiertos?",
+     "SELECT ticket_id, subject, severity FROM support_tickets WHERE status != 'closed'"),
+    ("¿Cuál es el salario promedio por departamento?",
+     "SELECT d.name, AVG(e.salary) FROM employees e "
+     "JOIN departments d ON d.department_id = e.department_id GROUP BY d.name"),
+]
+
+
+def sql_script(sql: str, ask_schema: bool = False) -> List[Dict]:
+    """
+    Guion típico: (opcionalmente) pedir el esquema, ejecutar la SQL y responder.
+
+    Cada turno es ``{"tools": [(nombre, input), ...]}`` o ``{"text": respuesta}``.
+    """
+    turns = []
+    if ask_schema:
+        turns.append({"tools": [("get_database_schema_tool", {})]})
+    turns.append({"tools": [("execute_sql", {"query": sql})]})
+    turns.append({"text": "Según los datos consultados, este es el resultado solicitado."})
+    return turns
+
+
+class FakeBedrockClient:
+    """
+    Cliente falso de ``bedrock-runtime`` con latencia configurable.
+
+    Args:
+        scripts: Pregunta -> lista de turnos (ver ``sql_script``)
+        default_script: Función pregunta -> turnos para preguntas sin guion
+        latency: Segundos fijos por llamada (tiempo hasta el primer token)
+        jitter: Segundos aleatorios adicionales (0 a ``jitter``), deterministas por pregunta y turno
+        chunk_delay: Segundos entre fragmentos de texto en ``converse_stream``
+        seed: Semilla de la latencia aleatoria
+    """
+
+    def __init__(self, scripts: Optional[Dict[str, List[Dict]]] = None,
+                 default_script: Optional[Callable[[str], List[Dict]]] = None,
+                 latency: float = 0.05, jitter: float = 0.0, chunk_delay: float = 0.0,
+                 seed: int = 0):
+        self.scripts = scripts or {}
+        self.default_script = default_script or (lambda question: [{"text": "Sin guion."}])
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.seed = seed
+        self.calls = 0
+        self.meta = SimpleNamespace(region_name="local")
+
+    def _turn(self, kwargs) -> Tuple[Dict, int]:
+        messages = kwargs["messages"]
+        start = max(
+            index for index, message in enumerate(messages)
+            if message["role"] == "user" and "text" in message["content"][0]
+        )
+        question = messages[start]["content"][0]["text"]
+        turn_index = sum(1 for message in messages[start:] if message["role"] == "assistant")
+        turns = self.scripts.get(question) or self.default_script(question)
+        # Si el agente pide más turnos de los guionados, repetir la respuesta final
+        turn = turns[min(turn_index, len(turns) - 1)]
+
+        self.calls += 1
+        delay = self.latency
+        if self.jitter:
+            rng = random.Random(zlib.crc32(f"{self.seed}:{question}:{turn_index}".encode("utf-8")))
+            delay += rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return turn, len(messages)
+
+    @staticmethod
+    def _content(turn: Dict, position: int) -> List[Dict]:
+        if "text" in turn:
+            return [{"text": turn["text"]}]
+        return [
+            {"toolUse": {"toolUseId": f"tool-{position}-{i}", "name": name, "input": tool_input}}
+            for i, (name, tool_input) in enumerate(turn["tools"])
+        ]
+
+    @staticmethod
+    def _usage(kwargs, content) -> Dict[str, int]:
+        # Aproximación de tokens: ~4 caracteres por token
+        input_chars = len(json.dumps(kwargs.get("messages", []), ensure_ascii=False))
+        input_chars += len(json.dumps(kwargs.get("system", []), ensure_ascii=False))
+        output_chars = len(json.dumps(content, ensure_ascii=False))
+        return {
+            "inputTokens": input_chars // 4,
+            "outputTokens": output_chars // 4,
+            "totalTokens": (input_chars + output_chars) // 4,
+        }
+
+    def converse(self, **kwargs) -> Dict:
+        turn, position = self._turn(kwargs)
+        content = self._content(turn, position)
+        return {
+            "output": {"message": {"role": "assistant", "content": content}},
+            "stopReason": "end_turn" if "text" in turn else "tool_use",
+            "usage": self._usage(kwargs, content),
+            "metrics": {"latencyMs": int(self.latency * 1000)},
+        }
+
+    def converse_stream(self, **kwargs) -> Dict:
+        turn, position = self._turn(kwargs)
+        content = self._content(turn, position)
+        return {"stream": self._events(turn, content, self._usage(kwargs, content))}
+
+    def _events(self, turn: Dict, content: List[Dict], usage: Dict):
+        yield {"messageStart": {"role": "assistant"}}
+        for index, block in enumerate(content):
+            if "text" in block:
+                words = block["text"].split(" ")
+                for i, word in enumerate(words):
+                    if self.chunk_delay:
+                        time.sleep(self.chunk_delay)
+                    text = word if i == len(words) - 1 else word + " "
+                    yield {"contentBlockDelta": {"contentBlockIndex": index, "delta": {"text": text}}}
+            else:
+                tool_use = block["toolUse"]
+                yield {"contentBlockStart": {
+                    "contentBlockIndex": index,
+                    "start": {"toolUse": {"toolUseId": tool_use["toolUseId"], "name": tool_use["name"]}},
+                }}
+                yield {"contentBlockDelta": {
+                    "contentBlockIndex": index,
+                    "delta": {"toolUse": {"input": json.dumps(tool_use["input"])}},
+                }}
+            yield {"contentBlockStop": {"contentBlockIndex": index}}
+        yield {"messageStop": {"stopReason": "end_turn" if "text" in turn else "tool_use"}}
+        yield {"metadata": {"usage": usage, "metrics": {"latencyMs": int(self.latency * 1000)}}}
@@ -0,0 +1,379 @@
+"""Generador de bases de datos enterprise grandes para pruebas de escala.
+
+Crea el esquema de ``data/enterprise_demo.sql`` (mismas tablas y constraints) y
+lo llena con datos sintéticos a la escala pedida, manteniendo la integridad de
+las foreign keys: cada orden tiene sus ítems, su total coincide con ellos, las
+órdenes ganadas tienen pagos y envíos, etc. Las distribuciones son sesgadas
+como en datos reales (pocos clientes concentran muchas órdenes, precios
+log-normales, estacionalidad en las fechas).
+
+Con ``--extra-tables`` agrega cientos de tablas satélite (atributos, notas,
+eventos…) con foreign keys a las tablas principales, para medir la extracción y
+el formateo de esquemas grandes.
+
+Uso:
+    python benchmarks/generate_enterprise_db.py --output /tmp/enterprise_1m.db --orders 120000
+    python benchmarks/generate_enterprise_db.py --output /tmp/wide.db --orders 10000 --extra-tables 300
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SCHEMA_SQL = PROJECT_ROOT / "data" / "enterprise_demo.sql"
+
+# Filas insertadas por cada executemany/transacción
+BATCH_SIZE = 50000
+
+COUNTRIES = [
+    ("México", 0.22), ("Brasil", 0.2), ("Chile", 0.12), ("Colombia", 0.12), ("Argentina", 0.1),
+    ("Perú", 0.08), ("Estados Unidos", 0.1), ("España", 0.06),
+]
+REGIONS = ["LATAM Norte", "LATAM Sur", "Norteamérica", "Europa"]
+SEGMENTS = [("SMB", 0.6), ("Mid-Market", 0.28), ("Enterprise", 0.12)]
+ORDER_STATUSES = [("Closed Won", 0.62), ("Negotiation", 0.18), ("Closed Lost", 0.12), ("Draft", 0.08)]
+PAYMENT_METHODS = [("Transferencia", 0.45), ("Tarjeta de Crédito", 0.4), ("Cheque", 0.15)]
+CARRIERS = ["DHL", "FedEx", "UPS", "Correos", "Chilexpress", "Estafeta"]
+TICKET_STATUSES = [("Open", 0.3), ("In Progress", 0.25), ("Closed", 0.45)]
+SEVERITIES = [("low", 0.4), ("medium", 0.35), ("high", 0.2), ("urgent", 0.05)]
+TITLES = ["Analista", "Ejecutivo de Cuentas", "Ingeniero", "Gerente", "Especialista", "Coordinador"]
+DEPARTMENTS = ["Ventas", "Operaciones", "Soporte", "Finanzas", "Tecnología", "Marketing", "Logística"]
+CATEGORY_NAMES = [
+    "Software", "Hardware", "Servicios", "Cloud", "Seguridad", "Analítica", "Redes",
+    "Almacenamiento", "Licencias", "Consultoría",
+]
+FIRST_NAMES = ["Valentina", "Carlos", "Susan", "Martín", "Lucía", "Diego", "Ana", "Jorge", "Camila", "Pedro"]
+LAST_NAMES = ["Ortiz", "Pérez", "Clark", "Gómez", "Rojas", "Silva", "Torres", "Díaz", "Muñoz", "Castro"]
+TICKET_SUBJECTS = [
+    "Duda sobre licenciamiento", "Incidencia en activación", "Consulta sobre facturación",
+    "Retraso en el envío", "Solicitud de capacitación", "Error en la integración",
+]
+
+# Tablas satélite para --extra-tables: sufijo y columnas adicionales
+EXTRA_TABLE_KINDS = [
+    ("attributes", ["attribute_name TEXT NOT NULL", "attribute_value TEXT"]),
+    ("notes", ["author TEXT NOT NULL", "body TEXT NOT NULL", "created_at TEXT NOT NULL"]),
+    ("events", ["event_type TEXT NOT NULL", "occurred_at TEXT NOT NULL", "payload TEXT"]),
+    ("metrics", ["metric TEXT NOT NULL", "value REAL NOT NULL", "measured_at TEXT NOT NULL"]),
+]
+EXTRA_TABLE_PARENTS = ["customers", "products", "orders", "employees", "warehouses"]
+
+START_DATE = date(2023, 1, 1)
+DAYS = 3 * 365
+
+
+def weighted(rng: random.Random, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def skewed_id(rng: random.Random, count: int, skew: float = 2.0) -> int:
+    """Id entre 1 y ``count`` con sesgo hacia los primeros (pocos concentran mucho)."""
+    return 1 + min(count - 1, int(count * rng.random() ** skew))
+
+
+def seasonal_date(rng: random.Random) -> date:
+    """Fecha con más actividad a fin de trimestre."""
+    while True:
+        day = START_DATE + timedelta(days=rng.randrange(DAYS))
+        if rng.random() < (0.6 if day.month % 3 else 1.0):
+            return day
+
+
+def person_name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def create_schema(connection: sqlite3.Connection):
+    """Ejecuta las sentencias DROP/CREATE de enterprise_demo.sql (sin los INSERT)."""
+    statement = ""
+    for line in SCHEMA_SQL.read_text(encoding="utf-8").splitlines(keepends=True):
+        if not statement and line.lstrip().startswith("--"):
+            continue
+        statement += line
+        if not sqlite3.complete_statement(statement):
+            continue
+        if statement.strip().upper().startswith(("CREATE", "DROP")):
+            connection.execute(statement)
+        statement = ""
+
+
+def insert_rows(connection: sqlite3.Connection, table: str, columns: list, rows):
+    """Inserta filas de un iterable en lotes con executemany, una transacción por lote."""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            with connection:
+                connection.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        with connection:
+            connection.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def plan_scale(orders: int) -> dict:
+    """Cantidad de filas de las tablas maestras según el número de órdenes."""
+    employees = max(20, orders // 500)
+    companies = max(2, employees // 200)
+    return {
+        "companies": companies,
+        "departments": companies * len(DEPARTMENTS),
+        "employees": employees,
+        "categories": len(CATEGORY_NAMES) * 4,
+        "products": max(50, orders // 200),
+        "customers": max(20, orders // 10),
+        "warehouses": max(2, min(200, orders // 50000)),
+        "orders": orders,
+    }
+
+
+def generate_enterprise_database(db_path: str, orders: int = 10000, extra_tables: int = 0,
+                                 extra_rows: int = 100, seed: int = 0, verbose: bool = False) -> dict:
+    """
+    Crea ``db_path`` con el esquema enterprise escalado.
+
+    Las filas totales son ~7 veces ``orders`` (ítems, pagos, envíos y tickets),
+    más ``extra_tables`` * ``extra_rows`` en tablas satélite.
+
+    Returns:
+        dict: Filas insertadas por tabla
+    """
+    rng = random.Random(seed)
+    scale = plan_scale(orders)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    connection = sqlite3.connect(db_path)
+    # Carga rápida: la integridad la garantiza el generador y se verifica al final
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA foreign_keys = OFF")
+    create_schema(connection)
+    counts = {}
+
+    def load(table, columns, rows, report=True):
+        start = time.perf_counter()
+        counts[table] = counts.get(table, 0) + insert_rows(connection, table, columns, rows)
+        if verbose and report:
+            print(f"  {table}: {counts[table]} filas ({time.perf_counter() - start:.1f} s)", flush=True)
+
+    load("companies", ["company_id", "name", "region", "founded_year"], (
+        (i, f"Empresa {i}", rng.choice(REGIONS), rng.randint(1980, 2020))
+        for i in range(1, scale["companies"] + 1)
+    ))
+    load("departments", ["department_id", "company_id", "name", "cost_center"], (
+        (i, (i - 1) // len(DEPARTMENTS) + 1, DEPARTMENTS[(i - 1) % len(DEPARTMENTS)], f"CC-{i:06d}")
+        for i in range(1, scale["departments"] + 1)
+    ))
+    # Los gerentes son los primeros empleados de cada departamento
+    departments = scale["departments"]
+    load("employees", ["employee_id", "department_id", "full_name", "title", "manager_id",
+                       "salary", "hire_date"], (
+        (
+            i,
+            (i - 1) % departments + 1,
+            person_name(rng),
+            "Gerente" if i <= departments else rng.choice(TITLES),
+            None if i <= departments else (i - 1) % departments + 1,
+            round(rng.lognormvariate(8.3, 0.35), 2),
+            (date(2010, 1, 1) + timedelta(days=rng.randrange(5000))).isoformat(),
+        )
+        for i in range(1, scale["employees"] + 1)
+    ))
+    top_categories = len(CATEGORY_NAMES)
+    load("categories", ["category_id", "name", "parent_category_id"], (
+        (
+            i,
+            CATEGORY_NAMES[i - 1] if i <= top_categories
+            else f"{CATEGORY_NAMES[(i - 1) % top_categories]} {(i - 1) // top_categories}",
+            None if i <= top_categories else (i - 1) % top_categories + 1,
+        )
+        for i in range(1, scale["categories"] + 1)
+    ))
+    prices = [round(rng.lognormvariate(5.5, 1.0), 2) for _ in range(scale["products"])]
+    load("products", ["product_id", "category_id", "name", "sku", "price", "lifecycle_stage"], (
+        (
+            i,
+            rng.randint(top_categories + 1, scale["categories"]),
+            f"Producto {i}",
+            f"SKU-{i:08d}",
+            prices[i - 1],
+            weighted(rng, [("active", 0.8), ("discontinued", 0.15), ("draft", 0.05)]),
+        )
+        for i in range(1, scale["products"] + 1)
+    ))
+    load("customers", ["customer_id", "company_name", "contact_name", "country", "segment"], (
+        (i, f"Cliente {i}", person_name(rng), weighted(rng, COUNTRIES), weighted(rng, SEGMENTS))
+        for i in range(1, scale["customers"] + 1)
+    ))
+    load("warehouses", ["warehouse_id", "name", "region", "manager_id"], (
+        (i, f"Almacén {i}", rng.choice(REGIONS), rng.randint(1, scale["employees"]))
+        for i in range(1, scale["warehouses"] + 1)
+    ))
+
+    def inventory_rows():
+        inventory_id = 0
+        for warehouse_id in range(1, scale["warehouses"] + 1):
+            for product_id in range(1, scale["products"] + 1):
+                if rng.random() < 0.6:
+                    inventory_id += 1
+                    yield (inventory_id, warehouse_id, product_id,
+                           int(rng.expovariate(1 / 80)), rng.randint(5, 40))
+
+    load("inventory", ["inventory_id", "warehouse_id", "product_id", "on_hand", "safety_stock"],
+         inventory_rows())
+
+    # Órdenes y sus tablas dependientes, generadas por bloques para acotar la memoria
+    ids = {"order_item": 0, "payment": 0, "shipment": 0, "shipment_item": 0, "ticket": 0}
+    for chunk_start in range(1, orders + 1, BATCH_SIZE):
+        order_rows, item_rows, payment_rows = [], [], []
+        shipment_rows, shipment_item_rows, ticket_rows = [], [], []
+        for order_id in range(chunk_start, min(orders, chunk_start + BATCH_SIZE - 1) + 1):
+            customer_id = skewed_id(rng, scale["customers"])
+            order_date = seasonal_date(rng)
+            status = weighted(rng, ORDER_STATUSES)
+            items = []
+            for _ in range(min(12, 1 + int(rng.expovariate(0.5)))):
+                product_id = skewed_id(rng, scale["products"], skew=1.5)
+                quantity = 1 + int(rng.expovariate(0.3))
+                discount = rng.choice((0, 0, 0, 0.05, 0.1, 0.15))
+                ids["order_item"] += 1
+                items.append((ids["order_item"], order_id, product_id, quantity,
+                              prices[product_id - 1], discount))
+            total = 0.0 if status == "Closed Lost" else round(
+                sum(quantity * price * (1 - discount) for _, _, _, quantity, price, discount in items), 2
+            )
+            order_rows.append((order_id, customer_id, rng.randint(1, scale["employees"]),
+                               order_date.isoformat(), status, total))
+            item_rows.extend(items)
+
+            if status == "Closed Won":
+                # Uno o dos pagos que suman el total de la orden
+                installments = 1 if rng.random() < 0.7 else 2
+                paid = 0.0
+                for n in range(installments):
+                    amount = total - paid if n == installments - 1 else round(total * 0.5, 2)
+                    paid += amount
+                    ids["payment"] += 1
+                    payment_rows.append((
+                        ids["payment"], order_id,
+                        (order_date + timedelta(days=rng.randint(1, 45))).isoformat(),
+                        weighted(rng, PAYMENT_METHODS), round(amount, 2),
+                        "Pagado" if n == installments - 1 else "Parcial",
+                    ))
+                ids["shipment"] += 1
+                shipment_rows.append((
+                    ids["shipment"], order_id, rng.randint(1, scale["warehouses"]),
+                    (order_date + timedelta(days=rng.randint(1, 20))).isoformat(),
+                    rng.choice(CARRIERS), f"TRK{ids['shipment']:010d}",
+                ))
+                for _, _, product_id, quantity, _, _ in items:
+                    ids["shipment_item"] += 1
+                    shipment_item_rows.append((ids["shipment_item"], ids["shipment"], product_id, quantity))
+
+            if rng.random() < 0.05:
+                ids["ticket"] += 1
+                ticket_rows.append((
+                    ids["ticket"], order_id if rng.random() < 0.8 else None, customer_id,
+                    rng.randint(1, scale["employees"]),
+                    f"{(order_date + timedelta(days=rng.randint(0, 60))).isoformat()} "
+                    f"{rng.randint(8, 19):02d}:{rng.randint(0, 59):02d}",
+                    weighted(rng, SEVERITIES), weighted(rng, TICKET_STATUSES), rng.choice(TICKET_SUBJECTS),
+                ))
+
+        load("orders", ["order_id", "customer_id", "account_owner_id", "order_date", "status",
+                        "total_amount"], order_rows, report=False)
+        load("order_items", ["order_item_id", "order_id", "product_id", "quantity", "unit_price",
+                             "discount"], item_rows, report=False)
+        load("payments", ["payment_id", "order_id", "payment_date", "method", "amount", "status"],
+             payment_rows, report=False)
+        load("shipments", ["shipment_id", "order_id", "warehouse_id", "ship_date", "carrier",
+                           "tracking_number"], shipment_rows, report=False)
+        load("shipment_items", ["shipment_item_id", "shipment_id", "product_id", "quantity"],
+             shipment_item_rows, report=False)
+        load("support_tickets", ["ticket_id", "order_id", "customer_id", "assigned_employee_id",
+                                 "opened_at", "severity", "status", "subject"], ticket_rows, report=False)
+        if verbose:
+            print(f"  orders: {counts['orders']} de {orders}", flush=True)
+
+    for i in range(extra_tables):
+        suffix, extra_columns = EXTRA_TABLE_KINDS[i % len(EXTRA_TABLE_KINDS)]
+        parent = EXTRA_TABLE_PARENTS[(i // len(EXTRA_TABLE_KINDS)) % len(EXTRA_TABLE_PARENTS)]
+        parent_key = parent[:-1] + "_id"
+        table = f"{parent[:-1]}_{suffix}_{i}"
+        connection.execute(
+            f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, "
+            f"{parent_key} INTEGER NOT NULL REFERENCES {parent}({parent_key}), "
+            f"{', '.join(extra_columns)})"
+        )
+        connection.execute(f"CREATE INDEX idx_{table}_{parent_key} ON {table} ({parent_key})")
+        parent_count = counts[parent]
+        values = {
+            "attributes": lambda n: (f"atributo_{n % 20}", f"valor {n}"),
+            "notes": lambda n: (person_name(rng), f"Nota de seguimiento {n}", seasonal_date(rng).isoformat()),
+            "events": lambda n: (rng.choice(("created", "updated", "viewed")), seasonal_date(rng).isoformat(), None),
+            "metrics": lambda n: (f"metrica_{n % 10}", round(rng.random() * 100, 2), seasonal_date(rng).isoformat()),
+        }[suffix]
+        load(table, ["id", parent_key] + [column.split()[0] for column in extra_columns], (
+            (n, skewed_id(rng, parent_count), *values(n)) for n in range(1, extra_rows + 1)
+        ), report=False)
+    if verbose and extra_tables:
+        print(f"  {extra_tables} tablas satélite con {extra_rows} filas cada una", flush=True)
+
+    # Índices sobre las foreign keys, creados después de la carga (más rápido que mantenerlos)
+    for table, column in [
+        ("departments", "company_id"), ("employees", "department_id"), ("products", "category_id"),
+        ("orders", "customer_id"), ("orders", "account_owner_id"), ("order_items", "order_id"),
+        ("order_items", "product_id"), ("payments", "order_id"), ("shipments", "order_id"),
+        ("shipment_items", "shipment_id"), ("support_tickets", "customer_id"),
+    ]:
+        connection.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+    connection.execute("PRAGMA analysis_limit = 1000")
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", required=True, help="Archivo SQLite a crear (se reemplaza si existe)")
+    parser.add_argument("--orders", type=int, default=10000,
+                        help="Órdenes a generar; el total de filas es ~7 veces este número")
+    parser.add_argument("--extra-tables", type=int, default=0, help="Tablas satélite adicionales")
+    parser.add_argument("--extra-rows", type=int, default=100, help="Filas por tabla satélite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="Verificar las foreign keys al terminar")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print(f"Generando {args.output}...")
+    counts = generate_enterprise_database(
+        args.output, args.orders, args.extra_tables, args.extra_rows, args.seed, verbose=True
+    )
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"Tablas: {len(counts)}, filas: {total} en {elapsed:.1f} s "
+          f"({total / elapsed:,.0f} filas/s), {os.path.getsize(args.output) / 2 ** 20:.1f} MiB")
+
+    if args.check:
+        connection = sqlite3.connect(args.output)
+        violations = connection.execute("PRAGMA foreign_key_check").fetchall()
+        connection.close()
+        print(f"Violaciones de foreign keys: {len(violations)}")
+        if violations:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
-from src.ui import create_ui
+from src.ui import configure_queue, create_ui, get_gradio_concurrency_limit
+from src.runtime import get_event_loop
 import os
 
 if __name__ == "__main__":
-    interface = create_ui()
     # Obtener host y puerto de variables de entorno (para Docker)
     host = os.getenv("GRADIO_HOST", "0.0.0.0")
     port = int(os.getenv("GRADIO_PORT", "7860"))
-    interface.launch(server_name=host, server_port=port, share=False)
+    # Iniciar el bucle compartido del agente antes de recibir la primera pregunta
+    get_event_loop()
 
+    if os.getenv("SERVE_API", "0") == "1":
+        # API HTTP (/v1/query, /v1/batch) y la interfaz de Gradio en el mismo servidor
+        import uvicorn
+        from src.api import create_server_app
+
+        uvicorn.run(create_server_app(), host=host, port=port)
+    else:
+        interface = configure_queue(create_ui())
+        interface.launch(
+            server_name=host,
+            server_port=port,
+            share=False,
+            # Los hilos de Gradio deben alcanzar para todas las preguntas simultáneas
+            max_threads=max(40, get_gradio_concurrency_limit())
+        )
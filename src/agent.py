@@ -1,34 +1,135 @@
 """Agente usando MCP con Bedrock Converse API directamente."""
-from mcp import StdioServerParameters
 from src.mcp.client import MCPClient
-from src.mcp.factory import MCPServerFactory
+from src.mcp.pool import MCPClientPool
+from src.bedrock import converse_async, converse_stream_async, create_bedrock_client
+from src.cache import AnswerCache
+from src.conversation import SCHEMA_TOOLS, TokenBudget, compact_messages, estimate_tokens
+from src.columnar import find_result_file
+from src.database import get_database_fingerprint
+from src.runtime import iterate_async, run_coroutine
+from src.session import SessionStore
+from src.metrics import span
 import os
 import asyncio
-import boto3
 import json
+import threading
 
+# Pool de sesiones MCP compartido por todas las preguntas del proceso
+_mcp_pool = None
 
-def get_bedrock_model_id(model_name: str) -> str:
-    """Convierte el nombre del modelo a formato Bedrock."""
-    model_mapping = {
-        "Claude 3 Sonnet": "anthropic.claude-3-sonnet-20240229-v1:0",
-        "Claude 3 Haiku": "anthropic.claude-3-haiku-20240307-v1:0",
-        "Llama 3 70B": "meta.llama3-70b-instruct-v1:0"
-    }
-    return model_mapping.get(model_name, "anthropic.claude-3-haiku-20240307-v1:0")
+# Caché de respuestas a preguntas repetidas
+_answer_cache = None
+
+# Historial de conversación por sesión (preguntas de seguimiento)
+_session_store = None
+
+# Modelos que se pueden elegir en la interfaz y la API: nombre -> id de Bedrock.
+# Claude 3.5 Haiku y 3.7 Sonnet se invocan con su perfil de inferencia entre regiones
+BEDROCK_MODELS = {
+    "Claude 3.7 Sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    "Claude 3.5 Haiku": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+    "Claude 3 Sonnet": "anthropic.claude-3-sonnet-20240229-v1:0",
+    "Claude 3 Haiku": "anthropic.claude-3-haiku-20240307-v1:0",
+    "Llama 3 70B": "meta.llama3-70b-instruct-v1:0",
+}
+
+# Modelos de Bedrock que soportan prompt caching (marcadores cachePoint)
+PROMPT_CACHE_MODEL_PREFIXES = (
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet",
+    "anthropic.claude-sonnet-4",
+    "anthropic.claude-opus-4",
+    "amazon.nova",
+)
+
+# SQL que se muestra cuando la respuesta no ejecutó ninguna consulta
+NO_SQL_EXECUTED = "No se ejecutó ninguna consulta SQL."
+
+# Iteraciones del ciclo conversacional por modo de prompt ("preseeded" / "standard")
+_iteration_stats = {}
+_iteration_stats_lock = threading.Lock()
+
+
+def get_mcp_pool() -> MCPClientPool:
+    """Retorna el pool de sesiones MCP del proceso, creándolo si es necesario."""
+    global _mcp_pool
+    if _mcp_pool is None:
+        _mcp_pool = MCPClientPool()
+    return _mcp_pool
 
 
-def create_bedrock_client():
+def get_answer_cache() -> AnswerCache:
+    """Retorna la caché de respuestas del proceso, creándola si es necesario."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
+
+
+def get_session_store() -> SessionStore:
+    """Retorna el almacén de sesiones del proceso, creándolo si es necesario."""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
+
+
+async def answer_from_cache(question: str, model_id: str, db_path: str, context: str,
+                            similar: bool = True):
     """
-    Crea cliente de Bedrock usando credenciales de IAM Role automáticamente.
+    Busca una respuesta guardada para la pregunta sin llamar al modelo.
+    
+    Con ``similar`` en falso solo se acepta la misma pregunta, no una parecida.
     
-    boto3 detectará automáticamente las credenciales en este orden:
-    1. Variables de entorno (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
-    2. Archivo de credenciales (~/.aws/credentials)
-    3. IAM Role asignado a la instancia EC2/ECS/Lambda
+    Si la base de datos cambió desde que se guardó la respuesta y
+    ANSWER_CACHE_REEXECUTE está activo, vuelve a ejecutar la SQL guardada
+    contra los datos actuales; en otro caso la entrada se considera vencida.
+    
+    Returns:
+        tuple: (respuesta o None, ámbito de la caché, firma de la base de datos)
     """
-    session = boto3.Session(region_name='us-east-1')
-    return session.client('bedrock-runtime')
+    cache = get_answer_cache()
+    if not cache.enabled:
+        return None, None, None
+    try:
+        db_identity, db_signature = get_database_fingerprint(db_path)
+    except OSError:
+        return None, None, None
+    
+    scope = cache.make_scope(model_id, db_identity, context)
+    entry = cache.lookup(question, scope, similar)
+    if entry is None:
+        return None, scope, db_signature
+    
+    if entry["db_signature"] == db_signature:
+        return {
+            "sql_query": entry["sql_query"] or NO_SQL_EXECUTED,
+            "response": entry["response"],
+            "cached": True
+        }, scope, db_signature
+    
+    reexecute = os.getenv("ANSWER_CACHE_REEXECUTE", "0") == "1"
+    if not reexecute or not entry["sql_query"]:
+        return None, scope, db_signature
+    
+    async with get_mcp_pool().acquire(db_path, context) as session:
+        fresh_result = await execute_tool_with_mcp(
+            session.client, "execute_sql", {"query": entry["sql_query"]}
+        )
+    return {
+        "sql_query": entry["sql_query"],
+        "response": (
+            f"{entry['response']}\n\n"
+            "(Respuesta en caché; los datos cambiaron desde entonces. "
+            f"Resultado actual de la consulta:)\n{fresh_result}"
+        ),
+        "cached": True
+    }, scope, db_signature
+
+
+def get_bedrock_model_id(model_name: str) -> str:
+    """Convierte el nombre del modelo a formato Bedrock."""
+    return BEDROCK_MODELS.get(model_name, BEDROCK_MODELS["Claude 3 Haiku"])
 
 
 def convert_mcp_tool_to_bedrock(tool):
@@ -124,48 +225,304 @@ async def execute_tool_with_mcp(mcp_client: MCPClient, tool_name: str, arguments
         return f"Error ejecutando herramienta {tool_name}: {str(e)}"
 
 
+async def execute_tools_concurrently(mcp_client: MCPClient, tool_uses: list,
+                                     max_concurrency: int = None, timeout: float = None) -> list:
+    """
+    Ejecuta en paralelo las herramientas pedidas por el modelo en un mismo turno.
+    
+    Args:
+        mcp_client: Cliente MCP conectado
+        tool_uses: Bloques toolUse de la respuesta del modelo
+        max_concurrency: Máximo de herramientas simultáneas (TOOL_MAX_CONCURRENCY)
+        timeout: Segundos máximos por herramienta (TOOL_TIMEOUT)
+        
+    Returns:
+        list: Texto del resultado de cada herramienta, en el mismo orden que ``tool_uses``
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+    if timeout is None:
+        timeout = float(os.getenv("TOOL_TIMEOUT", "60"))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run_tool(tool_use):
+        tool_name = tool_use.get('name')
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    execute_tool_with_mcp(mcp_client, tool_name, tool_use.get('input', {})),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                return f"Error ejecutando herramienta {tool_name}: se superó el tiempo límite de {timeout:g} s"
+    
+    return await asyncio.gather(*(run_tool(tool_use) for tool_use in tool_uses))
+
+
+def model_supports_prompt_caching(model_id: str) -> bool:
+    """Indica si el modelo de Bedrock acepta marcadores cachePoint en el prompt."""
+    return any(prefix in model_id for prefix in PROMPT_CACHE_MODEL_PREFIXES)
+
+
+async def build_preseeded_system_prompt(mcp_client: MCPClient, model_id: str,
+                                        question: str) -> list:
+    """
+    Construye el prompt de sistema con el esquema y el contexto ya incluidos.
+    
+    Obtiene ambos de las herramientas MCP (el esquema sale de la caché del
+    servidor) para que el modelo pueda escribir la SQL desde la primera
+    iteración sin llamar a get_database_schema_tool. Con
+    SCHEMA_PRESEED_MODE=relevant solo se incluyen las tablas relevantes para
+    la pregunta.
+    
+    Returns:
+        list: Bloques ``system`` para la Converse API (vacía si no hay esquema)
+    """
+    if os.getenv("SCHEMA_PRESEED_MODE", "full") == "relevant":
+        schema_call = {"name": "get_relevant_schema_tool", "input": {"question": question}}
+    else:
+        schema_call = {"name": "get_database_schema_tool", "input": {}}
+    schema_text, context_text = await execute_tools_concurrently(mcp_client, [
+        schema_call,
+        {"name": "get_context", "input": {}}
+    ])
+    if schema_text.startswith("Error"):
+        return []
+    
+    system_blocks = [{
+        "text": (
+            "Eres un agente Text-to-SQL sobre una base de datos SQLite.\n\n"
+            f"CONTEXTO DE LA EMPRESA:\n{context_text}\n\n"
+            "ESQUEMA DE LA BASE DE DATOS (ya lo tienes, no necesitas llamar a "
+            f"get_database_schema_tool):\n{schema_text}"
+        )
+    }]
+    if model_supports_prompt_caching(model_id):
+        system_blocks.append({"cachePoint": {"type": "default"}})
+    return system_blocks
+
+
+def record_iterations(mode: str, iterations: int):
+    """Acumula las iteraciones usadas por pregunta según el modo del prompt."""
+    with _iteration_stats_lock:
+        stats = _iteration_stats.setdefault(mode, {"questions": 0, "iterations": 0})
+        stats["questions"] += 1
+        stats["iterations"] += iterations
+
+
+def get_iteration_stats() -> dict:
+    """Retorna preguntas, iteraciones y promedio de iteraciones por pregunta según el modo."""
+    with _iteration_stats_lock:
+        return {
+            mode: {
+                **stats,
+                "average": stats["iterations"] / stats["questions"] if stats["questions"] else 0.0
+            }
+            for mode, stats in _iteration_stats.items()
+        }
+
+
 async def process_with_bedrock_converse(bedrock_client, model_id: str, question: str, 
-                                        mcp_client: MCPClient, tools: list):
+                                        mcp_client: MCPClient, tools: list,
+                                        preseed_schema: bool = None, history: dict = None):
     """
     Procesa una consulta usando Bedrock Converse API con herramientas MCP.
     
     Implementa un ciclo conversacional donde Bedrock puede usar herramientas múltiples veces.
+    Con ``preseed_schema`` (SCHEMA_PRESEED) el esquema y el contexto van en el prompt de
+    sistema desde el inicio, ahorrando la iteración dedicada a pedir el esquema.
+    Con ``history`` (estado de una sesión, ver ``src/session.py``) la pregunta
+    continúa la conversación anterior: se reutilizan sus mensajes, su prompt de
+    sistema y su última SQL.
+    """
+    result = None
+    async for event in stream_with_bedrock_converse(
+        bedrock_client, model_id, question, mcp_client, tools,
+        preseed_schema=preseed_schema, stream=False, history=history
+    ):
+        if event["type"] == "done":
+            result = event["result"]
+    return result
+
+
+async def stream_with_bedrock_converse(bedrock_client, model_id: str, question: str,
+                                       mcp_client: MCPClient, tools: list,
+                                       preseed_schema: bool = None, stream: bool = True,
+                                       history: dict = None):
     """
+    Versión por eventos de ``process_with_bedrock_converse``.
+    
+    Con ``stream`` usa la ConverseStream API y entrega el texto del modelo a
+    medida que se genera.
+    
+    Yields:
+        dict: Eventos ``tool_call`` (name, arguments), ``sql`` (query),
+        ``result_file`` (path del resultado completo de un resumen columnar),
+        ``text`` (fragmento de la respuesta) y, al final, ``done`` con el mismo
+        resultado que retorna ``process_with_bedrock_converse``; su clave
+        ``conversation`` (messages, system) es el historial para la sesión
+    """
+    if preseed_schema is None:
+        preseed_schema = os.getenv("SCHEMA_PRESEED", "1") == "1"
+    history = history or {}
+    
     # Convertir herramientas MCP al formato Bedrock
     bedrock_tools = [convert_mcp_tool_to_bedrock(tool) for tool in tools]
     
-    messages = [
+    # El prompt de sistema de la sesión ya trae el esquema
+    system_blocks = history.get("system") or []
+    if preseed_schema and not system_blocks:
+        system_blocks = await build_preseeded_system_prompt(mcp_client, model_id, question)
+    
+    question_content = [{"text": question}]
+    if history.get("last_sql"):
+        question_content.append({"text": f"(SQL de la pregunta anterior: {history['last_sql']})"})
+    messages = list(history.get("messages", [])) + [
         {
             "role": "user",
-            "content": [{"text": question}]
+            "content": question_content
         }
     ]
     
+    if history.get("messages"):
+        mode = "session"
+    else:
+        mode = "preseeded" if system_blocks else "standard"
+    async for event in _converse_loop_events(
+        bedrock_client, model_id, messages, bedrock_tools, mcp_client, system_blocks, stream
+    ):
+        if event["type"] == "done":
+            record_iterations(mode, event["result"]["iterations"])
+            event["result"]["conversation"] = {"messages": messages, "system": system_blocks}
+        yield event
+
+
+async def _converse_stream_message(bedrock_client, converse_params: dict):
+    """
+    Llama a la ConverseStream API y reconstruye el mensaje del asistente.
+    
+    Yields:
+        dict: Eventos ``text`` por cada fragmento de texto y, al final, un evento
+        ``message`` con los bloques de contenido completos (texto y toolUse) y
+        el ``usage`` del evento ``metadata``
+    """
+    blocks = {}
+    usage = None
+    async for event in converse_stream_async(bedrock_client, **converse_params):
+        if "metadata" in event:
+            usage = event["metadata"].get("usage")
+        elif "contentBlockStart" in event:
+            start = event["contentBlockStart"]
+            tool_use = start.get("start", {}).get("toolUse")
+            if tool_use:
+                blocks[start["contentBlockIndex"]] = {
+                    "toolUse": {**tool_use, "input": ""}
+                }
+        elif "contentBlockDelta" in event:
+            delta_event = event["contentBlockDelta"]
+            index = delta_event["contentBlockIndex"]
+            delta = delta_event.get("delta", {})
+            if "text" in delta:
+                block = blocks.setdefault(index, {"text": ""})
+                block["text"] += delta["text"]
+                yield {"type": "text", "text": delta["text"]}
+            elif "toolUse" in delta:
+                block = blocks.setdefault(index, {"toolUse": {"input": ""}})
+                block["toolUse"]["input"] += delta["toolUse"].get("input", "")
+    
+    content_list = []
+    for index in sorted(blocks):
+        block = blocks[index]
+        if "toolUse" in block:
+            # El input de la herramienta llega como JSON parcial en varios fragmentos
+            raw_input = block["toolUse"]["input"]
+            block["toolUse"]["input"] = json.loads(raw_input) if raw_input else {}
+        content_list.append(block)
+    yield {"type": "message", "content": content_list, "usage": usage}
+
+
+async def _converse_loop_events(bedrock_client, model_id: str, messages: list,
+                                bedrock_tools: list, mcp_client: MCPClient,
+                                system_blocks: list, stream: bool = False):
+    """
+    Ciclo de llamadas a Bedrock y ejecución de herramientas hasta la respuesta
+    final, como eventos (ver ``stream_with_bedrock_converse``); el resultado del
+    evento ``done`` es el que retorna ``process_with_bedrock_converse``.
+    
+    Antes de cada llamada compacta el historial (CONVERSATION_COMPACTION) y
+    corta el ciclo si la pregunta superaría CONVERSATION_MAX_TOKENS. El uso de
+    tokens de cada iteración se entrega como evento ``usage`` y en el resultado.
+    """
     max_iterations = 5
     iteration = 0
     tool_history = []
+    result_file = None
+    budget = TokenBudget()
+    compaction = os.getenv("CONVERSATION_COMPACTION", "1") == "1"
+    fixed_tokens = estimate_tokens(system_blocks) + estimate_tokens(bedrock_tools)
+    
+    def done(final_response: str, error: bool):
+        return {
+            "type": "done",
+            "result": {
+                "final_response": final_response,
+                "tool_history": tool_history,
+                "iterations": iteration,
+                "error": error,
+                "usage": budget.report(),
+                "result_file": result_file
+            }
+        }
     
     while iteration < max_iterations:
         iteration += 1
         
         try:
-            # Llamar a Bedrock Converse API
-            response = bedrock_client.converse(
-                modelId=model_id,
-                messages=messages,
-                toolConfig={
-                    "tools": bedrock_tools
-                } if bedrock_tools else None,
-                inferenceConfig={
+            compacted = 0
+            if compaction:
+                compacted = compact_messages(messages, system_blocks)
+            estimated_input = estimate_tokens(messages) + fixed_tokens
+            if budget.would_exceed(estimated_input):
+                iteration -= 1
+                yield done(
+                    "Se alcanzó el límite de tokens para esta pregunta. "
+                    "Intenta una pregunta más específica.", True
+                )
+                return
+            
+            # Llamar a Bedrock Converse API en el pool de hilos (sin bloquear el bucle)
+            converse_params = {
+                "modelId": model_id,
+                "messages": messages,
+                "inferenceConfig": {
                     "maxTokens": 4096,
                     "temperature": 0.7
                 }
-            )
+            }
+            if bedrock_tools:
+                converse_params["toolConfig"] = {"tools": bedrock_tools}
+            if system_blocks:
+                converse_params["system"] = system_blocks
             
-            # Procesar respuesta
-            output = response.get('output', {})
-            message = output.get('message', {})
-            content_list = message.get('content', [])
+            if stream:
+                content_list = []
+                usage = None
+                async for event in _converse_stream_message(bedrock_client, converse_params):
+                    if event["type"] == "message":
+                        content_list = event["content"]
+                        usage = event["usage"]
+                    else:
+                        yield event
+            else:
+                response = await converse_async(bedrock_client, **converse_params)
+                
+                # Procesar respuesta
+                output = response.get('output', {})
+                message = output.get('message', {})
+                content_list = message.get('content', [])
+                usage = response.get('usage')
+            
+            yield {"type": "usage", **budget.record(iteration, estimated_input, usage, compacted)}
             
             if not content_list:
                 break
@@ -182,35 +539,44 @@ async def process_with_bedrock_converse(bedrock_client, model_id: str, question:
             
             # Si hay texto y no hay tool uses, es la respuesta final
             if text_parts and not tool_uses:
-                return {
-                    "final_response": ''.join(text_parts),
-                    "tool_history": tool_history,
-                    "error": False
-                }
+                # Conservar la respuesta en el historial (preguntas de seguimiento)
+                messages.append({
+                    "role": "assistant",
+                    "content": content_list
+                })
+                yield done(''.join(text_parts), False)
+                return
             
             # Si hay tool uses, ejecutarlas y continuar el ciclo
             if tool_uses:
-                tool_results = []
-                
                 for tool_use in tool_uses:
-                    tool_id = tool_use.get('toolUseId')
-                    tool_name = tool_use.get('name')
-                    tool_input = tool_use.get('input', {})
-
+                    arguments = tool_use.get('input', {})
                     tool_history.append({
-                        "name": tool_name,
-                        "arguments": tool_input
+                        "name": tool_use.get('name'),
+                        "arguments": arguments
                     })
-                    
-                    # Ejecutar herramienta con MCP
-                    tool_result_text = await execute_tool_with_mcp(
-                        mcp_client, tool_name, tool_input
-                    )
-                    
-                    tool_results.append({
-                        "toolUseId": tool_id,
+                    yield {"type": "tool_call", "name": tool_use.get('name'), "arguments": arguments}
+                    if isinstance(arguments, dict) and arguments.get("query"):
+                        yield {"type": "sql", "query": arguments["query"]}
+                
+                # Ejecutar las herramientas del turno en paralelo con MCP
+                tool_result_texts = await execute_tools_concurrently(mcp_client, tool_uses)
+                
+                # Resúmenes columnares: el resultado completo queda disponible para descargar
+                for tool_result_text in tool_result_texts:
+                    path = find_result_file(str(tool_result_text))
+                    if path:
+                        result_file = path
+                        yield {"type": "result_file", "path": path}
+                
+                # Los resultados conservan el orden de los toolUseId del modelo
+                tool_results = [
+                    {
+                        "toolUseId": tool_use.get('toolUseId'),
                         "content": [{"text": str(tool_result_text)}]
-                    })
+                    }
+                    for tool_use, tool_result_text in zip(tool_uses, tool_result_texts)
+                ]
                 
                 # Agregar mensaje del asistente con tool uses a la conversación
                 messages.append({
@@ -228,94 +594,214 @@ async def process_with_bedrock_converse(bedrock_client, model_id: str, question:
                     ]
                 })
             else:
-                # Respuesta final sin herramientas
-                if text_parts:
-                    return {
-                        "final_response": ''.join(text_parts),
-                        "tool_history": tool_history,
-                        "error": False
-                    }
                 break
                 
         except Exception as e:
-            return {
-                "final_response": f"Error en conversación con Bedrock: {str(e)}",
-                "tool_history": tool_history,
-                "error": True
-            }
+            yield done(f"Error en conversación con Bedrock: {str(e)}", True)
+            return
     
     # Si llegamos aquí, se alcanzó el máximo de iteraciones
-    return {
-        "final_response": "Se alcanzó el máximo de iteraciones. Intenta reformular tu pregunta.",
-        "tool_history": tool_history,
-        "error": True
-    }
+    yield done("Se alcanzó el máximo de iteraciones. Intenta reformular tu pregunta.", True)
 
 
-def process_query_with_mcp(question: str, model_name: str, db_path: str, 
-                           context: str):
+def load_session(session_id: str, model_id: str, db_path: str, context: str):
     """
-    Procesa una consulta usando MCP con Bedrock Converse API.
+    Carga el historial de una sesión para el modelo, la base de datos y el contexto dados.
     
-    Usa:
-    - FastMCP server (src/mcp/server.py) con transporte stdio
-    - Cliente MCP personalizado usando el paquete mcp de Python
-    - Bedrock Converse API directamente con boto3
-    - IAM Role de AWS para autenticación automática
+    Si los datos cambiaron desde la última pregunta se descarta el prompt de
+    sistema guardado, para volver a obtener el esquema.
+    
+    Returns:
+        tuple: (historial o None, ámbito de la sesión o None, firma de la base de datos)
     """
-    async def process_async():
-        """Procesa la consulta de forma asíncrona."""
+    store = get_session_store()
+    if not session_id or not store.enabled:
+        return None, None, None
+    try:
+        db_identity, db_signature = get_database_fingerprint(db_path)
+    except OSError:
+        return None, None, None
+    scope = AnswerCache.make_scope(model_id, db_identity, context)
+    history = store.load(session_id, scope)
+    if history is not None and history["db_signature"] != db_signature:
+        history["system"] = []
+    return history, scope, db_signature
+
+
+async def _query_events(question: str, model_name: str, db_path: str, context: str,
+                        stream: bool, session_id: str = None):
+    """
+    Procesa una pregunta completa (caché, pool MCP y Bedrock) entregando eventos.
+    
+    Con ``session_id`` la pregunta continúa la conversación de esa sesión y,
+    si se responde bien, el historial se guarda para la siguiente.
+    
+    El último evento es siempre ``result`` con sql_query, response e iterations.
+    """
+    model_id = get_bedrock_model_id(model_name)
+    with span("agent.question", model_id):
         try:
-            # Crear servidor MCP usando la factory
-            server_params = MCPServerFactory.create_server(db_path, context)
+            history, session_scope, session_signature = load_session(
+                session_id, model_id, db_path, context
+            )
             
-            # Crear cliente MCP y conectar
-            mcp_client = MCPClient(server_params)
+            # Responder desde la caché si la pregunta ya se hizo antes. La caché solo
+            # guarda respuestas a preguntas sin historial, así que dentro de una sesión
+            # sirve cuando se repite una de esas preguntas tal cual (no una parecida,
+            # que puede ser un seguimiento de la conversación)
+            cached, cache_scope, db_signature = await answer_from_cache(
+                question, model_id, db_path, context, similar=history is None
+            )
+            if cached is not None:
+                if session_scope is not None:
+                    previous = history or {}
+                    last_sql = cached["sql_query"] if cached["sql_query"] != NO_SQL_EXECUTED else None
+                    get_session_store().save(session_id, session_scope, previous.get("messages", []) + [
+                        {"role": "user", "content": [{"text": question}]},
+                        {"role": "assistant", "content": [{"text": cached["response"]}]},
+                    ], previous.get("system", []), last_sql or previous.get("last_sql"), session_signature)
+                yield {"type": "result", "result": cached}
+                return
+            if history is not None:
+                # La respuesta dependerá de la conversación: no se guarda en la caché
+                cache_scope = None
             
-            async with mcp_client:
-                # Obtener herramientas disponibles del servidor MCP
-                tools = await mcp_client.get_available_tools()
+            # Obtener una sesión MCP ya conectada del pool (o crearla si no existe)
+            async with get_mcp_pool().acquire(db_path, context) as session:
+                mcp_client = session.client
+                tools = session.tools
                 
-                # Crear cliente de Bedrock usando IAM Role automáticamente
+                # Cliente de Bedrock compartido (IAM Role, conexiones reutilizadas)
                 bedrock_client = create_bedrock_client()
-                model_id = get_bedrock_model_id(model_name)
                 
                 # Procesar con Bedrock Converse API y herramientas MCP
-                response_data = await process_with_bedrock_converse(
-                    bedrock_client, model_id, question, mcp_client, tools
-                )
+                response_data = {}
+                async for event in stream_with_bedrock_converse(
+                    bedrock_client, model_id, question, mcp_client, tools, stream=stream,
+                    history=history
+                ):
+                    if event["type"] == "done":
+                        response_data = event["result"]
+                    else:
+                        yield event
                 final_response = response_data.get("final_response", "")
                 tool_history = response_data.get("tool_history", [])
 
-                sql_query = next(
+                executed_sql = next(
                     (
                         tool_call.get("arguments", {}).get("query")
                         for tool_call in reversed(tool_history)
                         if tool_call.get("arguments") and tool_call["arguments"].get("query")
                     ),
-                    "No se ejecutó ninguna consulta SQL."
+                    None
                 )
+                sql_query = executed_sql or NO_SQL_EXECUTED
 
-                return {
-                    "sql_query": sql_query,
-                    "response": final_response
+                if cache_scope is not None and not response_data.get("error"):
+                    get_answer_cache().store(
+                        question, cache_scope, db_signature, executed_sql or "", final_response
+                    )
+                if session_scope is not None and not response_data.get("error"):
+                    conversation = response_data["conversation"]
+                    system_blocks = conversation["system"]
+                    if not system_blocks and any(
+                        tool_call["name"] in SCHEMA_TOOLS for tool_call in tool_history
+                    ):
+                        # El modelo pidió el esquema: la sesión lo lleva en el prompt de
+                        # sistema para que las preguntas siguientes no lo vuelvan a pedir
+                        system_blocks = await build_preseeded_system_prompt(
+                            mcp_client, model_id, question
+                        )
+                    get_session_store().save(
+                        session_id, session_scope, conversation["messages"],
+                        system_blocks,
+                        executed_sql or (history or {}).get("last_sql"), session_signature
+                    )
+
+                yield {
+                    "type": "result",
+                    "result": {
+                        "sql_query": sql_query,
+                        "response": final_response,
+                        "iterations": response_data.get("iterations", 0),
+                        "usage": response_data.get("usage"),
+                        "result_file": response_data.get("result_file")
+                    }
                 }
                 
         except Exception as e:
             import traceback
             error_trace = traceback.format_exc()
-            return {
-                "sql_query": "",
-                "response": f"Error procesando consulta: {str(e)}\n\nDetalles técnicos:\n{type(e).__name__}\n\nTraceback:\n{error_trace}"
+            yield {
+                "type": "result",
+                "result": {
+                    "sql_query": "",
+                    "response": f"Error procesando consulta: {str(e)}\n\nDetalles técnicos:\n{type(e).__name__}\n\nTraceback:\n{error_trace}"
+                }
             }
+
+
+def _agent_error_result(error: Exception) -> dict:
+    import traceback
+    error_trace = traceback.format_exc()
+    return {
+        "sql_query": "",
+        "response": f"Error ejecutando agente: {str(error)}\n\nAsegúrate de:\n1. Tener instalado el paquete mcp (pip install mcp)\n2. Tener configurado un IAM Role con permisos para Bedrock\n3. Tener acceso al modelo Bedrock seleccionado\n\nTraceback:\n{error_trace}"
+    }
+
+
+async def process_query_async(question: str, model_name: str, db_path: str, context: str,
+                              session_id: str = None) -> dict:
+    """
+    Versión asíncrona de ``process_query_with_mcp``.
     
-    # Ejecutar de forma síncrona
+    Debe ejecutarse en el bucle compartido (``src.runtime``), donde vive el pool
+    de sesiones MCP; desde otro bucle usar ``run_in_shared_loop``.
+    """
+    result = None
+    async for event in _query_events(question, model_name, db_path, context, stream=False,
+                                     session_id=session_id):
+        if event["type"] == "result":
+            result = event["result"]
+    return result
+
+
+def process_query_with_mcp(question: str, model_name: str, db_path: str, 
+                           context: str, session_id: str = None):
+    """
+    Procesa una consulta usando MCP con Bedrock Converse API.
+    
+    Usa:
+    - FastMCP server (src/mcp/server.py) con transporte stdio o en memoria (MCP_TRANSPORT)
+    - Pool de sesiones MCP (src/mcp/pool.py) para reutilizar servidores ya iniciados
+    - Cliente MCP personalizado usando el paquete mcp de Python
+    - Bedrock Converse API directamente con boto3
+    - IAM Role de AWS para autenticación automática
+    
+    Con ``session_id`` la pregunta continúa la conversación de esa sesión.
+    """
+    # Ejecutar de forma síncrona en el bucle compartido que mantiene vivo el pool
     try:
-        return asyncio.run(process_async())
+        return run_coroutine(
+            process_query_async(question, model_name, db_path, context, session_id)
+        )
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        return {
-            "sql_query": "",
-            "response": f"Error ejecutando agente: {str(e)}\n\nAsegúrate de:\n1. Tener instalado el paquete mcp (pip install mcp)\n2. Tener configurado un IAM Role con permisos para Bedrock\n3. Tener acceso al modelo Bedrock seleccionado\n\nTraceback:\n{error_trace}"
-        }
+        return _agent_error_result(e)
+
+
+def stream_query_with_mcp(question: str, model_name: str, db_path: str, context: str,
+                          session_id: str = None):
+    """
+    Versión en streaming de ``process_query_with_mcp`` para la interfaz.
+    
+    Es un generador síncrono: entrega cada evento del agente en cuanto ocurre
+    (``tool_call``, ``sql``, ``text``) y termina con un evento ``result`` que
+    contiene el mismo diccionario que retorna ``process_query_with_mcp``.
+    """
+    try:
+        yield from iterate_async(
+            _query_events(question, model_name, db_path, context, stream=True,
+                          session_id=session_id)
+        )
+    except Exception as e:
+        yield {"type": "result", "result": _agent_error_result(e)}
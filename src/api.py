@@ -0,0 +1,221 @@
+"""API HTTP/JSON del agente, servida junto a la interfaz de Gradio.
+
+Expone ``/v1/query`` para una pregunta y ``/v1/batch`` para muchas preguntas,
+procesadas en paralelo con un límite y devueltas como NDJSON a medida que
+terminan. Los resultados completos de los resúmenes columnares se descargan
+desde ``/v1/results/{nombre}``. Las preguntas se ejecutan en el bucle compartido del agente, por lo
+que usan el mismo pool de sesiones MCP y el mismo cliente de Bedrock que la
+interfaz.
+"""
+import asyncio
+import json
+import os
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import (
+    FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+)
+from pydantic import BaseModel
+
+from src.agent import (
+    get_answer_cache, get_iteration_stats, get_mcp_pool, get_session_store, process_query_async
+)
+from src.columnar import resolve_result_file
+from src.metrics import get_stage_stats, prometheus_exposition, register_stats_source
+from src.runtime import SaturatedError, get_admission_controller, run_in_shared_loop
+
+DEFAULT_DB_PATH = "data/test_database.db"
+DEFAULT_MODEL = "Claude 3 Haiku"
+
+
+class QueryRequest(BaseModel):
+    question: str
+    model: str = DEFAULT_MODEL
+    db_path: Optional[str] = None
+    context: str = ""
+    # Identificador elegido por el cliente para continuar una conversación
+    session_id: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    question: str
+    model: Optional[str] = None
+    db_path: Optional[str] = None
+    context: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    questions: List[Union[str, BatchItem]]
+    model: str = DEFAULT_MODEL
+    db_path: Optional[str] = None
+    context: str = ""
+    max_concurrency: Optional[int] = None
+
+
+def resolve_db_path(db_path: Optional[str]) -> str:
+    """
+    Valida la ruta de la base de datos pedida por un cliente de la API.
+
+    Solo se aceptan archivos dentro de API_DATA_DIR, para que la API no pueda
+    abrir archivos arbitrarios del servidor.
+
+    Raises:
+        HTTPException: 400 si la ruta está fuera del directorio permitido o no existe
+    """
+    if not db_path:
+        return DEFAULT_DB_PATH
+    data_dir = os.path.realpath(os.getenv("API_DATA_DIR", "data"))
+    path = os.path.realpath(db_path)
+    if os.path.commonpath([data_dir, path]) != data_dir:
+        raise HTTPException(status_code=400, detail=f"db_path debe estar dentro de {data_dir}")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"No existe la base de datos {db_path}")
+    return path
+
+
+async def answer_question(question: str, model: str, db_path: str, context: str,
+                          session_id: Optional[str] = None) -> dict:
+    """
+    Responde una pregunta respetando el control de admisión del proceso.
+
+    Raises:
+        SaturatedError: Si el servidor no tiene capacidad para la pregunta
+    """
+    controller = get_admission_controller()
+    # La espera por un lugar bloquea, así que se hace fuera del bucle del servidor
+    acquired = asyncio.get_running_loop().run_in_executor(None, controller.acquire)
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # El cliente se fue mientras esperaba: liberar el lugar si se llegó a obtener
+        acquired.add_done_callback(
+            lambda f: f.cancelled() or f.exception() is not None or controller.release()
+        )
+        raise
+    try:
+        result = await run_in_shared_loop(
+            process_query_async(question, model, db_path, context, session_id)
+        )
+    finally:
+        controller.release()
+    if isinstance(result, dict) and result.get("result_file"):
+        # La ruta del servidor no le sirve al cliente: se entrega la URL de descarga
+        result = {**result, "result_file": f"/v1/results/{os.path.basename(result['result_file'])}"}
+    return result
+
+
+def _saturated_response(error: SaturatedError) -> JSONResponse:
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"error": str(error)},
+        headers={"Retry-After": str(max(1, round(error.retry_after)))}
+    )
+
+
+def create_app() -> FastAPI:
+    """Crea la aplicación FastAPI con los endpoints del agente."""
+    app = FastAPI(title="Text-to-SQL Agent API")
+
+    # Estadísticas existentes publicadas también como gauges en /metrics
+    register_stats_source("admission", lambda: get_admission_controller().stats())
+    register_stats_source("mcp_pool", lambda: get_mcp_pool().stats())
+    register_stats_source("answer_cache", lambda: get_answer_cache().stats())
+    register_stats_source("sessions", lambda: get_session_store().stats())
+    register_stats_source("iterations", get_iteration_stats)
+
+    @app.post("/v1/query")
+    async def query(request: QueryRequest):
+        db_path = resolve_db_path(request.db_path)
+        try:
+            return await answer_question(
+                request.question, request.model, db_path, request.context, request.session_id
+            )
+        except SaturatedError as e:
+            return _saturated_response(e)
+
+    @app.post("/v1/batch")
+    async def batch(request: BatchRequest):
+        max_items = int(os.getenv("API_BATCH_MAX_ITEMS", "1000"))
+        if len(request.questions) > max_items:
+            raise HTTPException(status_code=400, detail=f"El lote admite como máximo {max_items} preguntas")
+        concurrency = int(os.getenv("API_BATCH_CONCURRENCY", "8"))
+        if request.max_concurrency:
+            concurrency = max(1, min(concurrency, request.max_concurrency))
+
+        # Validar todas las rutas antes de empezar a responder
+        items = []
+        for item in request.questions:
+            if isinstance(item, str):
+                item = BatchItem(question=item)
+            items.append((
+                item.question,
+                item.model or request.model,
+                resolve_db_path(item.db_path or request.db_path),
+                request.context if item.context is None else item.context,
+            ))
+
+        async def results():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def run(index, question, model, db_path, context):
+                async with semaphore:
+                    try:
+                        result = await answer_question(question, model, db_path, context)
+                    except SaturatedError as e:
+                        result = {"error": str(e), "status": e.status_code}
+                    except Exception as e:
+                        result = {"error": str(e), "status": 500}
+                return {"index": index, "question": question, **result}
+
+            tasks = [asyncio.create_task(run(index, *item)) for index, item in enumerate(items)]
+            try:
+                # Cada resultado se envía en cuanto termina, no en el orden del lote
+                for next_result in asyncio.as_completed(tasks):
+                    yield json.dumps(await next_result, ensure_ascii=False) + "\n"
+            finally:
+                # El cliente se desconectó: cancelar las preguntas pendientes
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(results(), media_type="application/x-ndjson")
+
+    @app.get("/v1/results/{name}")
+    async def result_file(name: str):
+        path = resolve_result_file(name)
+        if path is None:
+            raise HTTPException(status_code=404, detail="El resultado no existe o ya se eliminó")
+        return FileResponse(path, media_type="text/csv", filename=name)
+
+    @app.get("/v1/health")
+    async def health():
+        return {
+            "status": "ok",
+            "admission": get_admission_controller().stats(),
+            "mcp_pool": get_mcp_pool().stats(),
+            "answer_cache": get_answer_cache().stats(),
+            "sessions": get_session_store().stats(),
+            "iterations": get_iteration_stats(),
+            "stages": get_stage_stats(),
+        }
+
+    @app.get("/metrics")
+    async def metrics():
+        try:
+            content, content_type = prometheus_exposition()
+        except RuntimeError as e:
+            return PlainTextResponse(str(e), status_code=503)
+        return Response(content=content, media_type=content_type)
+
+    return app
+
+
+def create_server_app():
+    """Crea la API y monta la interfaz de Gradio en la raíz del mismo servidor."""
+    import gradio as gr
+
+    from src.ui import configure_queue, create_ui
+
+    app = create_app()
+    interface = configure_queue(create_ui())
+    return gr.mount_gradio_app(app, interface, path="/")
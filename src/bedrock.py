@@ -0,0 +1,219 @@
+"""Cliente de Bedrock compartido y llamadas a Converse sin bloquear el bucle de eventos."""
+import asyncio
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ConnectionError as BotocoreConnectionError, HTTPClientError
+
+from src.metrics import record_token_usage, span
+
+# Códigos de error de Bedrock que vale la pena reintentar con backoff
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+# Errores que indican credenciales temporales vencidas (rol IAM rotado)
+EXPIRED_CREDENTIALS_ERROR_CODES = {"ExpiredTokenException", "ExpiredToken", "RequestExpired"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Clientes de bedrock-runtime reutilizados por región
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_bedrock_max_concurrency() -> int:
+    """Máximo de llamadas simultáneas a Bedrock en el proceso (BEDROCK_MAX_CONCURRENCY)."""
+    return int(os.getenv("BEDROCK_MAX_CONCURRENCY", "16"))
+
+
+def create_bedrock_client(region_name: Optional[str] = None):
+    """
+    Retorna el cliente de Bedrock del proceso, creándolo una sola vez por región.
+    
+    boto3 detectará automáticamente las credenciales en este orden:
+    1. Variables de entorno (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
+    2. Archivo de credenciales (~/.aws/credentials)
+    3. IAM Role asignado a la instancia EC2/ECS/Lambda
+    
+    Reutilizar el cliente evita repetir la resolución de credenciales (incluida
+    la consulta a IMDS en EC2) y mantiene vivas las conexiones HTTPS. Las
+    credenciales de un IAM Role se renuevan solas antes de vencer.
+    
+    Args:
+        region_name: Región de AWS (por defecto BEDROCK_REGION o us-east-1)
+    """
+    region = region_name or os.getenv("BEDROCK_REGION", "us-east-1")
+    with _clients_lock:
+        client = _clients.get(region)
+        if client is None:
+            session = boto3.Session(region_name=region)
+            config = Config(
+                max_pool_connections=get_bedrock_max_concurrency(),
+                tcp_keepalive=True,
+                connect_timeout=float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "10")),
+                read_timeout=float(os.getenv("BEDROCK_TIMEOUT", "120")),
+                # Los reintentos con backoff se manejan en converse_async
+                retries={"mode": "standard", "total_max_attempts": 1}
+            )
+            client = session.client("bedrock-runtime", config=config)
+            _clients[region] = client
+        return client
+
+
+def refresh_bedrock_client(bedrock_client):
+    """Descarta un cliente cuyas credenciales vencieron y crea uno nuevo para su región."""
+    region = bedrock_client.meta.region_name
+    with _clients_lock:
+        if _clients.get(region) is bedrock_client:
+            del _clients[region]
+    return create_bedrock_client(region)
+
+
+def get_bedrock_executor() -> ThreadPoolExecutor:
+    """
+    Retorna el pool de hilos compartido para las llamadas a Bedrock.
+
+    Su tamaño (BEDROCK_MAX_CONCURRENCY) limita cuántas llamadas al modelo
+    pueden estar en curso a la vez en el proceso.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_bedrock_max_concurrency(),
+                thread_name_prefix="bedrock"
+            )
+        return _executor
+
+
+def _error_code(error: Exception) -> Optional[str]:
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return None
+    return response.get("Error", {}).get("Code")
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Indica si un error de boto3 corresponde a throttling o a una falla transitoria."""
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        return True
+    return _error_code(error) in RETRYABLE_ERROR_CODES
+
+
+async def _call_with_retries(bedrock_client, operation: str, timeout: Optional[float],
+                            max_retries: Optional[int], kwargs: dict):
+    """Ejecuta una operación del cliente en el pool de hilos con timeout y reintentos."""
+    if timeout is None:
+        timeout = float(os.getenv("BEDROCK_TIMEOUT", "120"))
+    if max_retries is None:
+        max_retries = int(os.getenv("BEDROCK_MAX_RETRIES", "4"))
+    base_delay = float(os.getenv("BEDROCK_RETRY_BASE_DELAY", "0.5"))
+    max_delay = float(os.getenv("BEDROCK_RETRY_MAX_DELAY", "20"))
+
+    loop = asyncio.get_running_loop()
+    executor = get_bedrock_executor()
+    call = partial(getattr(bedrock_client, operation), **kwargs)
+
+    attempt = 0
+    refreshed = False
+    while True:
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Bedrock no respondió en {timeout:g} s") from None
+        except Exception as e:
+            if not refreshed and _error_code(e) in EXPIRED_CREDENTIALS_ERROR_CODES:
+                # Credenciales vencidas: crear un cliente nuevo y reintentar una vez
+                bedrock_client = refresh_bedrock_client(bedrock_client)
+                call = partial(getattr(bedrock_client, operation), **kwargs)
+                refreshed = True
+                continue
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            # Backoff exponencial con jitter completo
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def converse_async(bedrock_client, timeout: Optional[float] = None,
+                         max_retries: Optional[int] = None, **kwargs):
+    """
+    Llama a ``bedrock_client.converse`` en el pool de hilos sin bloquear el bucle.
+
+    Args:
+        bedrock_client: Cliente boto3 de ``bedrock-runtime``
+        timeout: Segundos máximos por intento (BEDROCK_TIMEOUT)
+        max_retries: Reintentos ante throttling (BEDROCK_MAX_RETRIES)
+        **kwargs: Parámetros de la Converse API
+
+    Returns:
+        dict: Respuesta de la Converse API
+
+    Raises:
+        TimeoutError: Si un intento supera ``timeout``
+        Exception: El último error de boto3 si no es reintentable o se agotan los reintentos
+    """
+    model_id = kwargs.get("modelId", "")
+    with span("bedrock.converse", model_id) as current_span:
+        response = await _call_with_retries(bedrock_client, "converse", timeout, max_retries, kwargs)
+        record_token_usage(model_id, response.get("usage"), current_span)
+    return response
+
+
+async def converse_stream_async(bedrock_client, timeout: Optional[float] = None,
+                                max_retries: Optional[int] = None, **kwargs):
+    """
+    Llama a ``bedrock_client.converse_stream`` y entrega sus eventos a medida que llegan.
+
+    La apertura del stream se reintenta igual que en ``converse_async``; una vez
+    que empiezan a llegar eventos, un error corta el stream. Cada lectura del
+    stream se hace en el pool de hilos y ``timeout`` limita la espera entre
+    eventos.
+
+    Yields:
+        dict: Eventos de la ConverseStream API (messageStart, contentBlockStart,
+        contentBlockDelta, contentBlockStop, messageStop, metadata)
+    """
+    if timeout is None:
+        timeout = float(os.getenv("BEDROCK_TIMEOUT", "120"))
+    model_id = kwargs.get("modelId", "")
+    with span("bedrock.converse_stream", model_id) as current_span:
+        response = await _call_with_retries(
+            bedrock_client, "converse_stream", timeout, max_retries, kwargs
+        )
+        stream = response["stream"]
+        events = iter(stream)
+        loop = asyncio.get_running_loop()
+        executor = get_bedrock_executor()
+        end = object()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        loop.run_in_executor(executor, next, events, end), timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"Bedrock no envió datos en {timeout:g} s") from None
+                if event is end:
+                    return
+                if "metadata" in event:
+                    record_token_usage(model_id, event["metadata"].get("usage"), current_span)
+                yield event
+        finally:
+            # Liberar la conexión HTTP si el consumidor deja de leer antes de tiempo
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,221 @@
+"""Cachés en memoria: LRU genérico, caché de respuestas a preguntas y normalización de SQL."""
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """Caché LRU segura entre hilos, con límite de entradas, límite de bytes y TTL opcionales."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna el valor guardado para ``key`` o None si no existe o expiró."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self._entries[key]
+                self.size_bytes -= item[2]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, size: int = 0):
+        """
+        Guarda ``value`` y desaloja las entradas menos usadas si se supera algún límite.
+
+        ``size`` es el tamaño aproximado en bytes del valor, usado con ``max_bytes``.
+        Un valor más grande que ``max_bytes`` no se guarda.
+        """
+        if self.max_entries <= 0 or (self.max_bytes and size > self.max_bytes):
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[2]
+            self._entries[key] = (time.monotonic(), value, size)
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self.size_bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= evicted[2]
+                self.evictions += 1
+
+    def values(self):
+        """Retorna una copia de los valores vigentes, del más antiguo al más reciente."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                value for stored_at, value, _ in self._entries.values()
+                if not self.ttl or now - stored_at <= self.ttl
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna el tamaño actual y los contadores de aciertos, fallos y desalojos."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza una pregunta: minúsculas, sin tildes, sin puntuación y espacios simples."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+_SQL_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    | (?P<word>[A-Za-z_][\w$]*)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    | (?P<space>\s+)
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+# Funciones cuyo resultado cambia entre ejecuciones: esas consultas no se cachean
+_NON_DETERMINISTIC_SQL = re.compile(
+    r"\b(random|randomblob|changes|last_insert_rowid|total_changes|current_date|"
+    r"current_time|current_timestamp)\b|'now'",
+    re.IGNORECASE
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normaliza una consulta SQL para usarla como clave de caché.
+
+    Elimina comentarios, colapsa espacios, pasa a minúsculas las palabras sin
+    comillas (palabras clave e identificadores, que en SQLite no distinguen
+    mayúsculas) y conserva literales e identificadores entre comillas tal cual.
+    """
+    tokens = []
+    for match in _SQL_TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        text = match.group()
+        tokens.append(text.lower() if kind == "word" else text)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def is_cacheable_sql(normalized_query: str) -> bool:
+    """Indica si el resultado de la consulta depende solo de los datos (sin random(), 'now', etc.)."""
+    return not _NON_DETERMINISTIC_SQL.search(normalized_query)
+
+
+def _token_similarity(a: str, b: str) -> float:
+    """Similitud de Jaccard entre los conjuntos de palabras de dos preguntas normalizadas."""
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+class AnswerCache:
+    """
+    Caché de respuestas del agente para preguntas repetidas.
+
+    La clave combina la pregunta normalizada con un ámbito formado por el modelo,
+    la identidad de la base de datos y el hash del contexto. Cada entrada guarda
+    además la firma de la base de datos con la que se obtuvo, para detectar si
+    los datos cambiaron desde entonces.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 similarity_threshold: Optional[float] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+        if ttl is None:
+            ttl = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        if similarity_threshold is None:
+            similarity_threshold = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+        self.similarity_threshold = similarity_threshold
+        self._cache = LRUCache(max_entries, ttl or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.max_entries > 0
+
+    @staticmethod
+    def make_scope(model_id: str, db_identity: Tuple, context: str) -> Tuple:
+        """Construye el ámbito de la caché: modelo, base de datos y contexto."""
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+        return model_id, db_identity, context_hash
+
+    def lookup(self, question: str, scope: Tuple, similar: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta guardada para la pregunta dentro del ámbito dado.
+
+        Primero busca la pregunta normalizada exacta; si no existe,
+        ``similar`` es verdadero y ANSWER_CACHE_SIMILARITY > 0, busca la
+        pregunta más parecida del mismo ámbito cuya similitud supere el umbral.
+
+        Returns:
+            dict: Entrada con question, db_signature, sql_query y response, o None
+        """
+        normalized = normalize_question(question)
+        entry = self._cache.get((scope, normalized))
+        if entry is not None or not similar or self.similarity_threshold <= 0:
+            return entry
+
+        best, best_score = None, self.similarity_threshold
+        for candidate in self._cache.values():
+            if candidate["scope"] != scope:
+                continue
+            score = _token_similarity(normalized, candidate["question"])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def store(self, question: str, scope: Tuple, db_signature: Tuple,
+              sql_query: str, response: str):
+        """Guarda la respuesta de una pregunta y la firma de los datos con que se obtuvo."""
+        normalized = normalize_question(question)
+        self._cache.set((scope, normalized), {
+            "scope": scope,
+            "question": normalized,
+            "db_signature": db_signature,
+            "sql_query": sql_query,
+            "response": response,
+        })
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
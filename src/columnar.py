@@ -0,0 +1,266 @@
+"""Resultados columnares para respuestas analíticas grandes.
+
+En lugar de enviar al modelo miles de filas como texto, ``execute_sql`` puede
+(MCP_RESULT_FORMAT=summary o auto) leer el resultado completo en lotes, guardarlo
+por columnas y enviar solo un resumen compacto: número de filas y, por columna,
+nulos, mínimo, máximo, promedio, valores distintos y valores más frecuentes.
+El resultado completo se escribe a un archivo CSV en MCP_RESULTS_DIR, que la
+interfaz ofrece para descargar.
+
+Con ``pyarrow`` instalado cada lote se convierte en arreglos de Arrow y las
+estadísticas se calculan con ``pyarrow.compute``; sin él se usan listas de
+Python por columna.
+"""
+import csv
+import os
+import re
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from src.database import _value_to_text
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+# Última línea del resumen con el nombre del resultado completo (la usa el agente para la descarga)
+RESULT_FILE_PREFIX = "Resultado completo: "
+
+# Nombres de los resultados completos (uuid hexadecimal)
+RESULT_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}\.csv$")
+
+TOP_VALUES = 5
+
+
+def get_results_dir() -> str:
+    return os.path.abspath(os.getenv("MCP_RESULTS_DIR", os.path.join("data", "results")))
+
+
+def resolve_result_file(name: str) -> Optional[str]:
+    """
+    Retorna la ruta de un resultado completo a partir de su nombre, o None si el
+    nombre no es el de un resultado o el archivo no existe.
+    """
+    if not RESULT_NAME_PATTERN.match(name):
+        return None
+    results_dir = os.path.realpath(get_results_dir())
+    path = os.path.realpath(os.path.join(results_dir, name))
+    if os.path.dirname(path) != results_dir or not os.path.isfile(path):
+        return None
+    return path
+
+
+def find_result_file(text: str) -> Optional[str]:
+    """
+    Retorna la ruta del resultado completo de un resumen de ``execute_sql``.
+
+    Solo se considera la última línea y solo nombres de archivos de
+    MCP_RESULTS_DIR: los datos de la consulta (que controla el modelo) no pueden
+    apuntar a otros archivos del servidor.
+    """
+    last_line = (text or "").rstrip("\n").rpartition("\n")[2]
+    if not last_line.startswith(RESULT_FILE_PREFIX):
+        return None
+    return resolve_result_file(last_line[len(RESULT_FILE_PREFIX):])
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return _value_to_text(value)
+    return value
+
+
+def _prune_results(results_dir: str, max_files: int):
+    """Borra los resultados más antiguos cuando hay más de ``max_files``."""
+    try:
+        files = [
+            entry for entry in os.scandir(results_dir)
+            if entry.is_file() and entry.name.endswith(".csv")
+        ]
+    except OSError:
+        return
+    files.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class ColumnarCollector:
+    """
+    Acumula un resultado por columnas, lote a lote, y lo escribe a CSV.
+
+    Recibe los lotes de ``stream_query``. Las estadísticas se calculan sobre
+    las primeras ``max_rows`` filas (MCP_SUMMARY_MAX_ROWS; 1.000.000 con
+    ``pyarrow`` y 100.000 sin él, porque las listas de Python ocupan bastante
+    más memoria); el archivo recibe todas.
+    """
+
+    def __init__(self, columns: List[str], results_dir: Optional[str] = None,
+                 max_rows: Optional[int] = None):
+        if max_rows is None:
+            default_max_rows = "1000000" if pa is not None else "100000"
+            max_rows = int(os.getenv("MCP_SUMMARY_MAX_ROWS", default_max_rows))
+        self.columns = columns
+        self.max_rows = max_rows
+        self.rows = 0
+        self.collected = 0
+        # Por columna: lotes (arreglos de Arrow o listas de Python)
+        self._chunks: List[List[Any]] = [[] for _ in columns]
+        results_dir = results_dir or get_results_dir()
+        os.makedirs(results_dir, exist_ok=True)
+        self.path = os.path.join(results_dir, f"{uuid.uuid4().hex}.csv")
+        self._file = open(self.path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def add_batch(self, batch: List[tuple]):
+        self.rows += len(batch)
+        self._writer.writerows([_csv_value(value) for value in row] for row in batch)
+        remaining = self.max_rows - self.collected
+        if remaining <= 0:
+            return
+        batch = batch[:remaining]
+        self.collected += len(batch)
+        for chunks, values in zip(self._chunks, zip(*batch)):
+            chunks.append(_to_array(values) if pa is not None else list(values))
+
+    def close(self):
+        self._file.close()
+        _prune_results(os.path.dirname(self.path), int(os.getenv("MCP_RESULTS_MAX_FILES", "100")))
+
+    def discard(self):
+        """Cierra y borra el archivo (el resultado cupo completo en la respuesta)."""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def column_stats(self) -> List[Dict[str, Any]]:
+        """Estadísticas por columna de las filas acumuladas."""
+        compute = _arrow_stats if pa is not None else _python_stats
+        return [compute(name, chunks) for name, chunks in zip(self.columns, self._chunks)]
+
+
+def _to_array(values):
+    """Convierte los valores de una columna a Arrow; SQLite admite tipos mixtos, que van como texto."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+
+def _arrow_stats(name: str, chunks: list) -> Dict[str, Any]:
+    types = {chunk.type for chunk in chunks if chunk.type != pa.null()}
+    if not types:
+        target = pa.null()
+    elif len(types) == 1:
+        target = types.pop()
+    elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        target = pa.float64()
+    else:
+        # Lotes con tipos distintos (por ejemplo enteros y texto): comparar como texto
+        target = pa.string()
+    column = pa.chunked_array([pc.cast(chunk, target) for chunk in chunks], type=target)
+    stats = {
+        "column": name,
+        "type": str(column.type),
+        "nulls": column.null_count,
+        "distinct": pc.count_distinct(column).as_py() if len(column) else 0,
+    }
+    if pa.types.is_binary(column.type) or pa.types.is_null(column.type):
+        return stats
+    numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+    if numeric or pa.types.is_string(column.type) or pa.types.is_boolean(column.type):
+        min_max = pc.min_max(column).as_py()
+        stats["min"], stats["max"] = min_max["min"], min_max["max"]
+    if numeric:
+        stats["mean"] = pc.mean(column).as_py()
+    counts = pc.value_counts(column.drop_null())
+    if len(counts):
+        order = pc.array_sort_indices(counts.field("counts"), order="descending")
+        stats["top"] = [
+            (item["values"], item["counts"])
+            for item in counts.take(order[:TOP_VALUES]).to_pylist()
+        ]
+    return stats
+
+
+def _python_stats(name: str, chunks: list) -> Dict[str, Any]:
+    values = [value for chunk in chunks for value in chunk]
+    present = [value for value in values if value is not None and not isinstance(value, bytes)]
+    numeric = [value for value in present if isinstance(value, (int, float))]
+    stats = {
+        "column": name,
+        "type": "number" if present and len(numeric) == len(present) else "text",
+        "nulls": len(values) - sum(1 for value in values if value is not None),
+        "distinct": len(set(value for value in values if value is not None)),
+    }
+    if present:
+        try:
+            stats["min"], stats["max"] = min(present), max(present)
+        except TypeError:
+            text = [str(value) for value in present]
+            stats["min"], stats["max"] = min(text), max(text)
+    if numeric and len(numeric) == len(present):
+        stats["mean"] = sum(numeric) / len(numeric)
+    if present:
+        stats["top"] = Counter(present).most_common(TOP_VALUES)
+    return stats
+
+
+def _short(value: Any, width: int = 40) -> str:
+    if isinstance(value, float):
+        text = f"{value:.6g}"
+    else:
+        text = _value_to_text(value)
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def format_summary(result: Dict[str, Any], collector: ColumnarCollector,
+                   preview_rows: Optional[int] = None) -> str:
+    """
+    Formatea el resumen para el modelo: filas, estadísticas por columna, algunas
+    filas de ejemplo y la ruta del resultado completo.
+
+    Args:
+        result: Resultado de ``stream_query`` (filas de ejemplo)
+        collector: Colector con el resultado completo
+        preview_rows: Filas de ejemplo a incluir (MCP_SUMMARY_PREVIEW_ROWS)
+    """
+    if preview_rows is None:
+        preview_rows = int(os.getenv("MCP_SUMMARY_PREVIEW_ROWS", "10"))
+    if result["row_count_exact"]:
+        lines = [f"Resumen del resultado: {collector.rows} filas, {len(collector.columns)} columnas."]
+    else:
+        lines = [
+            f"Resumen del resultado: más de {collector.rows} filas, {len(collector.columns)} columnas "
+            f"(se recorrieron las primeras {collector.rows}, límite MCP_RESULTS_MAX_ROWS)."
+        ]
+    if collector.collected < collector.rows:
+        lines.append(f"(estadísticas calculadas sobre las primeras {collector.collected} filas)")
+    lines.append("columna | tipo | nulos | distintos | mín | máx | promedio | más frecuentes")
+    for stats in collector.column_stats():
+        top = ", ".join(f"{_short(value, 20)} ({count})" for value, count in stats.get("top", []))
+        lines.append(" | ".join([
+            stats["column"], stats["type"], str(stats["nulls"]), str(stats["distinct"]),
+            _short(stats.get("min", "")), _short(stats.get("max", "")),
+            _short(stats.get("mean", "")), top,
+        ]))
+    preview = result["rows"][:preview_rows]
+    if preview:
+        lines.append("")
+        lines.append(f"Primeras {len(preview)} filas:")
+        lines.append(" | ".join(collector.columns))
+        lines += [" | ".join(_short(value) for value in row) for row in preview]
+    lines.append("")
+    lines.append(f"{RESULT_FILE_PREFIX}{os.path.basename(collector.path)}")
+    return "\n".join(lines)
@@ -0,0 +1,184 @@
+"""Presupuesto de tokens y compactación del historial del ciclo conversacional.
+
+En cada iteración se reenvía todo el historial a Bedrock, así que los
+resultados de herramientas ya vistos por el modelo (el esquema completo,
+conjuntos de filas) se pagan una y otra vez. Antes de cada llamada el
+historial se compacta: los resultados repetidos se reemplazan por una
+referencia, el esquema ya revisado o incluido en el prompt de sistema se omite y los
+resultados antiguos se recortan. Además se lleva la cuenta de tokens por
+pregunta para cortar el ciclo si supera el límite.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+# Caracteres por token usados para estimar el tamaño de los mensajes
+CHARS_PER_TOKEN = 4
+
+# Herramientas cuyo resultado es el esquema de la base de datos
+SCHEMA_TOOLS = {"get_database_schema_tool", "get_relevant_schema_tool"}
+
+
+def estimate_tokens(value: Any) -> int:
+    """Estima los tokens de un texto, bloque o lista de mensajes de la Converse API."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return (len(value) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    if isinstance(value, list):
+        return sum(estimate_tokens(item) for item in value)
+    if isinstance(value, dict):
+        if "cachePoint" in value:
+            return 0
+        if "text" in value and isinstance(value["text"], str):
+            return estimate_tokens(value["text"])
+        if "content" in value and "role" in value:
+            return estimate_tokens(value["content"])
+        if "toolResult" in value:
+            return estimate_tokens(value["toolResult"].get("content", []))
+    return estimate_tokens(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def _tool_names(messages: List[Dict]) -> Dict[str, str]:
+    """Relaciona cada toolUseId con el nombre de la herramienta que pidió el modelo."""
+    names = {}
+    for message in messages:
+        if message["role"] != "assistant":
+            continue
+        for block in message["content"]:
+            if "toolUse" in block:
+                names[block["toolUse"].get("toolUseId")] = block["toolUse"].get("name")
+    return names
+
+
+def _result_text(tool_result: Dict) -> Optional[str]:
+    content = tool_result.get("content", [])
+    if len(content) == 1 and isinstance(content[0].get("text"), str):
+        return content[0]["text"]
+    return None
+
+
+def compact_messages(messages: List[Dict], system_blocks: Optional[List[Dict]] = None,
+                     stale_result_chars: Optional[int] = None) -> int:
+    """
+    Compacta en el lugar los resultados de herramientas que el modelo ya vio.
+
+    Solo se modifica el texto de los bloques toolResult (cada toolUse conserva
+    su toolResult, como exige la Converse API):
+
+    - Un resultado idéntico a otro posterior se reemplaza por una referencia.
+    - Un esquema antiguo, o uno idéntico al incluido en ``system_blocks``, se
+      reemplaza por una referencia. Con SCHEMA_PRESEED_MODE=relevant el prompt
+      de sistema trae solo algunas tablas: un esquema distinto recién pedido se
+      conserva.
+    - Los demás resultados antiguos se recortan a ``stale_result_chars``
+      caracteres (CONVERSATION_STALE_RESULT_CHARS).
+
+    Los resultados del último mensaje (los que el modelo aún no vio) solo se
+    compactan si están repetidos o si ya están en el prompt de sistema.
+
+    Returns:
+        int: Tokens estimados que se ahorraron
+    """
+    if stale_result_chars is None:
+        stale_result_chars = int(os.getenv("CONVERSATION_STALE_RESULT_CHARS", "1500"))
+    system_text = "\n".join(
+        block["text"] for block in system_blocks or [] if isinstance(block.get("text"), str)
+    )
+    names = _tool_names(messages)
+    last_index = len(messages) - 1
+    seen = {}
+    saved = 0
+    # De atrás hacia adelante: se conserva la aparición más reciente de cada resultado
+    for index in range(last_index, -1, -1):
+        message = messages[index]
+        if message["role"] != "user":
+            continue
+        for block in message["content"]:
+            tool_result = block.get("toolResult")
+            if tool_result is None:
+                continue
+            text = _result_text(tool_result)
+            if text is None or "[Resultado omitido" in text:
+                continue
+            name = names.get(tool_result.get("toolUseId"), "")
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            stale = index != last_index
+
+            if digest in seen:
+                replacement = (
+                    f"[Resultado omitido: idéntico al de {name} "
+                    f"(toolUseId {seen[digest]}) más adelante en la conversación.]"
+                )
+            elif name in SCHEMA_TOOLS and (stale or (text and text in system_text)):
+                seen[digest] = tool_result.get("toolUseId")
+                replacement = (
+                    "[Resultado omitido: el esquema ya está en el prompt de sistema.]"
+                    if text and text in system_text else
+                    f"[Resultado omitido: esquema de la base de datos ya revisado ({name}); "
+                    "pídelo de nuevo si lo necesitas.]"
+                )
+            elif stale and len(text) > stale_result_chars:
+                seen[digest] = tool_result.get("toolUseId")
+                replacement = (
+                    text[:stale_result_chars] +
+                    f"\n[Resultado omitido en parte: {len(text) - stale_result_chars} caracteres "
+                    "ya revisados.]"
+                )
+            else:
+                seen[digest] = tool_result.get("toolUseId")
+                continue
+
+            saved += estimate_tokens(text) - estimate_tokens(replacement)
+            tool_result["content"] = [{"text": replacement}]
+    return saved
+
+
+class TokenBudget:
+    """
+    Límite de tokens (entrada + salida) por pregunta y registro de uso por iteración.
+
+    Usa el campo ``usage`` de cada respuesta de Bedrock; si no viene, usa la
+    estimación del tamaño de la solicitud.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None):
+        if max_tokens is None:
+            max_tokens = int(os.getenv("CONVERSATION_MAX_TOKENS", "60000"))
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.iterations: List[Dict[str, Any]] = []
+
+    def would_exceed(self, estimated_input: int) -> bool:
+        """Indica si una llamada con ``estimated_input`` tokens de entrada superaría el límite."""
+        return self.max_tokens > 0 and self.used + estimated_input > self.max_tokens
+
+    def record(self, iteration: int, estimated_input: int, usage: Optional[Dict[str, int]],
+               compacted: int = 0) -> Dict[str, Any]:
+        """Registra el uso de una iteración y retorna su resumen."""
+        usage = usage or {}
+        input_tokens = usage.get("inputTokens", estimated_input)
+        output_tokens = usage.get("outputTokens", 0)
+        self.used += input_tokens + output_tokens
+        entry = {
+            "iteration": iteration,
+            "estimated_input_tokens": estimated_input,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": usage.get("cacheReadInputTokens", 0),
+            "compacted_tokens": compacted,
+            "total_tokens": self.used,
+        }
+        self.iterations.append(entry)
+        return entry
+
+    def report(self) -> Dict[str, Any]:
+        """Retorna el uso total y por iteración de la pregunta."""
+        return {
+            "max_tokens": self.max_tokens,
+            "total_tokens": self.used,
+            "input_tokens": sum(entry["input_tokens"] for entry in self.iterations),
+            "output_tokens": sum(entry["output_tokens"] for entry in self.iterations),
+            "iterations": list(self.iterations),
+        }
@@ -1,12 +1,387 @@
+import hashlib
+import json
+import os
+import queue
 import sqlite3
-from typing import Dict, List, Tuple, Any, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple, Any, Optional
+from urllib.request import pathname2url
+
+from src.metrics import record_event, span
+
+# Caché en memoria del esquema: identidad del archivo -> esquema extraído y formateado
+_schema_cache: Dict[Tuple, Dict[str, Any]] = {}
+_schema_cache_lock = threading.Lock()
+
+# Filas leídas por cada llamada a fetchmany al recorrer resultados
+FETCH_BATCH_SIZE = 500
+
+# Instrucciones de la VM de SQLite entre cada llamada al progress handler
+PROGRESS_HANDLER_INTERVAL = 1000
+
+# Pools de conexiones de solo lectura: identidad del archivo -> pool
+_connection_pools: Dict[Tuple, "ConnectionPool"] = {}
+_connection_pools_lock = threading.Lock()
+
+# PRAGMA de solo lectura permitidos en conexiones del pool (sin asignar un valor)
+READ_ONLY_PRAGMAS = {
+    "collation_list", "compile_options", "data_version", "database_list", "encoding",
+    "foreign_key_list", "freelist_count", "function_list", "index_info", "index_list",
+    "index_xinfo", "module_list", "page_count", "page_size", "pragma_list", "schema_version",
+    "table_info", "table_list", "table_xinfo", "user_version",
+}
+
+# PRAGMA cuyo argumento es una tabla o un índice, no un valor nuevo
+_PRAGMAS_WITH_TARGET = {
+    "foreign_key_list", "index_info", "index_list", "index_xinfo", "table_info", "table_list",
+    "table_xinfo",
+}
+
+def _pooled_connection_authorizer(action, arg1, arg2, db_name, trigger):
+    """
+    Impide que una consulta cambie el estado de una conexión reutilizada.
+
+    Las conexiones del pool sirven a todas las sesiones: un ATTACH o un PRAGMA
+    que cambie la configuración seguiría vigente en las consultas siguientes.
+    """
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_PRAGMA:
+        name = (arg1 or "").lower()
+        if name not in READ_ONLY_PRAGMAS or (arg2 is not None and name not in _PRAGMAS_WITH_TARGET):
+            return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
 
 def get_database_connection(db_path: str):
     """Obtiene la conexión con la base de datos SQLite."""
     return sqlite3.connect(db_path)
 
-def get_database_schema(connection) -> Dict[str, Dict]:
-    """Obtiene el esquema completo de la base de datos incluyendo constraints, foreign keys e índices."""
+class ConnectionPool:
+    """
+    Pool de conexiones de solo lectura a una base de datos SQLite.
+
+    Las conexiones se abren una sola vez en modo URI ``mode=ro`` con pragmas de
+    rendimiento y se reutilizan, de modo que la caché de páginas y el mapeo en
+    memoria sobreviven entre consultas. Cada conexión se entrega a un solo
+    llamador a la vez. Un authorizer rechaza ATTACH, DETACH y los PRAGMA que
+    cambian la configuración, para que una consulta no afecte a las siguientes.
+    """
+
+    def __init__(self, db_path: str, max_size: Optional[int] = None):
+        self.db_path = os.path.realpath(db_path)
+        self.uri = f"file:{pathname2url(self.db_path)}?mode=ro"
+        self.max_size = max_size or int(os.getenv("MCP_SQLITE_POOL_SIZE", "4"))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._data_versions = {}
+        self._lock = threading.Lock()
+        # Se incrementa cada vez que una conexión detecta cambios hechos por otra
+        self.data_generation = 0
+        self.closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        mmap_size = int(os.getenv("MCP_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+        cache_size_kb = int(os.getenv("MCP_SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+        connection.execute(f"PRAGMA mmap_size = {mmap_size}")
+        connection.execute(f"PRAGMA cache_size = {-cache_size_kb}")
+        connection.execute("PRAGMA temp_store = MEMORY")
+        connection.execute("PRAGMA query_only = ON")
+        self._data_versions[id(connection)] = connection.execute("PRAGMA data_version").fetchone()[0]
+        connection.set_authorizer(_pooled_connection_authorizer)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Entrega una conexión del pool y la devuelve al terminar."""
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._idle.get_nowait()
+                self._check_data_version(connection)
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                yield connection
+            finally:
+                if connection.in_transaction:
+                    connection.rollback()
+                if self.closed:
+                    connection.close()
+                else:
+                    self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def _check_data_version(self, connection: sqlite3.Connection):
+        """
+        Compara ``PRAGMA data_version`` con el último valor visto por la conexión.
+
+        El valor cambia cuando otra conexión confirma cambios en la base de datos;
+        como es propio de cada conexión, se traduce a ``data_generation``, que es
+        común a todo el pool.
+        """
+        data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if self._data_versions.get(id(connection)) != data_version:
+                self._data_versions[id(connection)] = data_version
+                self.data_generation += 1
+
+    def close(self):
+        """Cierra las conexiones inactivas; las que están en uso se cierran al devolverse."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+def apply_heap_limit(heap_limit_mb: Optional[int] = None):
+    """
+    Fija el límite de memoria de SQLite (``PRAGMA hard_heap_limit``), que acota
+    tablas temporales y ordenamientos en memoria.
+
+    El límite es de todo el proceso, no de una conexión: solo lo aplica el
+    servidor MCP lanzado como subproceso stdio. Con MCP_TRANSPORT=memory
+    limitaría también el resto de SQLite en el proceso del agente.
+    """
+    if heap_limit_mb is None:
+        heap_limit_mb = int(os.getenv("MCP_SQLITE_HEAP_LIMIT_MB", "1024"))
+    if heap_limit_mb > 0:
+        connection = sqlite3.connect(":memory:")
+        try:
+            connection.execute(f"PRAGMA hard_heap_limit = {heap_limit_mb * 1024 * 1024}")
+        finally:
+            connection.close()
+
+class QueryBudgetExceeded(Exception):
+    """La consulta superó su presupuesto de tiempo, pasos de la VM o memoria."""
+
+    HINTS = {
+        "timeout": "La consulta superó el tiempo máximo de ejecución.",
+        "vm_steps": "La consulta superó el máximo de operaciones permitidas.",
+        "memory": "La consulta superó la memoria disponible para tablas temporales y ordenamientos.",
+    }
+
+    def __init__(self, reason: str, limit: Any, elapsed: float, vm_steps: int):
+        self.reason = reason
+        self.limit = limit
+        self.elapsed = elapsed
+        self.vm_steps = vm_steps
+        super().__init__(f"{self.HINTS[reason]} (límite: {limit})")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Error estructurado para que el modelo pueda reescribir la consulta."""
+        return {
+            "error": "query_budget_exceeded",
+            "reason": self.reason,
+            "limit": self.limit,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "vm_steps": self.vm_steps,
+            "hint": (
+                f"{self.HINTS[self.reason]} Reescribe la consulta para que procese menos filas: "
+                "revisa que todos los JOIN tengan condición (evita productos cartesianos), "
+                "agrega filtros WHERE, usa agregaciones o LIMIT."
+            ),
+        }
+
+@contextmanager
+def query_budget(connection, timeout: Optional[float] = None, max_steps: Optional[int] = None):
+    """
+    Limita el tiempo y los pasos de la VM de las consultas ejecutadas dentro del bloque.
+
+    Usa un progress handler que aborta la consulta al superar el presupuesto y,
+    como respaldo para operaciones largas dentro de un solo paso (p. ej. un
+    ordenamiento), un temporizador que llama a ``connection.interrupt()``.
+
+    Args:
+        connection: Conexión SQLite
+        timeout: Segundos máximos (MCP_QUERY_TIMEOUT, 0 = sin límite)
+        max_steps: Instrucciones máximas de la VM (MCP_QUERY_MAX_STEPS, 0 = sin límite)
+
+    Raises:
+        QueryBudgetExceeded: Si la consulta se abortó por superar el presupuesto
+    """
+    if timeout is None:
+        timeout = float(os.getenv("MCP_QUERY_TIMEOUT", "10"))
+    if max_steps is None:
+        max_steps = int(os.getenv("MCP_QUERY_MAX_STEPS", "100000000"))
+
+    start = time.monotonic()
+    state = {"reason": None, "steps": 0}
+
+    def on_progress():
+        state["steps"] += PROGRESS_HANDLER_INTERVAL
+        if timeout and time.monotonic() - start > timeout:
+            state["reason"] = "timeout"
+        elif max_steps and state["steps"] > max_steps:
+            state["reason"] = "vm_steps"
+        return 1 if state["reason"] else 0
+
+    def on_timer():
+        state["reason"] = state["reason"] or "timeout"
+        connection.interrupt()
+
+    timer = threading.Timer(timeout, on_timer) if timeout else None
+    connection.set_progress_handler(on_progress, PROGRESS_HANDLER_INTERVAL)
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    reason = None
+    try:
+        yield
+    except (sqlite3.OperationalError, MemoryError) as e:
+        if state["reason"]:
+            reason = state["reason"]
+        elif isinstance(e, MemoryError) or "out of memory" in str(e).lower():
+            reason = "memory"
+        if reason is None:
+            raise
+        limits = {
+            "timeout": f"{timeout:g} s",
+            "vm_steps": max_steps,
+            "memory": f"{os.getenv('MCP_SQLITE_HEAP_LIMIT_MB', '1024')} MB",
+        }
+        raise QueryBudgetExceeded(
+            reason, limits[reason], time.monotonic() - start, state["steps"]
+        ) from e
+    finally:
+        if timer:
+            timer.cancel()
+        connection.set_progress_handler(None, 0)
+        # Consultas dentro del presupuesto y superadas por motivo (timeout, vm_steps, memory)
+        record_event("sqlite.query_budget", reason or "ok")
+
+def get_connection_pool(db_path: str) -> ConnectionPool:
+    """
+    Retorna el pool de conexiones de una base de datos, creándolo si es necesario.
+
+    Si el archivo fue reemplazado (otro inodo en la misma ruta) se crea un pool
+    nuevo y se cierra el anterior.
+    """
+    identity, _ = get_database_fingerprint(db_path)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(identity)
+        if pool is None:
+            for other_identity, other_pool in list(_connection_pools.items()):
+                if other_identity[0] == identity[0]:
+                    other_pool.close()
+                    del _connection_pools[other_identity]
+            pool = ConnectionPool(db_path)
+            _connection_pools[identity] = pool
+        return pool
+
+@contextmanager
+def pooled_connection(db_path: str):
+    """Context manager que entrega una conexión de solo lectura del pool de la base de datos."""
+    with get_connection_pool(db_path).connection() as connection:
+        yield connection
+
+def _quote_identifier(name: str) -> str:
+    """Escapa un identificador SQLite (tabla, índice) para interpolarlo en SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+def _new_table_info() -> Dict[str, Any]:
+    return {
+        "columns": [],
+        "primary_keys": [],
+        "foreign_keys": [],
+        "indexes": [],
+        "sample_data": None
+    }
+
+def get_database_schema(connection, bulk: bool = True) -> Dict[str, Dict]:
+    """
+    Obtiene el esquema completo de la base de datos incluyendo constraints, foreign keys e índices.
+
+    Args:
+        connection: Conexión SQLite abierta
+        bulk: Si es True, extrae columnas, foreign keys e índices de todas las tablas
+            en unas pocas consultas con las funciones ``pragma_*()``; si SQLite no las
+            soporta se usa la extracción tabla por tabla.
+    """
+    with span("sqlite.schema"):
+        if bulk:
+            try:
+                return _get_database_schema_bulk(connection)
+            except sqlite3.OperationalError:
+                pass  # SQLite < 3.16 no soporta funciones pragma con valores de tabla
+        return _get_database_schema_per_table(connection)
+
+def _get_database_schema_bulk(connection) -> Dict[str, Dict]:
+    """Extrae el esquema con consultas agregadas sobre sqlite_master y las funciones pragma_*()."""
+    cursor = connection.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+    schema = {table_name: _new_table_info() for (table_name,) in cursor.fetchall()}
+
+    # Columnas de todas las tablas
+    cursor.execute(
+        """
+        SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+        FROM sqlite_master AS m
+        JOIN pragma_table_info(m.name) AS p
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+        ORDER BY m.name, p.cid
+        """
+    )
+    for table_name, name, col_type, not_null, default_value, pk in cursor.fetchall():
+        table_info = schema[table_name]
+        table_info["columns"].append({
+            "name": name,
+            "type": col_type,
+            "not_null": bool(not_null),
+            "default_value": default_value,
+            "primary_key": bool(pk)
+        })
+        if pk:
+            table_info["primary_keys"].append(name)
+
+    # Foreign keys de todas las tablas (mismo orden que PRAGMA foreign_key_list)
+    cursor.execute(
+        """
+        SELECT m.name, f."table", f."from", f."to"
+        FROM sqlite_master AS m
+        JOIN pragma_foreign_key_list(m.name) AS f
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+        """
+    )
+    for table_name, to_table, from_column, to_column in cursor.fetchall():
+        schema[table_name]["foreign_keys"].append({
+            "from_column": from_column,
+            "to_table": to_table,
+            "to_column": to_column
+        })
+
+    # Índices y sus columnas, en el orden en que aparecen en sqlite_master
+    cursor.execute(
+        """
+        SELECT i.tbl_name, i.name, ii.name
+        FROM sqlite_master AS i
+        JOIN pragma_index_info(i.name) AS ii
+        WHERE i.type = 'index' AND i.name NOT LIKE 'sqlite_%'
+        ORDER BY i.rowid, ii.seqno
+        """
+    )
+    for table_name, index_name, column_name in cursor.fetchall():
+        if table_name not in schema:
+            continue
+        indexes = schema[table_name]["indexes"]
+        if not indexes or indexes[-1]["name"] != index_name:
+            indexes.append({"name": index_name, "columns": []})
+        indexes[-1]["columns"].append(column_name)
+
+    # Muestra de datos (primeras 2 filas para ayudar al LLM a entender los datos)
+    for table_name, table_info in schema.items():
+        table_info["sample_data"] = _get_sample_data(cursor, table_name, table_info["columns"])
+
+    return schema
+
+def _get_database_schema_per_table(connection) -> Dict[str, Dict]:
+    """Extrae el esquema consultando cada tabla por separado con PRAGMA."""
     cursor = connection.cursor()
     
     # Obtener todas las tablas
@@ -16,16 +391,10 @@ def get_database_schema(connection) -> Dict[str, Dict]:
     schema = {}
     
     for (table_name,) in tables:
-        table_info = {
-            "columns": [],
-            "primary_keys": [],
-            "foreign_keys": [],
-            "indexes": [],
-            "sample_data": None
-        }
+        table_info = _new_table_info()
         
         # Información de columnas con PRAGMA table_info
-        cursor.execute(f"PRAGMA table_info({table_name})")
+        cursor.execute(f"PRAGMA table_info({_quote_identifier(table_name)})")
         columns = cursor.fetchall()
         # Formato: (cid, name, type, notnull, dflt_value, pk)
         
@@ -43,7 +412,7 @@ def get_database_schema(connection) -> Dict[str, Dict]:
                 table_info["primary_keys"].append(col_info["name"])
         
         # Foreign keys
-        cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+        cursor.execute(f"PRAGMA foreign_key_list({_quote_identifier(table_name)})")
         fks = cursor.fetchall()
         # Formato: (id, seq, table, from, to, on_update, on_delete, match)
         for fk in fks:
@@ -54,10 +423,13 @@ def get_database_schema(connection) -> Dict[str, Dict]:
             })
         
         # Índices
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='{table_name}' AND name NOT LIKE 'sqlite_%'")
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=? AND name NOT LIKE 'sqlite_%'",
+            (table_name,)
+        )
         indexes = cursor.fetchall()
         for (index_name,) in indexes:
-            cursor.execute(f"PRAGMA index_info({index_name})")
+            cursor.execute(f"PRAGMA index_info({_quote_identifier(index_name)})")
             index_cols = cursor.fetchall()
             # Formato: (seqno, cid, name)
             table_info["indexes"].append({
@@ -66,21 +438,152 @@ def get_database_schema(connection) -> Dict[str, Dict]:
             })
         
         # Muestra de datos (primeras 2 filas para ayudar al LLM a entender los datos)
-        try:
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 2")
-            sample = cursor.fetchall()
-            if sample:
-                column_names = [col[1] for col in columns]
-                table_info["sample_data"] = [
-                    dict(zip(column_names, row)) for row in sample
-                ]
-        except:
-            pass  # Si hay error obteniendo muestra, continuar sin ella
+        table_info["sample_data"] = _get_sample_data(cursor, table_name, table_info["columns"])
         
         schema[table_name] = table_info
     
     return schema
 
+def _get_sample_data(cursor, table_name: str, columns: List[Dict]) -> Optional[List[Dict]]:
+    """Obtiene las primeras 2 filas de una tabla como ejemplo para el LLM."""
+    try:
+        cursor.execute(f"SELECT * FROM {_quote_identifier(table_name)} LIMIT 2")
+        sample = cursor.fetchall()
+    except sqlite3.Error:
+        return None
+    if not sample:
+        return None
+    column_names = [col["name"] for col in columns]
+    return [dict(zip(column_names, row)) for row in sample]
+
+def get_database_fingerprint(db_path: str) -> Tuple[Tuple, Tuple]:
+    """
+    Obtiene la identidad y la versión de un archivo SQLite a partir de stat().
+
+    Returns:
+        Tuple: (identidad, firma) donde la identidad es (ruta real, dispositivo, inodo)
+        y la firma cambia cuando se modifica el archivo o su WAL.
+    """
+    real_path = os.path.realpath(db_path)
+    stat = os.stat(real_path)
+    identity = (real_path, stat.st_dev, stat.st_ino)
+    signature = [stat.st_mtime_ns, stat.st_size]
+    try:
+        wal_stat = os.stat(real_path + "-wal")
+        signature += [wal_stat.st_mtime_ns, wal_stat.st_size]
+    except OSError:
+        pass
+    return identity, tuple(signature)
+
+def _schema_cache_file(identity: Tuple) -> Optional[str]:
+    """Ruta del caché en disco para una base de datos, si SCHEMA_CACHE_DIR está configurado."""
+    cache_dir = os.getenv("SCHEMA_CACHE_DIR")
+    if not cache_dir:
+        return None
+    digest = hashlib.sha256(repr(identity).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+def schema_file(db_path: str) -> str:
+    """Ruta del esquema precalculado junto a la base de datos (ver ``save_schema_file``)."""
+    return f"{db_path}.schema.json"
+
+def _read_schema_entry(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        entry["signature"] = tuple(entry["signature"])
+        return entry
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _write_schema_entry(path: Optional[str], entry: Dict[str, Any]):
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # El caché en disco es opcional; si falla, se sigue con el de memoria
+
+def _load_schema_from_disk(identity: Tuple, db_path: str) -> Optional[Dict[str, Any]]:
+    return _read_schema_entry(_schema_cache_file(identity)) or _read_schema_entry(schema_file(db_path))
+
+def _save_schema_to_disk(identity: Tuple, entry: Dict[str, Any]):
+    _write_schema_entry(_schema_cache_file(identity), entry)
+
+def get_cached_schema(db_path: str) -> Tuple[Dict[str, Dict], str]:
+    """
+    Obtiene el esquema de la base de datos y su versión formateada usando caché.
+
+    Si el archivo no cambió (misma firma de stat) se responde desde memoria sin
+    abrir la base de datos. Si cambió pero ``PRAGMA schema_version`` es el mismo,
+    solo se refrescan las filas de ejemplo; en otro caso se extrae todo de nuevo.
+    Con ``SCHEMA_CACHE_DIR`` el caché también se persiste en disco; también se
+    usa el esquema precalculado al ingerir la base de datos (``schema_file``).
+
+    Returns:
+        Tuple: (esquema, esquema formateado)
+    """
+    identity, signature = get_database_fingerprint(db_path)
+
+    with _schema_cache_lock:
+        entry = _schema_cache.get(identity)
+    if entry is None:
+        entry = _load_schema_from_disk(identity, db_path)
+    if entry is not None and entry["signature"] == signature:
+        with _schema_cache_lock:
+            _schema_cache[identity] = entry
+        return entry["schema"], entry["formatted"]
+
+    with pooled_connection(db_path) as connection:
+        schema_version = connection.execute("PRAGMA schema_version").fetchone()[0]
+        if entry is not None and entry["schema_version"] == schema_version:
+            schema = {name: dict(info) for name, info in entry["schema"].items()}
+            cursor = connection.cursor()
+            for table_name, table_info in schema.items():
+                table_info["sample_data"] = _get_sample_data(
+                    cursor, table_name, table_info["columns"]
+                )
+        else:
+            schema = get_database_schema(connection)
+
+    entry = {
+        "signature": signature,
+        "schema_version": schema_version,
+        "schema": schema,
+        "formatted": format_schema(schema),
+    }
+    with _schema_cache_lock:
+        _schema_cache[identity] = entry
+    _save_schema_to_disk(identity, entry)
+    return entry["schema"], entry["formatted"]
+
+def save_schema_file(db_path: str) -> Tuple[Dict[str, Dict], str]:
+    """
+    Precalcula el esquema y lo guarda junto a la base de datos (``schema_file``),
+    para que cualquier proceso lo use sin volver a extraerlo mientras el archivo
+    no cambie.
+
+    Returns:
+        Tuple: (esquema, esquema formateado)
+    """
+    schema, formatted = get_cached_schema(db_path)
+    identity, _ = get_database_fingerprint(db_path)
+    with _schema_cache_lock:
+        entry = _schema_cache[identity]
+    _write_schema_entry(schema_file(db_path), entry)
+    return schema, formatted
+
+def clear_schema_cache():
+    """Vacía el caché en memoria del esquema."""
+    with _schema_cache_lock:
+        _schema_cache.clear()
+
 def format_schema(schema: Dict[str, Dict]) -> str:
     """Formatea el esquema completo de la base de datos como string legible y estructurado."""
     if not schema:
@@ -136,7 +639,125 @@ def format_schema(schema: Dict[str, Dict]) -> str:
 
 def execute_query(connection, query: str) -> List[Tuple[Any, ...]]:
     """Ejecuta una consulta SQL y retorna los resultados."""
-    cursor = connection.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    return results
+    with span("sqlite.query"):
+        cursor = connection.cursor()
+        cursor.execute(query)
+        return cursor.fetchall()
+
+def _value_to_text(value: Any) -> str:
+    """Convierte un valor de SQLite a texto de una sola línea."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return f"<blob {len(value)} bytes>"
+    return str(value).replace("\n", "\\n")
+
+def stream_query(connection, query: str, max_rows: Optional[int] = None,
+                 max_bytes: Optional[int] = None, count_limit: Optional[int] = None,
+                 on_batch: Optional[Callable[[List[str], List[Tuple], bool], None]] = None) -> Dict[str, Any]:
+    """
+    Ejecuta una consulta leyendo en lotes con ``fetchmany`` y acotando el resultado.
+
+    Solo se conservan en memoria las filas que caben en los límites; el resto se
+    recorre únicamente para contarlas, hasta ``count_limit`` filas.
+
+    Args:
+        connection: Conexión SQLite abierta
+        query: Consulta SQL a ejecutar
+        max_rows: Máximo de filas a retornar (MCP_RESULT_MAX_ROWS)
+        max_bytes: Máximo aproximado de bytes de texto a retornar (MCP_RESULT_MAX_BYTES)
+        count_limit: Máximo de filas a recorrer para contar el total (MCP_RESULT_COUNT_LIMIT)
+        on_batch: Función que recibe (columnas, lote, truncado) por cada lote
+            leído, hasta ``count_limit`` filas; ``truncado`` indica si el
+            resultado ya superó los límites
+
+    Returns:
+        dict: columns, rows, row_count, row_count_exact y truncated
+    """
+    if max_rows is None:
+        max_rows = int(os.getenv("MCP_RESULT_MAX_ROWS", "200"))
+    if max_bytes is None:
+        max_bytes = int(os.getenv("MCP_RESULT_MAX_BYTES", "20000"))
+    if count_limit is None:
+        count_limit = int(os.getenv("MCP_RESULT_COUNT_LIMIT", "100000"))
+
+    with span("sqlite.query"):
+        cursor = connection.cursor()
+        cursor.execute(query)
+        columns = [description[0] for description in cursor.description or []]
+
+        rows = []
+        row_count = 0
+        size = sum(len(column) + 3 for column in columns)
+        truncated = False
+        row_count_exact = True
+
+        while cursor.description is not None:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            for row in batch:
+                row_count += 1
+                if truncated:
+                    continue
+                row_size = sum(len(_value_to_text(value)) + 3 for value in row)
+                if len(rows) >= max_rows or size + row_size > max_bytes:
+                    truncated = True
+                    continue
+                rows.append(row)
+                size += row_size
+            if on_batch is not None:
+                on_batch(columns, batch, truncated)
+            if truncated and row_count >= count_limit:
+                row_count_exact = cursor.fetchone() is None
+                break
+
+    return {
+        "columns": columns,
+        "rows": rows,
+        "row_count": row_count,
+        "row_count_exact": row_count_exact,
+        "truncated": truncated
+    }
+
+def format_query_result(result: Dict[str, Any], fmt: str = "text",
+                        preflight: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Formatea el resultado de ``stream_query`` de forma columnar y compacta.
+
+    Los nombres de columna se envían una sola vez y luego cada fila como lista de
+    valores, en lugar de repetir las claves por fila.
+
+    Args:
+        result: Resultado de ``stream_query``
+        fmt: ``"text"`` (filas separadas por " | ") o ``"json"``
+        preflight: Revisión de ``preflight_query`` a incluir en el objeto JSON
+            (clave ``preflight``); en texto se agrega aparte, como sugerencia
+    """
+    if fmt == "json":
+        payload = {
+            "columns": result["columns"],
+            "rows": [list(row) for row in result["rows"]],
+            "row_count": result["row_count"],
+            "row_count_exact": result["row_count_exact"],
+            "truncated": result["truncated"]
+        }
+        if preflight:
+            payload["preflight"] = {
+                key: preflight[key] for key in ("issues", "suggested_indexes", "plan")
+            }
+        return json.dumps(payload, ensure_ascii=False, default=_value_to_text)
+
+    if not result["rows"] and not result["row_count"]:
+        return "No se encontraron resultados."
+
+    total = str(result["row_count"]) if result["row_count_exact"] else f"más de {result['row_count']}"
+
+    lines = [" | ".join(result["columns"])]
+    lines += [" | ".join(_value_to_text(value) for value in row) for row in result["rows"]]
+    lines.append(f"(filas retornadas: {len(result['rows'])} de {total})")
+    if result["truncated"]:
+        lines.append(
+            "(resultado truncado; usa agregaciones, filtros o LIMIT para obtener menos filas)"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,203 @@
+"""Ingesta de bases de datos subidas por el usuario en un almacén direccionado por contenido.
+
+Cada archivo se identifica por su SHA-256 y se guarda una sola vez en
+``DB_STORE_DIR/<hash>/database.db``. Al ingerirlo se valida (encabezado SQLite y
+``PRAGMA quick_check`` o ``integrity_check``), se ejecuta ``ANALYZE`` y se
+precalculan el esquema y el índice de relevancia, guardados junto al archivo.
+Si se sube otra vez la misma base de datos se reutiliza todo lo anterior: la
+misma ruta, el mismo esquema en caché y el mismo servidor MCP del pool.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.cache import LRUCache
+from src.database import get_database_fingerprint, save_schema_file
+from src.schema_index import get_schema_index, save_schema_index
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Archivo que marca una ingesta completa (se escribe al final)
+MANIFEST_NAME = "manifest.json"
+
+# Subida (ruta, tamaño, mtime) -> hash, para no volver a leer el archivo en cada pregunta
+_upload_hashes = LRUCache(max_entries=256)
+
+# Un lock por hash para que dos subidas simultáneas del mismo archivo no lo ingieran dos veces
+_ingest_locks: Dict[str, threading.Lock] = {}
+_ingest_locks_lock = threading.Lock()
+
+
+class IngestError(ValueError):
+    """La base de datos subida no es un archivo SQLite válido."""
+
+
+def get_store_dir() -> str:
+    return os.getenv("DB_STORE_DIR", os.path.join("data", "store"))
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _upload_hash(path: str) -> str:
+    file_stat = os.stat(path)
+    key = (os.path.realpath(path), file_stat.st_size, file_stat.st_mtime_ns)
+    digest = _upload_hashes.get(key)
+    if digest is None:
+        digest = hash_file(path)
+        _upload_hashes.set(key, digest)
+    return digest
+
+
+def _ingest_lock(digest: str) -> threading.Lock:
+    with _ingest_locks_lock:
+        return _ingest_locks.setdefault(digest, threading.Lock())
+
+
+def _read_manifest(entry_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(entry_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def validate_database(path: str, check: Optional[str] = None) -> str:
+    """
+    Verifica que el archivo sea una base de datos SQLite íntegra.
+
+    Args:
+        path: Archivo a validar
+        check: "quick" (``PRAGMA quick_check``), "full" (``PRAGMA integrity_check``)
+            u "off"; por defecto INGEST_INTEGRITY_CHECK
+
+    Returns:
+        str: Resultado de la verificación ("ok" u "off")
+
+    Raises:
+        IngestError: Si el archivo no es SQLite o la verificación encuentra errores
+    """
+    if check is None:
+        check = os.getenv("INGEST_INTEGRITY_CHECK", "quick")
+    with open(path, "rb") as f:
+        if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+            raise IngestError("El archivo no es una base de datos SQLite.")
+    if check == "off":
+        return "off"
+    pragma = "integrity_check" if check == "full" else "quick_check"
+    try:
+        connection = sqlite3.connect(path)
+        try:
+            problems = [row[0] for row in connection.execute(f"PRAGMA {pragma}(20)")]
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError as e:
+        raise IngestError(f"La base de datos está dañada: {e}") from e
+    if problems != ["ok"]:
+        raise IngestError("La base de datos está dañada: " + "; ".join(problems))
+    return "ok"
+
+
+def _prepare_copy(path: str, analysis_limit: int):
+    """Deja la copia lista para lectura: sin WAL y con estadísticas de ANALYZE."""
+    connection = sqlite3.connect(path)
+    try:
+        # Sin WAL la copia se puede abrir en solo lectura sin crear archivos -wal/-shm
+        connection.execute("PRAGMA journal_mode = DELETE")
+        if analysis_limit:
+            connection.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def ingest_database(upload_path: str, original_name: Optional[str] = None,
+                    store_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ingiere una base de datos subida y retorna la ruta de su copia en el almacén.
+
+    La primera vez copia, valida, analiza y precalcula esquema e índice; las
+    siguientes (mismo contenido) solo calculan el hash, y ni eso si el archivo
+    temporal de la subida no cambió.
+
+    Returns:
+        dict: Manifiesto con db_path, sha256, size, tables, integrity_check,
+        ingested_at y ``reused`` (True si ya estaba en el almacén)
+
+    Raises:
+        IngestError: Si el archivo no es una base de datos SQLite válida
+    """
+    store_dir = store_dir or get_store_dir()
+    digest = _upload_hash(upload_path)
+    entry_dir = os.path.join(store_dir, digest)
+
+    manifest = _read_manifest(entry_dir)
+    if manifest is not None:
+        return {**manifest, "reused": True}
+
+    with _ingest_lock(digest):
+        manifest = _read_manifest(entry_dir)
+        if manifest is not None:
+            return {**manifest, "reused": True}
+
+        start = time.perf_counter()
+        os.makedirs(entry_dir, exist_ok=True)
+        db_path = os.path.join(entry_dir, "database.db")
+        tmp_path = f"{db_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(upload_path, tmp_path)
+            integrity = validate_database(tmp_path)
+            _prepare_copy(tmp_path, int(os.getenv("INGEST_ANALYSIS_LIMIT", "1000")))
+            # El contenido no vuelve a cambiar: el archivo queda en solo lectura
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, db_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not os.listdir(entry_dir):
+                os.rmdir(entry_dir)
+            raise
+
+        schema, _ = save_schema_file(db_path)
+        identity, _ = get_database_fingerprint(db_path)
+        save_schema_index(db_path, get_schema_index(identity, schema))
+
+        manifest = {
+            "db_path": os.path.abspath(db_path),
+            "sha256": digest,
+            "size": os.path.getsize(db_path),
+            "original_name": original_name or os.path.basename(upload_path),
+            "tables": len(schema),
+            "integrity_check": integrity,
+            "ingested_at": time.time(),
+            "ingest_seconds": time.perf_counter() - start,
+        }
+        manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        return {**manifest, "reused": False}
+
+
+def describe_ingest(manifest: Dict[str, Any]) -> str:
+    """Resumen legible de una ingesta para la interfaz."""
+    status = "reutilizada del almacén" if manifest["reused"] else (
+        f"validada e indexada en {manifest['ingest_seconds']:.1f} s"
+    )
+    return (
+        f"Base de datos {manifest['original_name']} lista: {manifest['tables']} tablas, "
+        f"{manifest['size'] / 1024 / 1024:.1f} MB ({status})."
+    )
@@ -1,6 +1,7 @@
 from src.mcp.server import mcp
 from src.mcp.client import MCPClient
-from src.mcp.factory import MCPServerFactory
+from src.mcp.factory import InMemoryServerParameters, MCPServerFactory
+from src.mcp.pool import MCPClientPool
 
-__all__ = ["mcp", "MCPClient", "MCPServerFactory"]
+__all__ = ["mcp", "MCPClient", "MCPServerFactory", "InMemoryServerParameters", "MCPClientPool"]
 
@@ -1,6 +1,39 @@
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from typing import Optional
+from mcp.shared.memory import create_client_server_memory_streams
+from contextlib import asynccontextmanager
+from typing import Optional, Union
+
+import anyio
+import asyncio
+
+from src.mcp.factory import InMemoryServerParameters
+from src.mcp.server import build_server
+from src.metrics import span
+
+
+@asynccontextmanager
+async def memory_client(server_params: InMemoryServerParameters):
+    """
+    In-process counterpart of ``stdio_client``.
+    
+    Runs the FastMCP server of ``src/mcp/server.py`` in a background task and
+    yields the client side of a pair of anyio memory streams connected to it.
+    """
+    # FastMCP does not expose its low-level Server (mcp.shared.memory does the same)
+    server = build_server(server_params.db_path, server_params.context)._mcp_server
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(
+                lambda: server.run(
+                    server_streams[0], server_streams[1],
+                    server.create_initialization_options()
+                )
+            )
+            try:
+                yield client_streams
+            finally:
+                task_group.cancel_scope.cancel()
 
 
 class MCPClient:
@@ -11,13 +44,21 @@ class MCPClient:
     and execution.
     """
     
-    def __init__(self, server_params: StdioServerParameters):
-        """Initialize client attributes."""
+    def __init__(self, server_params: Union[StdioServerParameters, InMemoryServerParameters],
+                 max_concurrent_calls: Optional[int] = None):
+        """
+        Initialize client attributes.
+        
+        max_concurrent_calls caps the tool calls in flight on this session;
+        the cap applies per call, so a caller waiting on something else (for
+        example the model) does not hold a slot.
+        """
         self.read = None          # Stream reader
         self.write = None         # Stream writer
         self.server_params = server_params  # Database Server configuration
         self.session = None       # MCP session
         self._client = None       # Internal client instance
+        self._call_slots = asyncio.Semaphore(max_concurrent_calls) if max_concurrent_calls else None
     
     async def __aenter__(self):
         """Async context manager entry point. Establishes connection."""
@@ -39,31 +80,35 @@ class MCPClient:
         """
         Establishes connection to MCP server.
         
-        Sets up stdio client, initializes read/write streams,
+        Sets up stdio (or in-memory) client, initializes read/write streams,
         and creates client session.
         """
-        try:
-            # Initialize stdio client with server parameters
-            self._client = stdio_client(self.server_params)
-            
-            # Get read/write streams
-            self.read, self.write = await self._client.__aenter__()
-            
-            # Create and initialize session
-            session = ClientSession(self.read, self.write)
-            self.session = await session.__aenter__()
-            
-            # Initialize the session - this performs the MCP handshake
-            await self.session.initialize()
-        except Exception as e:
-            # Clean up if connection fails
-            if self._client:
-                try:
-                    await self._client.__aexit__(None, None, None)
-                except:
-                    pass
-            # Re-raise with more context
-            raise RuntimeError(f"Error conectando al servidor MCP: {str(e)}") from e
+        with span("mcp.connect"):
+            try:
+                # Initialize stdio or in-memory client with server parameters
+                if isinstance(self.server_params, InMemoryServerParameters):
+                    self._client = memory_client(self.server_params)
+                else:
+                    self._client = stdio_client(self.server_params)
+                
+                # Get read/write streams
+                self.read, self.write = await self._client.__aenter__()
+                
+                # Create and initialize session
+                session = ClientSession(self.read, self.write)
+                self.session = await session.__aenter__()
+                
+                # Initialize the session - this performs the MCP handshake
+                await self.session.initialize()
+            except Exception as e:
+                # Clean up if connection fails
+                if self._client:
+                    try:
+                        await self._client.__aexit__(None, None, None)
+                    except:
+                        pass
+                # Re-raise with more context
+                raise RuntimeError(f"Error conectando al servidor MCP: {str(e)}") from e
     
     async def get_available_tools(self):
         """
@@ -80,7 +125,8 @@ class MCPClient:
             raise RuntimeError("Not connected to the MCP server.")
         
         # Get tools from server
-        response = await self.session.list_tools()
+        with span("mcp.list_tools"):
+            response = await self.session.list_tools()
         tools = response.tools
         
         # Display available tools
@@ -110,6 +156,10 @@ class MCPClient:
             raise RuntimeError("Not connected to the MCP Server")
         
         # Execute tool and return results
-        result = await self.session.call_tool(tool_name, arguments=arguments)
-        return result
+        if self._call_slots is None:
+            with span("mcp.call_tool", tool_name):
+                return await self.session.call_tool(tool_name, arguments=arguments)
+        async with self._call_slots:
+            with span("mcp.call_tool", tool_name):
+                return await self.session.call_tool(tool_name, arguments=arguments)
 
@@ -1,25 +1,52 @@
 from mcp import StdioServerParameters
-from typing import Optional
+from typing import Optional, Union
 import os
 import pathlib
 import sys
 
+from src.metrics import METRICS_ENV_VARS
+
+
+class InMemoryServerParameters:
+    """
+    Parámetros de un servidor MCP que corre dentro del proceso del agente.
+    
+    El cliente se conecta con streams de memoria de anyio: se conserva el
+    protocolo MCP (handshake, list_tools, call_tool) sin lanzar un subproceso
+    ni codificar los mensajes como JSON por un pipe.
+    """
+    
+    def __init__(self, db_path: str, context: str):
+        self.db_path = db_path
+        self.context = context
+
 
 class MCPServerFactory:
     """Factory para crear servidores MCP según el tipo de base de datos."""
     
     @staticmethod
-    def create_server(db_path: str, context: str) -> StdioServerParameters:
+    def create_server(db_path: str, context: str, transport: Optional[str] = None
+                      ) -> Union[StdioServerParameters, InMemoryServerParameters]:
         """
         Crea parámetros de servidor MCP para SQLite.
         
         Args:
             db_path: Ruta absoluta a la base de datos SQLite
             context: Contexto de la empresa/información general
+            transport: "stdio" (subproceso) o "memory" (en el proceso del agente);
+                por defecto MCP_TRANSPORT
             
         Returns:
-            StdioServerParameters: Parámetros para conectar al servidor MCP
+            StdioServerParameters o InMemoryServerParameters: Parámetros para
+            conectar al servidor MCP
         """
+        if transport is None:
+            transport = os.getenv("MCP_TRANSPORT", "stdio")
+        if transport == "memory":
+            return InMemoryServerParameters(os.path.abspath(db_path), context)
+        if transport != "stdio":
+            raise ValueError(f"Transporte MCP desconocido: {transport}")
+        
         # Obtener ruta absoluta del servidor MCP
         current_dir = pathlib.Path(__file__).parent
         mcp_server_path = str(current_dir / "server.py")
@@ -39,13 +66,24 @@ class MCPServerFactory:
         
         python_executable = sys.executable or "python"
 
+        # stdio_client solo hereda unas pocas variables (PATH, HOME...): la configuración
+        # del servidor (MCP_*, SCHEMA_CACHE_DIR) se pasa explícitamente, igual que la
+        # ve el servidor en memoria
+        env = {
+            name: value for name, value in os.environ.items()
+            if name.startswith("MCP_") or name == "SCHEMA_CACHE_DIR"
+        }
+        env.update({
+            "MCP_DB_PATH": db_path_abs,
+            "MCP_CONTEXT": context,
+            "PYTHONPATH": new_pythonpath,
+        })
+        # El servidor reporta sus métricas (SQLite) con la misma configuración del agente
+        env.update({name: os.environ[name] for name in METRICS_ENV_VARS if name in os.environ})
+
         return StdioServerParameters(
             command=python_executable,
             args=[mcp_server_path],
-            env={
-                "MCP_DB_PATH": db_path_abs,
-                "MCP_CONTEXT": context,
-                "PYTHONPATH": new_pythonpath,
-            }
+            env=env
         )
 
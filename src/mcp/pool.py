@@ -0,0 +1,233 @@
+"""Pool persistente de sesiones MCP reutilizables entre preguntas."""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from src.mcp.client import MCPClient
+from src.mcp.factory import MCPServerFactory
+
+
+class PooledSession:
+    """
+    Sesión MCP conectada que el pool mantiene viva entre preguntas.
+
+    La conexión se abre y se cierra dentro de una única tarea dedicada, ya que
+    los context managers de ``stdio_client`` deben salir en la misma tarea en
+    la que entraron.
+    """
+
+    def __init__(self, key: Tuple[str, str], server_params, max_concurrency: int):
+        self.key = key
+        # El límite es por llamada a herramienta: una pregunta que espera al modelo no ocupa lugar
+        self.client = MCPClient(server_params, max_concurrent_calls=max_concurrency)
+        self.tools = None
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.last_health_check = self.last_used
+        self.closed = False
+        self._ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        """Lanza la tarea que conecta y mantiene viva la sesión."""
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            async with self.client:
+                self.tools = await self.client.get_available_tools()
+                self._ready.set_result(None)
+                await self._stop.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+        finally:
+            self.closed = True
+            if not self._ready.done():
+                self._ready.set_exception(RuntimeError("Sesión MCP cerrada antes de estar lista."))
+
+    async def wait_ready(self):
+        """Espera a que la sesión termine el handshake MCP."""
+        await asyncio.shield(self._ready)
+
+    async def ping(self, timeout: float) -> bool:
+        """Verifica que el servidor MCP siga respondiendo."""
+        if self.closed or not self.client.session:
+            return False
+        try:
+            await asyncio.wait_for(self.client.session.send_ping(), timeout)
+        except Exception:
+            return False
+        self.last_health_check = time.monotonic()
+        return True
+
+    async def close(self, timeout: float = 5.0):
+        """Cierra la sesión y termina el subproceso del servidor."""
+        self._stop.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except Exception:
+                self._task.cancel()
+
+
+class MCPClientPool:
+    """
+    Pool de sesiones MCP indexadas por base de datos y contexto.
+
+    Cada pregunta reutiliza un servidor ya iniciado en lugar de lanzar un
+    intérprete nuevo y repetir el handshake MCP. El pool limita el número de
+    sesiones abiertas, cierra las que quedan inactivas, verifica su salud
+    periódicamente y controla cuántas llamadas concurrentes recibe cada una.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, idle_timeout: Optional[float] = None,
+                 max_concurrency: Optional[int] = None,
+                 health_check_interval: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("MCP_POOL_MAX_SIZE", "8"))
+        self.idle_timeout = idle_timeout or float(os.getenv("MCP_POOL_IDLE_TIMEOUT", "600"))
+        self.max_concurrency = max_concurrency or int(os.getenv("MCP_POOL_SESSION_CONCURRENCY", "4"))
+        self.health_check_interval = health_check_interval or float(
+            os.getenv("MCP_POOL_HEALTH_CHECK_INTERVAL", "30")
+        )
+        self._sessions = OrderedDict()
+        self._cond = None
+        self._reaper = None
+        # Cierres de sesiones desalojadas en curso (referencia para que no se recolecten)
+        self._closing = set()
+
+    @staticmethod
+    def make_key(db_path: str, context: str) -> Tuple[str, str]:
+        """Construye la clave del pool a partir de la base de datos y el contexto."""
+        context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+        return os.path.abspath(db_path), context_hash
+
+    @asynccontextmanager
+    async def acquire(self, db_path: str, context: str):
+        """
+        Obtiene una sesión conectada para la base de datos y contexto dados.
+
+        Args:
+            db_path: Ruta a la base de datos SQLite
+            context: Contexto de la empresa
+
+        Yields:
+            PooledSession: Sesión lista, con ``client`` y ``tools`` disponibles
+        """
+        session = await self._get_session(db_path, context)
+        try:
+            yield session
+        finally:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def _get_session(self, db_path: str, context: str) -> PooledSession:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        self._ensure_reaper()
+        key = self.make_key(db_path, context)
+
+        for attempt in range(2):
+            async with self._cond:
+                session = self._sessions.get(key)
+                if session is None or session.closed:
+                    if session is not None:
+                        del self._sessions[key]
+                    while len(self._sessions) >= self.max_size:
+                        victim = self._pop_lru_idle()
+                        if victim:
+                            self._close_in_background(victim)
+                        else:
+                            await self._cond.wait()
+                    session = self._sessions.get(key)
+                    if session is None:
+                        server_params = MCPServerFactory.create_server(db_path, context)
+                        session = PooledSession(key, server_params, self.max_concurrency)
+                        self._sessions[key] = session
+                        session.start()
+                self._sessions.move_to_end(key)
+                # Reservar la sesión para que no sea desalojada mientras se espera
+                session.in_use += 1
+
+            try:
+                await session.wait_ready()
+            except Exception:
+                session.in_use -= 1
+                await self._discard(session)
+                raise
+
+            due = time.monotonic() - session.last_health_check >= self.health_check_interval
+            if not due or await session.ping(timeout=5.0):
+                return session
+
+            session.in_use -= 1
+            await self._discard(session)
+
+        raise RuntimeError("No se pudo obtener una sesión MCP saludable.")
+
+    def _pop_lru_idle(self) -> Optional[PooledSession]:
+        for key, session in self._sessions.items():
+            if session.in_use == 0:
+                del self._sessions[key]
+                return session
+        return None
+
+    async def _discard(self, session: PooledSession):
+        async with self._cond:
+            if self._sessions.get(session.key) is session:
+                del self._sessions[session.key]
+            self._cond.notify_all()
+        await session.close()
+
+    def _close_in_background(self, session: PooledSession):
+        """Cierra una sesión desalojada sin esperar, conservando la tarea hasta que termine."""
+        task = asyncio.create_task(session.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def _reap_idle(self):
+        """Cierra periódicamente las sesiones inactivas más allá de ``idle_timeout``."""
+        interval = max(1.0, self.idle_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            expired = []
+            async with self._cond:
+                for key, session in list(self._sessions.items()):
+                    if session.in_use == 0 and now - session.last_used >= self.idle_timeout:
+                        del self._sessions[key]
+                        expired.append(session)
+                if expired:
+                    self._cond.notify_all()
+            for session in expired:
+                await session.close()
+
+    async def close(self):
+        """Cierra todas las sesiones del pool."""
+        if self._reaper:
+            self._reaper.cancel()
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        """Retorna el estado actual del pool."""
+        return {
+            "size": len(self._sessions),
+            "max_size": self.max_size,
+            "in_use": sum(session.in_use for session in self._sessions.values()),
+        }
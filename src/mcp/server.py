@@ -1,7 +1,10 @@
 from mcp.server.fastmcp import FastMCP
+import anyio
+import json
 import os
 import sys
 from pathlib import Path
+from typing import Optional
 
 # Ensure project root is in sys.path when launched as a standalone script
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -9,77 +12,228 @@ project_root_str = str(PROJECT_ROOT)
 if project_root_str not in sys.path:
     sys.path.insert(0, project_root_str)
 
-from src.database import get_database_connection, get_database_schema, format_schema
+from src.database import (
+    get_connection_pool, get_cached_schema, get_database_fingerprint,
+    apply_heap_limit, query_budget, QueryBudgetExceeded,
+    stream_query, format_query_result, format_schema
+)
+from src.schema_index import get_schema_index, select_relevant_schema
+from src.query_plan import preflight_query, format_preflight_hint, run_analyze
+from src.cache import LRUCache, normalize_sql, is_cacheable_sql
+from src.columnar import ColumnarCollector, format_summary
+from src.metrics import record_event, span
 
-# Estado del servidor (db_path y context se pasan como variables de entorno o argumentos)
-mcp = FastMCP("Text-to-SQL-Agent")
+# Caché de resultados de execute_sql para consultas repetidas
+_sql_result_cache = LRUCache(
+    max_entries=int(os.getenv("MCP_SQL_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("MCP_SQL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+)
 
-@mcp.tool()
-def get_database_schema_tool() -> str:
-    """Obtiene el esquema completo de la base de datos SQLite.
-    Usa esta herramienta cuando necesites entender la estructura de las tablas,
-    columnas, relaciones y tipos de datos disponibles en la base de datos.
-    Returns:
-        str: Esquema formateado de la base de datos
-    """
-    db_path = os.getenv("MCP_DB_PATH", "data/test_database.db")
-    
+
+def _database_schema(db_path: str) -> str:
     try:
-        connection = get_database_connection(db_path)
-        schema = get_database_schema(connection)
-        schema_str = format_schema(schema)
-        connection.close()
+        _, schema_str = get_cached_schema(db_path)
         return schema_str
     except Exception as e:
         return f"Error obteniendo esquema: {str(e)}"
 
 
-@mcp.tool()
-def execute_sql(query: str) -> str:
-    """Ejecuta una consulta SQL en la base de datos y retorna los resultados.
-    Usa esta herramienta cuando necesites obtener datos específicos de la base de datos.
-    Asegúrate de que la consulta SQL sea válida para SQLite.
-    Args:
-        query: Consulta SQL a ejecutar (debe ser válida para SQLite)
-    Returns:
-        str: Resultados de la consulta en formato legible, o mensaje de error
+def _relevant_schema(db_path: str, question: str, top_k: int) -> str:
+    try:
+        schema, _ = get_cached_schema(db_path)
+        identity, _ = get_database_fingerprint(db_path)
+        index = get_schema_index(identity, schema, db_path)
+        tables = index.search(question, top_k=top_k)
+        header = (
+            f"Tablas seleccionadas por relevancia: {len(tables)} de {len(schema)} "
+            "(usa get_database_schema_tool si necesitas ver todas)\n\n"
+        )
+        return header + format_schema(select_relevant_schema(schema, tables))
+    except Exception as e:
+        return f"Error obteniendo esquema relevante: {str(e)}"
+
+
+def _stream_columnar(connection, query: str, always: bool) -> dict:
     """
-    db_path = os.getenv("MCP_DB_PATH", "data/test_database.db")
+    ``stream_query`` que además acumula el resultado completo por columnas.
+    
+    Con ``always`` en False (MCP_RESULT_FORMAT=auto) el colector se crea recién
+    cuando el resultado se trunca; los lotes anteriores ya caben en la respuesta,
+    así que guardarlos mientras tanto no cuesta más memoria que el resultado.
+    El recorrido se detiene en MCP_RESULTS_MAX_ROWS filas.
+    """
+    collector = None
+    pending = []
+    
+    def on_batch(columns, batch, truncated):
+        nonlocal collector
+        if collector is None:
+            if not (always or truncated):
+                pending.append(batch)
+                return
+            collector = ColumnarCollector(columns)
+            for pending_batch in pending:
+                collector.add_batch(pending_batch)
+            pending.clear()
+        collector.add_batch(batch)
+    
+    try:
+        result = stream_query(
+            connection, query, count_limit=int(os.getenv("MCP_RESULTS_MAX_ROWS", "1000000")),
+            on_batch=on_batch
+        )
+    except BaseException:
+        if collector is not None:
+            collector.discard()
+        raise
+    return {**result, "collector": collector}
+
+
+def _execute_sql(db_path: str, query: str) -> str:
+    preflight_mode = os.getenv("MCP_SQL_PREFLIGHT", "off")
+    result_format = os.getenv("MCP_RESULT_FORMAT", "text")
+    # summary: siempre resumen columnar; auto: solo si el resultado no cabe completo
+    columnar = result_format in ("summary", "auto")
     
     try:
-        connection = get_database_connection(db_path)
-        cursor = connection.cursor()
-        cursor.execute(query)
-        results = cursor.fetchall()
+        report = None
+        schema = get_cached_schema(db_path)[0] if preflight_mode != "off" else None
+        if schema is not None and os.getenv("MCP_PREFLIGHT_ANALYZE", "0") == "1":
+            run_analyze(db_path)
         
-        # Obtener nombres de columnas
-        try:
-            column_names = [description[0] for description in cursor.description]
-            formatted_results = []
-            for row in results:
-                formatted_results.append(dict(zip(column_names, row)))
-            results_str = str(formatted_results)
-        except:
-            results_str = str(results)
+        normalized_query = normalize_sql(query)
+        pool = get_connection_pool(db_path)
+        with pool.connection() as connection:
+            # La clave incluye la firma del archivo y la generación de data_version del pool
+            cache_key = None
+            # Los resúmenes apuntan a un archivo que puede borrarse: no se cachean
+            if is_cacheable_sql(normalized_query) and result_format != "summary":
+                identity, signature = get_database_fingerprint(db_path)
+                cache_key = (normalized_query, result_format, identity, signature, pool.data_generation)
+                cached = _sql_result_cache.get(cache_key)
+                record_event("sqlite.sql_cache", "miss" if cached is None else "hit")
+                if cached is not None:
+                    return cached
+            
+            if schema is not None:
+                with span("sqlite.preflight"):
+                    report = preflight_query(connection, query, schema)
+                if preflight_mode == "block" and report and report["blocking"]:
+                    return format_preflight_hint(report, blocked=True)
+            collector = None
+            with query_budget(connection):
+                if columnar:
+                    result = _stream_columnar(connection, query, result_format == "summary")
+                    collector = result.pop("collector")
+                else:
+                    result = stream_query(connection, query)
         
-        connection.close()
-        return results_str if results_str else "No se encontraron resultados."
+        if collector is not None:
+            try:
+                collector.close()
+                results_str = format_summary(result, collector)
+            except BaseException:
+                # Sin resumen nadie referencia el archivo: no dejarlo en el directorio
+                collector.discard()
+                raise
+        else:
+            results_str = format_query_result(
+                result, "json" if result_format == "json" else "text",
+                preflight=report if report and report["issues"] else None
+            )
+        if report and report["issues"] and (collector is not None or result_format != "json"):
+            results_str += "\n\n" + format_preflight_hint(report)
+        if cache_key is not None and collector is None:
+            _sql_result_cache.set(cache_key, results_str, len(results_str.encode("utf-8")))
+        return results_str
+    except QueryBudgetExceeded as e:
+        return "Error ejecutando SQL: " + json.dumps(e.to_dict(), ensure_ascii=False)
     except Exception as e:
         return f"Error ejecutando SQL: {str(e)}"
 
 
-@mcp.tool()
-def get_context() -> str:
-    """Obtiene el contexto general de la empresa/información disponible.
-    Usa esta herramienta cuando la pregunta sea sobre información general
-    de la empresa o negocio que no requiere consultar datos específicos de la base de datos.
-    Returns:
-        str: Contexto de la empresa
+def build_server(db_path: Optional[str] = None, context: Optional[str] = None,
+                 log_level: Optional[str] = None) -> FastMCP:
     """
-    context = os.getenv("MCP_CONTEXT", "No hay contexto disponible.")
-    return context
+    Crea el servidor FastMCP con las herramientas del agente.
+    
+    Sin argumentos, la base de datos y el contexto se leen de MCP_DB_PATH y
+    MCP_CONTEXT (servidor lanzado como subproceso stdio). El transporte en
+    memoria crea un servidor por base de datos y contexto dentro del proceso
+    del agente, así que los recibe como argumentos.
+    
+    Las herramientas hacen I/O bloqueante (SQLite), por lo que se ejecutan en
+    hilos con ``anyio.to_thread`` y no detienen el bucle de eventos: llamadas
+    concurrentes (esquema, contexto, SQL) se atienden en paralelo.
+    
+    FastMCP configura el logging del proceso con ``log_level`` (por defecto
+    MCP_LOG_LEVEL); en WARNING no se registra cada llamada a una herramienta,
+    lo que en el transporte en memoria saldría por el stderr del agente.
+    """
+    server = FastMCP("Text-to-SQL-Agent", log_level=log_level or os.getenv("MCP_LOG_LEVEL", "WARNING"))
+    
+    def current_db_path() -> str:
+        return db_path or os.getenv("MCP_DB_PATH", "data/test_database.db")
+    
+    @server.tool()
+    async def get_database_schema_tool() -> str:
+        """Obtiene el esquema completo de la base de datos SQLite.
+        Usa esta herramienta cuando necesites entender la estructura de las tablas,
+        columnas, relaciones y tipos de datos disponibles en la base de datos.
+        Returns:
+            str: Esquema formateado de la base de datos
+        """
+        return await anyio.to_thread.run_sync(_database_schema, current_db_path())
+    
+    @server.tool()
+    async def get_relevant_schema_tool(question: str, top_k: int = 5) -> str:
+        """Obtiene solo las tablas de la base de datos relevantes para una pregunta.
+        Usa esta herramienta en lugar de get_database_schema_tool cuando la base de datos
+        tenga muchas tablas: retorna las tablas más relacionadas con la pregunta y las
+        tablas conectadas a ellas por foreign keys, con el mismo formato que el esquema completo.
+        Args:
+            question: Pregunta del usuario en lenguaje natural
+            top_k: Cantidad de tablas más relevantes a incluir (además de sus vecinas)
+        Returns:
+            str: Esquema formateado de las tablas relevantes
+        """
+        return await anyio.to_thread.run_sync(
+            _relevant_schema, current_db_path(), question, top_k
+        )
+    
+    @server.tool()
+    async def execute_sql(query: str) -> str:
+        """Ejecuta una consulta SQL en la base de datos y retorna los resultados.
+        Usa esta herramienta cuando necesites obtener datos específicos de la base de datos.
+        Asegúrate de que la consulta SQL sea válida para SQLite.
+        Args:
+            query: Consulta SQL a ejecutar (debe ser válida para SQLite)
+        Returns:
+            str: Resultados de la consulta en formato legible, o mensaje de error
+        """
+        return await anyio.to_thread.run_sync(_execute_sql, current_db_path(), query)
+    
+    @server.tool()
+    def get_context() -> str:
+        """Obtiene el contexto general de la empresa/información disponible.
+        Usa esta herramienta cuando la pregunta sea sobre información general
+        de la empresa o negocio que no requiere consultar datos específicos de la base de datos.
+        Returns:
+            str: Contexto de la empresa
+        """
+        if context is not None:
+            return context
+        return os.getenv("MCP_CONTEXT", "No hay contexto disponible.")
+    
+    return server
+
+
+# Servidor stdio (db_path y context se pasan como variables de entorno)
+mcp = build_server()
 
 
 if __name__ == "__main__":
+    # Límite de memoria de todo el proceso: solo en el subproceso, no en el servidor en memoria
+    apply_heap_limit()
     mcp.run(transport="stdio")
 
@@ -0,0 +1,267 @@
+"""Medición por etapa del agente: tiempos, tokens de Bedrock, métricas Prometheus y trazas.
+
+Todo queda desactivado por defecto: con METRICS_ENABLED=0, ``span`` retorna un
+objeto compartido que no hace nada, así que instrumentar una función cuesta
+solo una comparación.
+
+Con METRICS_ENABLED=1 cada etapa (conexión MCP, listado y llamada de
+herramientas, llamadas a Bedrock, consultas SQLite) acumula duraciones en el
+proceso y, si están instalados, también en:
+
+- ``prometheus_client``: histogramas y contadores para ``/metrics`` (con
+  PROMETHEUS_MULTIPROC_DIR se suman los del servidor MCP, que corre en otro proceso)
+- ``opentelemetry``: un span por etapa, con OTEL_ENABLED=1
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+# Variables que el servidor MCP necesita para reportar sus propias métricas
+METRICS_ENV_VARS = (
+    "METRICS_ENABLED", "PROMETHEUS_MULTIPROC_DIR", "OTEL_ENABLED",
+    "OTEL_SERVICE_NAME", "OTEL_EXPORTER_OTLP_ENDPOINT",
+)
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+_stage_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+_stage_stats_lock = threading.Lock()
+
+# Funciones que retornan estadísticas existentes (pool, cachés, admisión) para /metrics
+_stats_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+_stage_histogram = None
+_error_counter = None
+_token_counter = None
+_event_counter = None
+_tracer = None
+
+if ENABLED and prometheus_client is not None:
+    _stage_histogram = prometheus_client.Histogram(
+        "text_to_sql_stage_duration_seconds",
+        "Duración de cada etapa del agente",
+        ["stage", "name"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    )
+    _error_counter = prometheus_client.Counter(
+        "text_to_sql_stage_errors_total",
+        "Etapas del agente que terminaron con una excepción",
+        ["stage", "name"]
+    )
+    _token_counter = prometheus_client.Counter(
+        "text_to_sql_bedrock_tokens_total",
+        "Tokens de Bedrock según el campo usage de la respuesta",
+        ["model", "direction"]
+    )
+    _event_counter = prometheus_client.Counter(
+        "text_to_sql_events_total",
+        "Eventos contados por el agente y el servidor MCP (aciertos de caché, presupuestos superados)",
+        ["event", "name"]
+    )
+
+if ENABLED and os.getenv("OTEL_ENABLED", "0") == "1":
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        trace = None
+    if trace is not None:
+        try:
+            # Si el SDK y el exportador OTLP están instalados, exportar por OTLP
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            provider = TracerProvider(resource=Resource.create({
+                "service.name": os.getenv("OTEL_SERVICE_NAME", "text-to-sql-agent")
+            }))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+        except ImportError:
+            pass
+        _tracer = trace.get_tracer("text-to-sql-agent")
+
+
+class _NoopSpan:
+    """Span que no mide nada; se usa cuando las métricas están desactivadas."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Mide una etapa: duración, errores y atributos (por ejemplo, tokens)."""
+
+    def __init__(self, stage: str, name: str, attributes: Dict[str, Any]):
+        self.stage = stage
+        self.name = name
+        self.attributes = attributes
+        self._start = 0.0
+        self._otel_context = None
+        self._otel_span = None
+
+    def __enter__(self):
+        if _tracer is not None:
+            attributes = {key: value for key, value in self.attributes.items() if value is not None}
+            if self.name:
+                attributes["name"] = self.name
+            self._otel_context = _tracer.start_as_current_span(self.stage, attributes=attributes)
+            self._otel_span = self._otel_context.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self._start
+        failed = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        key = (self.stage, self.name)
+        with _stage_stats_lock:
+            stats = _stage_stats.setdefault(
+                key, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        if _stage_histogram is not None:
+            _stage_histogram.labels(self.stage, self.name).observe(elapsed)
+            if failed:
+                _error_counter.labels(self.stage, self.name).inc()
+        if self._otel_context is not None:
+            self._otel_context.__exit__(exc_type, exc_val, exc_tb)
+        return False
+
+    def set(self, key: str, value: Any):
+        """Agrega un atributo al span (visible en la traza de OpenTelemetry)."""
+        self.attributes[key] = value
+        if self._otel_span is not None and value is not None:
+            self._otel_span.set_attribute(key, value)
+
+
+def span(stage: str, name: str = "", **attributes):
+    """
+    Context manager que mide una etapa del agente.
+
+    Args:
+        stage: Etapa (por ejemplo "mcp.call_tool" o "bedrock.converse")
+        name: Detalle de cardinalidad baja (nombre de la herramienta, modelo)
+        **attributes: Atributos adicionales para la traza
+    """
+    if not ENABLED:
+        return _NOOP_SPAN
+    return Span(stage, name, attributes)
+
+
+def record_token_usage(model_id: str, usage: Optional[Dict[str, int]], current_span=None):
+    """Registra los tokens de entrada y salida del campo ``usage`` de una respuesta de Bedrock."""
+    if not ENABLED or not usage:
+        return
+    input_tokens = usage.get("inputTokens", 0)
+    output_tokens = usage.get("outputTokens", 0)
+    if current_span is not None:
+        current_span.set("input_tokens", input_tokens)
+        current_span.set("output_tokens", output_tokens)
+    with _stage_stats_lock:
+        stats = _stage_stats.setdefault(("bedrock.tokens", model_id), {"input": 0, "output": 0})
+        stats["input"] += input_tokens
+        stats["output"] += output_tokens
+    if _token_counter is not None:
+        _token_counter.labels(model_id, "input").inc(input_tokens)
+        _token_counter.labels(model_id, "output").inc(output_tokens)
+
+
+def record_event(event: str, name: str = "", amount: int = 1):
+    """
+    Cuenta un evento (por ejemplo un acierto de caché) en el proceso y en Prometheus.
+
+    Sirve para contadores del servidor MCP: con PROMETHEUS_MULTIPROC_DIR el
+    agente los publica en ``/metrics`` aunque se cuenten en otro proceso.
+    """
+    if not ENABLED:
+        return
+    with _stage_stats_lock:
+        stats = _stage_stats.setdefault((event, name), {"count": 0})
+        stats["count"] += amount
+    if _event_counter is not None:
+        _event_counter.labels(event, name).inc(amount)
+
+
+def get_stage_stats() -> Dict[str, Dict[str, float]]:
+    """Retorna las estadísticas acumuladas en este proceso por etapa (y detalle)."""
+    with _stage_stats_lock:
+        return {
+            f"{stage}[{name}]" if name else stage: dict(stats)
+            for (stage, name), stats in _stage_stats.items()
+        }
+
+
+def register_stats_source(name: str, source: Callable[[], Dict[str, Any]]):
+    """
+    Publica en ``/metrics`` las estadísticas numéricas que retorna ``source``
+    (por ejemplo ``get_mcp_pool().stats``) como gauges ``text_to_sql_<name>_<clave>``.
+    """
+    _stats_sources[name] = source
+
+
+def _flatten(prefix: str, values: Dict[str, Any]):
+    for key, value in values.items():
+        metric = f"{prefix}_{key}".replace(".", "_").replace("-", "_")
+        if isinstance(value, dict):
+            yield from _flatten(metric, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield metric, value
+
+
+class _StatsCollector:
+    """Colector de Prometheus que lee las fuentes registradas en cada scrape."""
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        for name, source in list(_stats_sources.items()):
+            try:
+                values = source()
+            except Exception:
+                continue
+            for metric, value in _flatten(f"text_to_sql_{name}", values):
+                yield GaugeMetricFamily(metric, f"Estadística {metric}", value=value)
+
+
+def prometheus_exposition() -> Tuple[bytes, str]:
+    """
+    Genera el texto de ``/metrics``.
+
+    Returns:
+        tuple: (contenido, content type)
+
+    Raises:
+        RuntimeError: Si ``prometheus_client`` no está instalado
+    """
+    if prometheus_client is None:
+        raise RuntimeError("Instala prometheus_client para exponer /metrics.")
+    registry = prometheus_client.CollectorRegistry()
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Métricas de todos los procesos (agente y servidores MCP)
+        from prometheus_client import multiprocess
+
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        for collector in (_stage_histogram, _error_counter, _token_counter, _event_counter):
+            if collector is not None:
+                registry.register(collector)
+    registry.register(_StatsCollector())
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,238 @@
+"""Revisión previa de consultas con EXPLAIN QUERY PLAN y sugerencia de índices."""
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Palabras que pueden seguir al nombre de una tabla y no son un alias
+_SQL_KEYWORDS = {
+    "where", "on", "using", "join", "left", "right", "inner", "outer", "cross", "natural",
+    "full", "group", "order", "limit", "having", "union", "except", "intersect", "window",
+    "as", "select", "from", "and", "or", "set", "values",
+}
+
+_SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$")
+_TEMP_BTREE_PATTERN = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+_AGGREGATE_PATTERN = re.compile(
+    r"\b(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(|\bGROUP\s+BY\b", re.IGNORECASE
+)
+_TABLE_REF_PATTERN = re.compile(
+    r"(?:\bFROM|\bJOIN|,)\s+\"?([A-Za-z_]\w*)\"?(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?",
+    re.IGNORECASE
+)
+
+# Bases de datos en las que ya se ejecutó ANALYZE en este proceso
+_analyzed = set()
+_analyzed_lock = threading.Lock()
+
+
+def explain_query_plan(connection, query: str) -> List[Tuple[int, int, str]]:
+    """Retorna el plan de la consulta como (id, parent, detalle)."""
+    rows = connection.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+    return [(row[0], row[1], row[-1]) for row in rows]
+
+
+def run_analyze(db_path: str) -> bool:
+    """
+    Ejecuta ANALYZE (con ``analysis_limit``) una vez por base de datos para poblar sqlite_stat1.
+
+    Requiere abrir la base de datos en modo escritura, por lo que solo se usa si
+    MCP_PREFLIGHT_ANALYZE=1. Retorna False si no se pudo ejecutar.
+    """
+    key = os.path.realpath(db_path)
+    with _analyzed_lock:
+        if key in _analyzed:
+            return True
+        _analyzed.add(key)
+    try:
+        connection = sqlite3.connect(db_path)
+        try:
+            connection.execute("PRAGMA analysis_limit = 1000")
+            connection.execute("ANALYZE")
+            connection.commit()
+        finally:
+            connection.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def get_table_row_estimates(connection, tables: List[str]) -> Dict[str, int]:
+    """
+    Estima las filas de cada tabla con sqlite_stat1 o, si no hay estadísticas,
+    con ``max(rowid)`` (una búsqueda en el índice, sin recorrer la tabla).
+    """
+    estimates = {}
+    try:
+        for table, stat in connection.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            rows = int(str(stat).split()[0])
+            estimates[table] = max(estimates.get(table, 0), rows)
+    except (sqlite3.Error, ValueError, IndexError):
+        pass
+    for table in tables:
+        if table in estimates:
+            continue
+        try:
+            quoted = '"' + table.replace('"', '""') + '"'
+            estimates[table] = connection.execute(f"SELECT max(rowid) FROM {quoted}").fetchone()[0] or 0
+        except sqlite3.Error:
+            estimates[table] = 0
+    return estimates
+
+
+def _table_aliases(query: str, schema: Dict[str, Dict]) -> Dict[str, str]:
+    """Relaciona alias y nombres usados en la consulta con las tablas del esquema."""
+    aliases = {}
+    for table, alias in _TABLE_REF_PATTERN.findall(query):
+        if table not in schema:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _suggest_index(query: str, table: str, names: List[str], single_table: bool,
+                   table_info: Dict) -> Optional[str]:
+    """Sugiere un índice con las columnas de la tabla usadas en filtros, JOIN u ORDER BY."""
+    indexed = {idx["columns"][0] for idx in table_info["indexes"] if idx["columns"]}
+    indexed.update(table_info["primary_keys"][:1])
+    qualifier = "|".join(re.escape(name) for name in names)
+    prefix = rf"(?:\b(?:{qualifier})\.)" + ("?" if single_table else "")
+    candidates = []
+    for column in table_info["columns"]:
+        name = column["name"]
+        if name in indexed:
+            continue
+        predicate = rf"{prefix}\b{re.escape(name)}\b\s*(?:=|<|>|!=|\bIN\b|\bLIKE\b|\bBETWEEN\b|\bIS\b)"
+        reversed_predicate = rf"(?:=|<|>)\s*{prefix}\b{re.escape(name)}\b"
+        order_by = rf"\bORDER\s+BY\s+{prefix}\b{re.escape(name)}\b"
+        for pattern in (predicate, reversed_predicate, order_by):
+            match = re.search(pattern, query, re.IGNORECASE)
+            if match:
+                candidates.append((match.start(), name))
+                break
+    if not candidates:
+        return None
+    columns = [name for _, name in sorted(candidates)][:2]
+    return f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+def preflight_query(connection, query: str, schema: Dict[str, Dict],
+                    large_table_rows: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Revisa el plan de una consulta antes de ejecutarla.
+
+    Detecta recorridos completos (SCAN) sobre tablas grandes y
+    ordenamientos con B-tree temporal, estima las filas recorridas
+    multiplicando las de los recorridos anidados y sugiere índices a partir de
+    las columnas filtradas, cruzadas u ordenadas que no tienen índice.
+
+    No se reportan los recorridos con índice cubriente ni el único recorrido
+    que necesita una agregación (COUNT, GROUP BY...) cuando no hay índice que
+    sugerir. Solo los recorridos de tablas grandes repetidos por cada fila de
+    otro recorrido (productos cartesianos, JOIN sin índice, subconsultas
+    correlacionadas) se reportan además en ``blocking``.
+
+    Args:
+        connection: Conexión SQLite
+        query: Consulta SQL generada por el modelo
+        schema: Esquema de ``get_database_schema`` (usado para índices existentes)
+        large_table_rows: Filas a partir de las cuales una tabla se considera grande
+            (MCP_PREFLIGHT_LARGE_TABLE_ROWS)
+
+    Returns:
+        dict: plan, issues, blocking, estimated_rows y suggested_indexes, o None
+        si la consulta no se puede analizar (el error se verá al ejecutarla)
+    """
+    if large_table_rows is None:
+        large_table_rows = int(os.getenv("MCP_PREFLIGHT_LARGE_TABLE_ROWS", "10000"))
+    try:
+        plan = explain_query_plan(connection, query)
+    except sqlite3.Error:
+        return None
+
+    aliases = _table_aliases(query, schema)
+    scans = []
+    temp_btrees = []
+    # Bucles (SCAN/SEARCH) ya vistos bajo cada nodo: los siguientes se repiten por cada fila
+    loops = {}
+    correlated = set()
+    for node_id, parent, detail in plan:
+        if detail.startswith("CORRELATED "):
+            correlated.add(node_id)
+            continue
+        scan = _SCAN_PATTERN.match(detail)
+        if scan or detail.startswith("SEARCH "):
+            nested = loops.get(parent, 0) > 0 or parent in correlated
+            loops[parent] = loops.get(parent, 0) + 1
+            if scan:
+                name, alias, rest = scan.groups()
+                table = aliases.get(alias or name, name)
+                if table in schema:
+                    scans.append((table, "COVERING INDEX" in rest, nested))
+            continue
+        temp = _TEMP_BTREE_PATTERN.search(detail)
+        if temp:
+            temp_btrees.append(temp.group(1))
+
+    estimates = get_table_row_estimates(connection, sorted({table for table, _, _ in scans}))
+    estimated_rows = 1
+    for table, _, _ in scans:
+        estimated_rows *= max(estimates.get(table, 0), 1)
+
+    issues = []
+    blocking = []
+    suggested_indexes = []
+    single_table = len(set(aliases.values())) <= 1
+    aggregate = bool(_AGGREGATE_PATTERN.search(query))
+    large_scans = [(table, covering, nested) for table, covering, nested in scans
+                   if estimates.get(table, 0) >= large_table_rows]
+    for table, covering, nested in dict.fromkeys(large_scans):
+        rows = estimates[table]
+        names = [name for name, target in aliases.items() if target == table] or [table]
+        suggestion = _suggest_index(query, table, names, single_table, schema[table])
+        if nested:
+            issue = (
+                f"Recorrido completo de la tabla {table} (~{rows} filas) repetido por cada fila "
+                f"de otro recorrido: ~{estimated_rows} combinaciones de filas "
+                "(posible producto cartesiano, JOIN sin condición o subconsulta correlacionada)."
+            )
+            blocking.append(issue)
+        elif covering or (aggregate and suggestion is None):
+            continue
+        else:
+            issue = f"Recorrido completo de la tabla {table} (~{rows} filas) sin usar índice."
+        issues.append(issue)
+        if suggestion and suggestion not in suggested_indexes:
+            suggested_indexes.append(suggestion)
+    sorts = [temp for temp in temp_btrees if temp != "GROUP BY"]
+    if sorts and estimated_rows >= large_table_rows:
+        issues.append(
+            "Ordenamiento con B-tree temporal para " + ", ".join(sorts) +
+            f" sobre ~{estimated_rows} filas."
+        )
+
+    return {
+        "plan": [detail for _, _, detail in plan],
+        "issues": issues,
+        "blocking": blocking,
+        "estimated_rows": estimated_rows,
+        "suggested_indexes": suggested_indexes,
+    }
+
+
+def format_preflight_hint(report: Dict[str, Any], blocked: bool = False) -> str:
+    """Formatea el resultado de ``preflight_query`` como sugerencia para el modelo."""
+    lines = [
+        "ADVERTENCIA DE RENDIMIENTO: la consulta no se ejecutó. Reescríbela para evitar estos problemas:"
+        if blocked else
+        "ADVERTENCIA DE RENDIMIENTO (la consulta se ejecutó, pero puede ser lenta):"
+    ]
+    lines += [f"  • {issue}" for issue in report["issues"]]
+    if report["suggested_indexes"]:
+        lines.append("Índices sugeridos:")
+        lines += [f"  • {index}" for index in report["suggested_indexes"]]
+    lines.append("Plan: " + " | ".join(report["plan"]))
+    return "\n".join(lines)
@@ -0,0 +1,217 @@
+"""Bucle de eventos compartido en segundo plano para el agente.
+
+Las sesiones MCP del pool viven atadas a un bucle de eventos, por lo que todas
+las consultas deben ejecutarse en el mismo bucle en lugar de crear uno nuevo
+con ``asyncio.run`` por cada pregunta.
+
+También incluye el control de admisión que limita cuántas preguntas procesa el
+proceso a la vez y rechaza de inmediato las que no caben en la cola.
+"""
+import asyncio
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+_admission: Optional["AdmissionController"] = None
+_admission_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Retorna el bucle de eventos compartido, iniciándolo si es necesario."""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed() or not (_thread and _thread.is_alive()):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name="agent-event-loop",
+                daemon=True
+            )
+            thread.start()
+            _loop, _thread = loop, thread
+        return _loop
+
+
+def run_coroutine(coro, timeout: Optional[float] = None):
+    """
+    Ejecuta una corrutina en el bucle compartido y espera su resultado.
+
+    Args:
+        coro: Corrutina a ejecutar
+        timeout: Tiempo máximo de espera en segundos (None = sin límite)
+
+    Returns:
+        El resultado de la corrutina
+
+    Raises:
+        RuntimeError: Si se llama desde el propio hilo del bucle compartido
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("run_coroutine no puede llamarse desde el bucle compartido.")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return future.result(timeout)
+
+
+async def run_in_shared_loop(coro):
+    """
+    Espera desde otro bucle de eventos (por ejemplo, el del servidor HTTP) una
+    corrutina que se ejecuta en el bucle compartido.
+
+    Si quien espera se cancela, la corrutina también se cancela en el bucle compartido.
+    """
+    loop = get_event_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def iterate_async(agen):
+    """
+    Recorre un generador asíncrono en el bucle compartido desde un hilo síncrono.
+
+    Cada elemento se entrega en cuanto el generador lo produce. Si el consumidor
+    deja de iterar antes de tiempo, el generador se cancela en el bucle para
+    liberar sus recursos (por ejemplo, la sesión MCP del pool).
+
+    Args:
+        agen: Generador asíncrono a recorrer
+
+    Yields:
+        Los elementos del generador, en orden
+
+    Raises:
+        RuntimeError: Si se llama desde el propio hilo del bucle compartido
+    """
+    loop = get_event_loop()
+    if threading.current_thread() is _thread:
+        raise RuntimeError("iterate_async no puede llamarse desde el bucle compartido.")
+    items = queue.Queue()
+    finished = object()
+
+    async def pump():
+        async for item in agen:
+            items.put(item)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), loop)
+    future.add_done_callback(lambda _: items.put(finished))
+    try:
+        while True:
+            item = items.get()
+            if item is finished:
+                break
+            yield item
+        # Propagar la excepción del generador, si la hubo
+        future.result()
+    finally:
+        future.cancel()
+
+
+class SaturatedError(RuntimeError):
+    """El servidor está saturado y rechaza la pregunta (equivalente a HTTP 429)."""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limita las preguntas en curso y la cola de espera del proceso.
+
+    Una pregunta entra si hay menos de ``max_in_flight`` en curso; si no, espera
+    en la cola hasta ``wait_timeout`` segundos. Si la cola ya tiene
+    ``max_waiting`` preguntas, se rechaza de inmediato con ``SaturatedError``
+    en lugar de acumular trabajo que el servidor no alcanzará a atender.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_waiting: Optional[int] = None,
+                 wait_timeout: Optional[float] = None):
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv("AGENT_MAX_IN_FLIGHT", "8"))
+        if max_waiting is None:
+            max_waiting = int(os.getenv("AGENT_MAX_WAITING", "16"))
+        if wait_timeout is None:
+            wait_timeout = float(os.getenv("AGENT_ADMISSION_TIMEOUT", "30"))
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserva un lugar para procesar una pregunta mientras dura el bloque ``with``.
+
+        Raises:
+            SaturatedError: Si la cola está llena o no se liberó un lugar a tiempo
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self):
+        """Reserva un lugar (bloquea mientras espera); ver ``admit``."""
+        with self._condition:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise SaturatedError(
+                        "El servidor está saturado; intenta de nuevo en unos segundos.",
+                        retry_after=1.0
+                    )
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self.in_flight < self.max_in_flight, self.wait_timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    raise SaturatedError(
+                        f"No se liberó capacidad en {self.wait_timeout:g} s; intenta de nuevo más tarde.",
+                        retry_after=self.wait_timeout
+                    )
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self):
+        """Libera un lugar reservado con ``acquire``."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna preguntas en curso, en espera, admitidas y rechazadas."""
+        with self._condition:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+def get_admission_controller() -> AdmissionController:
+    """Retorna el control de admisión del proceso, creándolo si es necesario."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController()
+        return _admission
@@ -0,0 +1,238 @@
+"""Índice de relevancia sobre el esquema para enviar al modelo solo las tablas necesarias."""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.cache import normalize_question
+
+# Palabras frecuentes en las preguntas que no ayudan a elegir tablas
+STOPWORDS = {
+    "a", "al", "cual", "cuales", "cuando", "cuanto", "cuanta", "cuantos", "cuantas", "de",
+    "del", "el", "en", "es", "esta", "este", "hay", "la", "las", "lo", "los", "me", "mas",
+    "muestrame", "o", "para", "por", "que", "quien", "se", "sin", "son", "su", "sus", "un",
+    "una", "y", "dame", "lista", "listar", "todos", "todas", "the", "of", "and", "in", "for",
+    "by", "to", "is", "what", "which", "how", "many", "show", "all",
+}
+
+# Términos de negocio en español y su equivalente habitual en esquemas en inglés
+SYNONYMS = {
+    "orden": ["order"], "pedido": ["order"], "venta": ["order", "sale"], "pago": ["payment"],
+    "envio": ["shipment"], "despacho": ["shipment"], "almacen": ["warehouse"],
+    "bodega": ["warehouse"], "cliente": ["customer"], "empleado": ["employee"],
+    "producto": ["product"], "categoria": ["category"], "inventario": ["inventory"],
+    "existencia": ["inventory", "stock"], "empresa": ["company"], "compania": ["company"],
+    "departamento": ["department"], "soporte": ["support"], "reclamo": ["ticket"],
+    "monto": ["amount", "total"], "importe": ["amount"], "precio": ["price"],
+    "fecha": ["date"], "estado": ["status"], "salario": ["salary"], "sueldo": ["salary"],
+    "pais": ["country"], "cantidad": ["quantity"], "descuento": ["discount"],
+    "metodo": ["method"], "nombre": ["name"], "gerente": ["manager"], "cargo": ["title"],
+    "pendiente": ["pending"], "prioridad": ["priority"], "segmento": ["segment"],
+}
+
+# Peso de los trigramas frente a las palabras completas al puntuar
+TRIGRAM_WEIGHT = 0.3
+
+# Peso de cada parte de la tabla dentro de su documento
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 2
+VALUE_WEIGHT = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Índices construidos por base de datos: identidad -> (esquema, índice)
+_index_cache: Dict[Any, Tuple[Dict, "SchemaIndex"]] = {}
+_index_cache_lock = threading.Lock()
+
+
+def stem(word: str) -> str:
+    """Reduce plurales simples en español e inglés ("órdenes" -> "orden", "companies" -> "company")."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str, expand_synonyms: bool = False) -> List[str]:
+    """
+    Convierte un texto en términos de búsqueda.
+
+    Separa snake_case y camelCase, normaliza tildes, reduce plurales y agrega
+    los trigramas de cada palabra (prefijados con "~") para coincidencias
+    parciales. Con ``expand_synonyms`` agrega el equivalente en inglés de los
+    términos de negocio en español.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text)).replace("_", " ")
+    words = []
+    for word in normalize_question(text).split():
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        word = stem(word)
+        words.append(word)
+        if expand_synonyms:
+            words.extend(_STEMMED_SYNONYMS.get(word, []))
+    terms = list(words)
+    for word in words:
+        padded = f"#{word}#"
+        terms.extend(f"~{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return terms
+
+
+_STEMMED_SYNONYMS = {
+    stem(word): [stem(synonym) for synonym in synonyms] for word, synonyms in SYNONYMS.items()
+}
+
+
+def _table_terms(table_name: str, table_info: Dict) -> List[str]:
+    terms = tokenize(table_name) * TABLE_NAME_WEIGHT
+    for column in table_info["columns"]:
+        terms += tokenize(column["name"]) * COLUMN_NAME_WEIGHT
+    for fk in table_info["foreign_keys"]:
+        terms += tokenize(fk["to_table"])
+    for row in table_info.get("sample_data") or []:
+        for value in row.values():
+            if isinstance(value, str):
+                terms += tokenize(value) * VALUE_WEIGHT
+    return terms
+
+
+class SchemaIndex:
+    """
+    Índice BM25 sobre tablas, columnas y valores de ejemplo del esquema.
+
+    Cada tabla es un documento; la búsqueda retorna las tablas más relevantes
+    para una pregunta junto con sus vecinas por foreign key, para que el modelo
+    pueda escribir los JOIN necesarios.
+    """
+
+    def __init__(self, schema: Dict[str, Dict]):
+        self.tables = list(schema)
+        self.neighbours = {table: set() for table in self.tables}
+        for table_name, table_info in schema.items():
+            for fk in table_info["foreign_keys"]:
+                if fk["to_table"] in self.neighbours and fk["to_table"] != table_name:
+                    self.neighbours[table_name].add(fk["to_table"])
+                    self.neighbours[fk["to_table"]].add(table_name)
+
+        self.term_frequencies = [Counter(_table_terms(t, schema[t])) for t in self.tables]
+        self.lengths = [sum(tf.values()) for tf in self.term_frequencies]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency = Counter()
+        for tf in self.term_frequencies:
+            document_frequency.update(tf.keys())
+        total = len(self.tables)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa el índice para guardarlo como JSON (ver ``save_schema_index``)."""
+        return {
+            "tables": self.tables,
+            "neighbours": {table: sorted(tables) for table, tables in self.neighbours.items()},
+            "term_frequencies": [dict(tf) for tf in self.term_frequencies],
+            "idf": self.idf,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaIndex":
+        """Reconstruye un índice guardado con ``to_dict`` sin volver a tokenizar el esquema."""
+        index = cls.__new__(cls)
+        index.tables = list(data["tables"])
+        index.neighbours = {table: set(tables) for table, tables in data["neighbours"].items()}
+        index.term_frequencies = [Counter(tf) for tf in data["term_frequencies"]]
+        index.lengths = [sum(tf.values()) for tf in index.term_frequencies]
+        index.average_length = (
+            sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        )
+        index.idf = dict(data["idf"])
+        return index
+
+    def score(self, question: str) -> List[Tuple[str, float]]:
+        """Retorna (tabla, puntaje BM25) para las tablas con puntaje positivo, de mayor a menor."""
+        query_terms = Counter(tokenize(question, expand_synonyms=True))
+        scores = []
+        for table, tf, length in zip(self.tables, self.term_frequencies, self.lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.average_length or 1))
+            for term, query_count in query_terms.items():
+                frequency = tf.get(term)
+                if frequency:
+                    weight = TRIGRAM_WEIGHT if term.startswith("~") else 1.0
+                    score += weight * query_count * self.idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((table, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def search(self, question: str, top_k: int = 5, include_neighbours: bool = True) -> List[str]:
+        """
+        Retorna las ``top_k`` tablas más relevantes y, opcionalmente, sus vecinas por FK.
+
+        Si ninguna tabla coincide con la pregunta se retornan todas.
+        """
+        top = [table for table, _ in self.score(question)[:top_k]]
+        if not top:
+            return list(self.tables)
+        selected = list(top)
+        if include_neighbours:
+            for table in top:
+                for neighbour in sorted(self.neighbours[table]):
+                    if neighbour not in selected:
+                        selected.append(neighbour)
+        return selected
+
+
+def index_file(db_path: str) -> str:
+    """Ruta del índice precalculado junto a la base de datos (ver ``save_schema_index``)."""
+    return f"{db_path}.index.json"
+
+
+def save_schema_index(db_path: str, index: SchemaIndex):
+    """Guarda el índice junto a la base de datos para que otros procesos no lo reconstruyan."""
+    path = index_file(db_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _load_schema_index(db_path: str, schema: Dict[str, Dict]) -> Optional[SchemaIndex]:
+    try:
+        with open(index_file(db_path), "r", encoding="utf-8") as f:
+            index = SchemaIndex.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    # Solo sirve si corresponde a las mismas tablas que el esquema actual
+    return index if index.tables == list(schema) else None
+
+
+def get_schema_index(key: Any, schema: Dict[str, Dict], db_path: Optional[str] = None) -> SchemaIndex:
+    """
+    Retorna el índice del esquema para una base de datos, reconstruyéndolo solo si el
+    esquema cambió (es decir, si ``get_cached_schema`` retornó un objeto distinto).
+
+    Con ``db_path`` se usa primero el índice precalculado al ingerir la base de datos.
+    """
+    with _index_cache_lock:
+        cached = _index_cache.get(key)
+        if cached is not None and cached[0] is schema:
+            return cached[1]
+    index = (_load_schema_index(db_path, schema) if db_path else None) or SchemaIndex(schema)
+    with _index_cache_lock:
+        _index_cache[key] = (schema, index)
+    return index
+
+
+def select_relevant_schema(schema: Dict[str, Dict], tables: List[str]) -> Dict[str, Dict]:
+    """Filtra el esquema a las tablas indicadas, en el orden original."""
+    wanted = set(tables)
+    return {name: info for name, info in schema.items() if name in wanted}
@@ -0,0 +1,104 @@
+"""Estado de conversación por sesión para preguntas de seguimiento.
+
+Cada sesión guarda, para un mismo modelo, base de datos y contexto, el
+historial compactado de las preguntas anteriores, el prompt de sistema con el
+esquema ya obtenido y la última SQL ejecutada. Así una pregunta como "¿y por
+país?" se responde con la SQL anterior a la vista, sin volver a pedir el
+esquema ni redescubrir la consulta.
+
+Las sesiones viven en memoria con TTL (SESSION_TTL), un máximo de sesiones
+(SESSION_MAX_ENTRIES) y un máximo de bytes en total (SESSION_MAX_BYTES).
+"""
+import copy
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.cache import LRUCache
+from src.conversation import compact_messages, estimate_tokens
+
+
+def new_session_id() -> str:
+    """Genera un identificador de sesión aleatorio."""
+    return uuid.uuid4().hex
+
+
+def _is_question(message: Dict) -> bool:
+    """Indica si el mensaje es una pregunta del usuario (y no resultados de herramientas)."""
+    return message["role"] == "user" and any("text" in block for block in message["content"])
+
+
+def trim_history(messages: List[Dict], max_tokens: int) -> List[Dict]:
+    """
+    Descarta las preguntas más antiguas (con sus llamadas a herramientas) hasta
+    que el historial quepa en ``max_tokens``. La última pregunta se conserva siempre.
+    """
+    starts = [index for index, message in enumerate(messages) if _is_question(message)]
+    for start in starts:
+        if start == starts[-1] or estimate_tokens(messages[start:]) <= max_tokens:
+            return messages[start:]
+    return messages
+
+
+class SessionStore:
+    """
+    Historial de conversación por sesión, en memoria.
+
+    El historial se guarda compactado (los resultados de herramientas ya vistos
+    se reemplazan o recortan) y limitado a SESSION_HISTORY_MAX_TOKENS tokens.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, history_max_tokens: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("SESSION_MAX_ENTRIES", "500"))
+        if ttl is None:
+            ttl = float(os.getenv("SESSION_TTL", "1800"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+        if history_max_tokens is None:
+            history_max_tokens = int(os.getenv("SESSION_HISTORY_MAX_TOKENS", "8000"))
+        self.history_max_tokens = history_max_tokens
+        self._cache = LRUCache(max_entries, ttl or None, max_bytes or None)
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.max_entries > 0
+
+    def load(self, session_id: str, scope: Tuple) -> Optional[Dict[str, Any]]:
+        """
+        Retorna una copia del estado de la sesión, o None si no existe, venció
+        o pertenece a otro ámbito (otro modelo, base de datos o contexto).
+
+        Returns:
+            dict: messages, system, last_sql y db_signature
+        """
+        if not session_id:
+            return None
+        state = self._cache.get(session_id)
+        if state is None or state["scope"] != scope:
+            return None
+        return copy.deepcopy({key: value for key, value in state.items() if key != "scope"})
+
+    def save(self, session_id: str, scope: Tuple, messages: List[Dict],
+             system: List[Dict], last_sql: Optional[str], db_signature: Tuple = None):
+        """Guarda el historial de la sesión tras una respuesta exitosa."""
+        if not session_id or not self.enabled:
+            return
+        messages = copy.deepcopy(messages)
+        # La respuesta ya se entregó: todos los resultados de herramientas son antiguos
+        compact_messages(messages, system)
+        messages = trim_history(messages, self.history_max_tokens)
+        state = {
+            "scope": scope,
+            "messages": messages,
+            "system": system,
+            "last_sql": last_sql,
+            "db_signature": db_signature,
+        }
+        size = len(json.dumps(state, ensure_ascii=False, default=str).encode("utf-8"))
+        self._cache.set(session_id, state, size)
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
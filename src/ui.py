@@ -1,7 +1,10 @@
 import os
 
 import gradio as gr
-from src.agent import process_query_with_mcp
+from src.agent import BEDROCK_MODELS, stream_query_with_mcp
+from src.ingest import IngestError, describe_ingest, ingest_database
+from src.runtime import SaturatedError, get_admission_controller
+from src.session import new_session_id
 
 DEFAULT_CONTEXT = (
     "La empresa \"TechNova\" vende productos electrónicos. Tiene un promedio de 5.000 ventas mensuales en "
@@ -9,22 +12,92 @@ DEFAULT_CONTEXT = (
 )
 
 
-def process_query(db_mode, upload_db_file, context_prompt, model_choice, question):
-    """Process the query and return a response."""
+def _stream_answer(question, model_choice, db_path, context_prompt, session_id=None):
+    """Yields (sql_query, response, result_file) after each agent event."""
+    sql_query = ""
+    steps = []
+    answer = ""
+    result_file = None
+    for event in stream_query_with_mcp(question, model_choice, db_path, context_prompt, session_id):
+        if event["type"] == "result":
+            result = event["result"]
+            if isinstance(result, dict):
+                yield result.get("sql_query", ""), result.get("response", ""), result.get("result_file")
+            else:
+                yield "", str(result), None
+            return
+        if event["type"] == "tool_call":
+            # El texto previo a una herramienta no es la respuesta final
+            answer = ""
+            steps.append(f"⏳ Ejecutando herramienta {event['name']}...")
+        elif event["type"] == "sql":
+            sql_query = event["query"]
+        elif event["type"] == "result_file":
+            result_file = event["path"]
+        elif event["type"] == "text":
+            answer += event["text"]
+        progress = "\n".join(steps)
+        if answer:
+            progress = f"{progress}\n\n{answer}" if progress else answer
+        yield sql_query, progress, result_file
+
+
+def _uploaded_path(upload_db_file):
+    """Gradio entrega la subida como ruta o como objeto con ``name`` según la versión."""
+    return getattr(upload_db_file, "name", upload_db_file)
+
+
+def ingest_upload(upload_db_file):
+    """
+    Ingest the uploaded database into the content-addressed store.
+
+    Returns the stored database path and a status message; uploading the same
+    file again reuses the stored copy, its schema and its index.
+    """
+    upload_path = _uploaded_path(upload_db_file)
+    manifest = ingest_database(upload_path, os.path.basename(upload_path))
+    return manifest["db_path"], describe_ingest(manifest)
+
+
+def on_upload(upload_db_file):
+    if not upload_db_file:
+        return ""
+    try:
+        return ingest_upload(upload_db_file)[1]
+    except (IngestError, OSError) as e:
+        return f"No se pudo cargar la base de datos: {e}"
+
+
+def process_query(db_mode, upload_db_file, context_prompt, model_choice, question, session_id=None):
+    """
+    Process the query and stream partial results.
+
+    Yields (sql_query, response, result_file, session_id) after each agent
+    event so the interface shows the tools being called, the generated SQL and
+    the answer while it is written. When execute_sql summarized a large result,
+    result_file is the CSV with the full result, offered for download. Questions with the same session_id continue the same
+    conversation, so follow-ups reuse the previous SQL and schema.
+    If the server is saturated the question is rejected right away.
+    """
+    session_id = session_id or new_session_id()
     try:
         if db_mode == "Usar base de datos de prueba":
             db_path = "data/test_database.db"
         elif db_mode == "Cargar base de datos nueva" and upload_db_file:
-            db_path = upload_db_file.name
+            # Ya ingerida al subirla: aquí solo se resuelve la ruta en el almacén
+            db_path, _ = ingest_upload(upload_db_file)
         else:
             db_path = "data/test_database.db"
 
-        result = process_query_with_mcp(question, model_choice, db_path, context_prompt)
-        if isinstance(result, dict):
-            return result.get("sql_query", ""), result.get("response", "")
-        return "", str(result)
+        with get_admission_controller().admit():
+            for sql_query, response, result_file in _stream_answer(
+                question, model_choice, db_path, context_prompt, session_id
+            ):
+                yield sql_query, response, result_file, session_id
+    except (SaturatedError, IngestError) as e:
+        yield "", str(e), None, session_id
     except Exception as e:
-        return f"Error procesando la consulta: {str(e)}", ""
+        yield f"Error procesando la consulta: {str(e)}", "", None, session_id
 
 
 def create_ui():
@@ -34,6 +107,9 @@ def create_ui():
         return gr.update(visible=False, value=None)
 
     with gr.Blocks(title="Text-to-SQL Agent") as interface:
+        # Conversación del navegador: las preguntas siguientes continúan la anterior
+        session_id = gr.State(None)
+
         gr.Markdown("## Text-to-SQL Agent")
         gr.Markdown(
             "Sigue tres pasos: 1) elige la fuente de datos, 2) ajusta modelo/contexto si lo necesitas, 3) formula tu pregunta."
@@ -57,16 +133,23 @@ def create_ui():
                 scale=1
             )
 
+        upload_status = gr.Markdown()
+
         db_mode.change(
             fn=on_db_mode_change,
             inputs=[db_mode],
             outputs=[upload_db_file]
         )
+        upload_db_file.upload(
+            fn=on_upload,
+            inputs=[upload_db_file],
+            outputs=[upload_status]
+        )
 
         gr.Markdown("### 2. Modelo y contexto")
         with gr.Row():
             model_choice = gr.Dropdown(
-                choices=["Claude 3 Sonnet", "Claude 3 Haiku", "Llama 3 70B"],
+                choices=list(BEDROCK_MODELS),
                 value="Claude 3 Haiku",
                 label="Modelo",
                 scale=1
@@ -84,7 +167,9 @@ def create_ui():
             lines=4,
             label="Pregunta"
         )
-        submit_btn = gr.Button("Enviar", variant="primary")
+        with gr.Row():
+            submit_btn = gr.Button("Enviar", variant="primary", scale=3)
+            new_conversation_btn = gr.Button("Nueva conversación", scale=1)
 
         gr.Markdown("### Resultados")
         with gr.Row():
@@ -99,16 +184,36 @@ def create_ui():
                 label="Consulta SQL generada",
                 placeholder="Aquí verás la consulta SQL generada."
             )
+        result_file = gr.File(label="Resultado completo (CSV)", interactive=False)
 
         submit_btn.click(
             fn=process_query,
-            inputs=[db_mode, upload_db_file, context_prompt, model_choice, question],
-            outputs=[sql_query, response]
+            inputs=[db_mode, upload_db_file, context_prompt, model_choice, question, session_id],
+            outputs=[sql_query, response, result_file, session_id]
+        )
+        new_conversation_btn.click(
+            fn=lambda: (None, "", "", None),
+            inputs=[],
+            outputs=[session_id, sql_query, response, result_file]
         )
 
     return interface
 
 
+def configure_queue(interface):
+    """
+    Configura la cola de Gradio: preguntas procesadas a la vez
+    (GRADIO_CONCURRENCY_LIMIT) y solicitudes en espera (GRADIO_QUEUE_MAX_SIZE).
+    """
+    concurrency_limit = get_gradio_concurrency_limit()
+    queue_max_size = int(os.getenv("GRADIO_QUEUE_MAX_SIZE", "32"))
+    return interface.queue(default_concurrency_limit=concurrency_limit, max_size=queue_max_size)
+
+
+def get_gradio_concurrency_limit() -> int:
+    return int(os.getenv("GRADIO_CONCURRENCY_LIMIT", os.getenv("AGENT_MAX_IN_FLIGHT", "8")))
+
+
 if __name__ == "__main__":
     ui = create_ui()
     ui.launch()
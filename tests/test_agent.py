@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from src import agent
+from src.cache import AnswerCache
+from src.database import get_database_fingerprint
+from src.session import SessionStore
+
+MODEL_NAME = "Claude 3 Haiku"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "shop.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, status TEXT)")
+    connection.commit()
+    connection.close()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def stores(monkeypatch):
+    monkeypatch.setattr(agent, "_answer_cache", AnswerCache(max_entries=10, ttl=0))
+    monkeypatch.setattr(agent, "_session_store", SessionStore(max_entries=10, ttl=0))
+
+
+def _scope(db_path, context=""):
+    db_identity, db_signature = get_database_fingerprint(db_path)
+    model_id = agent.get_bedrock_model_id(MODEL_NAME)
+    return AnswerCache.make_scope(model_id, db_identity, context), db_signature
+
+
+def test_repeated_question_in_second_turn_is_answered_from_cache(db_path):
+    scope, db_signature = _scope(db_path)
+    question = "¿Cuántas órdenes hay?"
+    # Primer turno de otra sesión: la respuesta quedó en la caché
+    agent.get_answer_cache().store(question, scope, db_signature, "SELECT COUNT(*) FROM orders", "Hay 0 órdenes.")
+    # Primer turno de esta sesión: otra pregunta ya respondida por el modelo
+    first_turn = [
+        {"role": "user", "content": [{"text": "¿Qué tablas hay?"}]},
+        {"role": "assistant", "content": [{"text": "Solo orders."}]},
+    ]
+    agent.get_session_store().save("session-1", scope, first_turn, [], None, db_signature)
+
+    result = asyncio.run(agent.process_query_async(question, MODEL_NAME, db_path, "", "session-1"))
+
+    assert result["cached"] is True
+    assert result["response"] == "Hay 0 órdenes."
+    history = agent.get_session_store().load("session-1", scope)
+    assert [message["content"][0]["text"] for message in history["messages"]] == [
+        "¿Qué tablas hay?", "Solo orders.", question, "Hay 0 órdenes."
+    ]
+    assert history["last_sql"] == "SELECT COUNT(*) FROM orders"
+
+
+def test_similar_question_in_second_turn_is_not_answered_from_cache(db_path, monkeypatch):
+    monkeypatch.setattr(agent, "_answer_cache", AnswerCache(max_entries=10, ttl=0, similarity_threshold=0.3))
+    scope, db_signature = _scope(db_path)
+    agent.get_answer_cache().store("órdenes por estado", scope, db_signature, "SELECT 1", "cached")
+    model_id = agent.get_bedrock_model_id(MODEL_NAME)
+
+    first_turn, _, _ = asyncio.run(agent.answer_from_cache("¿y órdenes por país?", model_id, db_path, ""))
+    follow_up, _, _ = asyncio.run(
+        agent.answer_from_cache("¿y órdenes por país?", model_id, db_path, "", similar=False)
+    )
+
+    assert first_turn is not None
+    assert follow_up is None
+
+
+class _FakeToolClient:
+    async def call_tool(self, tool_name, arguments):
+        class Result:
+            content = [{"text": "Tabla: orders" if "schema" in tool_name else "Contexto"}]
+        return Result()
+
+
+@pytest.mark.parametrize("model_name, cached", [
+    ("Claude 3.7 Sonnet", True),
+    ("Claude 3.5 Haiku", True),
+    ("Claude 3 Haiku", False),
+])
+def test_preseeded_prompt_has_cache_point_for_caching_models(model_name, cached):
+    model_id = agent.get_bedrock_model_id(model_name)
+
+    system = asyncio.run(agent.build_preseeded_system_prompt(_FakeToolClient(), model_id, "¿Cuántas órdenes hay?"))
+
+    assert "Tabla: orders" in system[0]["text"]
+    assert ({"cachePoint": {"type": "default"}} in system) is cached
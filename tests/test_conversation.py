@@ -0,0 +1,47 @@
+from src.conversation import compact_messages
+
+
+def _tool_turn(tool_use_id, name, text):
+    return [
+        {"role": "assistant", "content": [{"toolUse": {"toolUseId": tool_use_id, "name": name, "input": {}}}]},
+        {"role": "user", "content": [{"toolResult": {"toolUseId": tool_use_id, "content": [{"text": text}]}}]},
+    ]
+
+
+def _result(message):
+    return message["content"][0]["toolResult"]["content"][0]["text"]
+
+
+def test_unseen_schema_result_is_kept_when_system_has_other_tables():
+    # SCHEMA_PRESEED_MODE=relevant: el prompt de sistema solo trae algunas tablas
+    system = [{"text": "ESQUEMA DE LA BASE DE DATOS:\nTabla: customers"}]
+    schema = "Tabla: customers\nTabla: orders\nTabla: order_items"
+    messages = [{"role": "user", "content": [{"text": "¿Cuántas órdenes hay?"}]}]
+    messages += _tool_turn("tool-1", "get_database_schema_tool", schema)
+
+    compact_messages(messages, system)
+
+    assert _result(messages[-1]) == schema
+
+
+def test_unseen_schema_result_identical_to_system_is_omitted():
+    schema = "Tabla: customers\nTabla: orders"
+    system = [{"text": f"ESQUEMA DE LA BASE DE DATOS:\n{schema}"}]
+    messages = [{"role": "user", "content": [{"text": "¿Cuántas órdenes hay?"}]}]
+    messages += _tool_turn("tool-1", "get_database_schema_tool", schema)
+
+    compact_messages(messages, system)
+
+    assert _result(messages[-1]).startswith("[Resultado omitido: el esquema ya está en el prompt")
+
+
+def test_seen_schema_result_is_omitted():
+    schema = "Tabla: customers\nTabla: orders"
+    messages = [{"role": "user", "content": [{"text": "¿Cuántas órdenes hay?"}]}]
+    messages += _tool_turn("tool-1", "get_database_schema_tool", schema)
+    messages += _tool_turn("tool-2", "execute_sql", "COUNT(*)\n5")
+
+    compact_messages(messages)
+
+    assert _result(messages[2]).startswith("[Resultado omitido: esquema de la base de datos ya revisado")
+    assert _result(messages[-1]) == "COUNT(*)\n5"
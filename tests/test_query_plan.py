@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from src.database import get_database_schema
+from src.query_plan import preflight_query
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.executescript("""
+        CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE orders (
+            order_id INTEGER PRIMARY KEY, customer_id INTEGER, status TEXT, total_amount REAL
+        );
+        CREATE INDEX idx_orders_customer_id ON orders (customer_id);
+        CREATE TABLE order_items (item_id INTEGER PRIMARY KEY, order_id INTEGER, unit_price REAL);
+    """)
+    connection.executemany("INSERT INTO customers VALUES (?, ?)", [(i, f"c{i}") for i in range(1, 51)])
+    connection.executemany(
+        "INSERT INTO orders VALUES (?, ?, ?, ?)",
+        [(i, i % 50 + 1, "open" if i % 2 else "closed", i * 1.5) for i in range(1, 201)]
+    )
+    connection.executemany(
+        "INSERT INTO order_items VALUES (?, ?, ?)", [(i, i % 200 + 1, i * 0.5) for i in range(1, 401)]
+    )
+    yield connection
+    connection.close()
+
+
+def _preflight(connection, query):
+    return preflight_query(connection, query, get_database_schema(connection), large_table_rows=100)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT COUNT(*) FROM orders",
+    "SELECT status, COUNT(*) FROM orders GROUP BY status",
+    "SELECT SUM(total_amount) FROM orders",
+])
+def test_aggregate_scans_are_not_reported(connection, query):
+    report = _preflight(connection, query)
+
+    assert report["issues"] == []
+    assert report["blocking"] == []
+
+
+def test_scan_without_index_is_a_hint_not_a_block(connection):
+    report = _preflight(connection, "SELECT * FROM orders WHERE status = 'open'")
+
+    assert report["issues"]
+    assert report["blocking"] == []
+    assert report["suggested_indexes"] == ["CREATE INDEX idx_orders_status ON orders (status)"]
+
+
+def test_cartesian_join_is_blocked(connection):
+    report = _preflight(connection, "SELECT * FROM orders, order_items")
+
+    assert len(report["blocking"]) == 1
+    assert "order_items" in report["blocking"][0]
+    assert report["estimated_rows"] == 200 * 400
+
+
+def test_scan_nested_in_correlated_subquery_is_blocked(connection):
+    report = _preflight(
+        connection,
+        "SELECT * FROM orders o WHERE EXISTS "
+        "(SELECT 1 FROM order_items i WHERE i.unit_price = o.total_amount)"
+    )
+
+    assert report["blocking"]
+    assert "order_items" in report["blocking"][0]
@@ -0,0 +1,33 @@
+import os
+import sqlite3
+
+import pytest
+
+from src.mcp import server
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "shop.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, status TEXT)")
+    connection.executemany("INSERT INTO orders VALUES (?, ?)", [(i, "open") for i in range(1, 21)])
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_summary_file_is_removed_when_summary_fails(db_path, tmp_path, monkeypatch):
+    results_dir = tmp_path / "results"
+    monkeypatch.setenv("MCP_RESULT_FORMAT", "summary")
+    monkeypatch.setenv("MCP_RESULTS_DIR", str(results_dir))
+
+    def broken_summary(result, collector):
+        raise ValueError("summary failed")
+
+    monkeypatch.setattr(server, "format_summary", broken_summary)
+
+    response = server._execute_sql(db_path, "SELECT * FROM orders")
+
+    assert "summary failed" in response
+    assert os.listdir(results_dir) == []